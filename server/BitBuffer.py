@@ -1,54 +1,84 @@
 # BitBuffer.py
 import struct
+
+import tracing
 class BitBuffer:
+    """
+    Writes the client's MSB-first bitstream. Bits are shifted into an int
+    accumulator and moved into a bytearray whole bytes at a time, so at most
+    7 bits are ever pending.
+
+    The debug log holds (format, *values) entries, see tracing.py.
+    """
     def __init__(self, debug=True):
-        self.bits = []
-        self.debug = debug
-        self.debug_log = [] if debug else None
+        self._out = bytearray()
+        self._acc = 0   # pending bits, oldest first (most significant)
+        self._nacc = 0  # number of pending bits, always < 8 between writes
+        # debug only takes effect while tracing is on for the current packet
+        self.debug = debug and tracing.active()
+        self.debug_log = [] if self.debug else None
+        if self.debug:
+            tracing.register(self)
+
+    def _put(self, value, bit_count):
+        """Append the low bit_count bits of value."""
+        if bit_count <= 0:
+            return
+        acc = (self._acc << bit_count) | (value & ((1 << bit_count) - 1))
+        n = self._nacc + bit_count
+        if n >= 8:
+            rem = n & 7
+            self._out += (acc >> rem).to_bytes(n >> 3, "big")
+            acc &= (1 << rem) - 1
+            n = rem
+        self._acc = acc
+        self._nacc = n
+
+    def bit_length(self):
+        """Number of bits written so far."""
+        return (len(self._out) << 3) + self._nacc
+
+    def segment(self):
+        """Everything written so far, unpadded, as (value, bit_count) for write_segment()."""
+        return (int.from_bytes(self._out, "big") << self._nacc) | self._acc, self.bit_length()
+
+    def write_segment(self, segment):
+        """Splice in a segment() of another buffer, at whatever bit offset this one is at."""
+        value, bit_count = segment
+        if self.debug:
+            self.debug_log.append(("segment: {} bits", bit_count))
+        self._put(value, bit_count)
 
     def align_to_byte(self):# the client does not use padding it expects everything in a single bitstream but who knows we might need it
-        while len(self.bits) % 8 != 0:
-            self.bits.append(0)
+        if self._nacc:
             if self.debug:
-                self.debug_log.append("align_pad=0")
+                self.debug_log.extend(["align_pad=0"] * (8 - self._nacc))
+            self._put(0, 8 - self._nacc)
 
     def write_method_15(self, flag: bool):
         """Write a single boolean (1 bit) to the bitstream, matching client method_15."""
         self.write_method_11(1 if flag else 0, 1)
         if self.debug:
-            self.debug_log.append(f"method_15={flag}")
+            self.debug_log.append(("method_15={}", flag))
 
     def to_bytes(self):
-        while len(self.bits) % 8 != 0:
-            self.bits.append(0)
+        # pads the stream itself, like the list version: later writes start on the next byte
+        if self._nacc:
             if self.debug:
-                self.debug_log.append("pad_to_byte=0")
-        out = bytearray()
-        for i in range(0, len(self.bits), 8):
-            byte = 0
-            for bit in self.bits[i:i + 8]:
-                byte = (byte << 1) | bit
-            out.append(byte)
-        return bytes(out)
+                self.debug_log.extend(["pad_to_byte=0"] * (8 - self._nacc))
+            self._put(0, 8 - self._nacc)
+        return bytes(self._out)
 
     def write_method_20(self, bit_count: int, value: int):
-        while bit_count > 0:
-            byte_index = len(self.bits) // 8
-            bit_offset = len(self.bits) & 7
-            bits_left_in_byte = 8 - bit_offset
-            bits_to_write = min(bit_count, bits_left_in_byte)
-
-            shift = bit_count - bits_to_write
-            mask = (value >> shift) & ((1 << bits_to_write) - 1)
-
-            for i in range(bits_to_write):
-                self.bits.append((mask >> (bits_to_write - 1 - i)) & 1)
-
-            bit_count -= bits_to_write
-
-            if self.debug:
-                self.debug_log.append(f"write_method_20: value={value}, bits_written={bits_to_write}")
-
+        if self.debug:
+            pos = self.bit_length()
+            left = bit_count
+            while left > 0:
+                bits_to_write = min(left, 8 - (pos & 7))
+                self.debug_log.append(("write_method_20: value={}, bits_written={}", value, bits_to_write))
+                pos += bits_to_write
+                left -= bits_to_write
+        self._put(value, bit_count)
 
     def write_method_739(self, value: int):
         if value < 0:
@@ -58,7 +88,7 @@ class BitBuffer:
             self.write_method_11(0, 1)
             self.write_method_91(value)
         if self.debug:
-            self.debug_log.append(f"method_739={value}")
+            self.debug_log.append(("method_739={}", value))
 
     def write_method_4(self, val: int):
         bits_needed = val.bit_length() if val > 0 else 1
@@ -68,7 +98,7 @@ class BitBuffer:
         self.write_method_11(prefix, 4)
         self.write_method_11(val, bits_to_use)
         if self.debug:
-            self.debug_log.append(f"method_4={val}, prefix={prefix}, bits={bits_to_use}")
+            self.debug_log.append(("method_4={}, prefix={}, bits={}", val, prefix, bits_to_use))
 
     def write_method_26(self, val: str):
         """
@@ -83,12 +113,12 @@ class BitBuffer:
         for byte in encoded[:length]:
             self.write_method_11(byte, 8)
         if self.debug:
-            self.debug_log.append(f"method_26={val}, length={length}")
+            self.debug_log.append(("method_26={}, length={}", val, length))
 
     def write_method_6(self, val: int, bit_count: int):
         self.write_method_11(val, bit_count)
         if self.debug:
-            self.debug_log.append(f"method_6={val}, bits={bit_count}")
+            self.debug_log.append(("method_6={}, bits={}", val, bit_count))
 
     def write_method_91(self, val: int):
         bits_needed = val.bit_length() if val > 0 else 1
@@ -97,7 +127,7 @@ class BitBuffer:
         self.write_method_11(n, 3)
         self.write_method_11(val, bits_to_use)
         if self.debug:
-            self.debug_log.append(f"method_91={val}, n={n}, bits={bits_to_use}")
+            self.debug_log.append(("method_91={}, n={}, bits={}", val, n, bits_to_use))
 
 
     def write_method_9(self, val: int):
@@ -116,13 +146,12 @@ class BitBuffer:
             self.write_method_11(0, 1)
             self.write_method_4(val)
         if self.debug:
-            self.debug_log.append(f"method_45={val}, sign={1 if val < 0 else 0}")
+            self.debug_log.append(("method_45={}, sign={}", val, 1 if val < 0 else 0))
 
     def write_method_11(self, value, bit_count):
         if self.debug:
-            self.debug_log.append(f"write_method_6={value:0{bit_count}b} ({bit_count} bits)")
-        for i in reversed(range(bit_count)):
-            self.bits.append((value >> i) & 1)
+            self.debug_log.append(("write_method_6={0:0{1}b} ({1} bits)", value, bit_count))
+        self._put(value, bit_count)
 
     def write_method_393(self, val):
         self.write_method_11(val & 0xFF, 8)
@@ -138,7 +167,7 @@ class BitBuffer:
             self.write_method_11(byte, 8)
 
         if self.debug:
-            self.debug_log.append(f"method_13={val}, length={length}")
+            self.debug_log.append(("method_13={}, length={}", val, length))
 
     def write_float(self, val: float):
         b = struct.pack(">f", val)
@@ -148,7 +177,7 @@ class BitBuffer:
     def write_method_309(self, val: float):
         self.write_float(val)
         if self.debug:
-            self.debug_log.append(f"method_309={val}")
+            self.debug_log.append(("method_309={}", val))
 
 
     def write_method_24(self, val: int):
@@ -160,7 +189,7 @@ class BitBuffer:
         self.write_method_11(sign, 1)
         self.write_method_9(abs(val))
         if self.debug:
-            self.debug_log.append(f"method_24={val}, sign={sign}")
+            self.debug_log.append(("method_24={}, sign={}", val, sign))
 
     def get_debug_log(self):
-        return self.debug_log if self.debug else []
+        return tracing.format_log(self.debug_log)
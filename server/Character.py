@@ -5,6 +5,10 @@ import json
 import struct
 
 from BitBuffer import BitBuffer
+import bulkpack
+import char_store
+import framing
+import name_index
 from constants import GearType, GEARTYPE_BITS
 
 def load_class_template(class_name: str) -> dict:
@@ -20,11 +24,28 @@ def build_level_gears_packet(gears_list: list[tuple[int, int]]) -> bytes:
     """
     buf = BitBuffer()
     buf.write_method_4(len(gears_list))  # Write number of gears
+    if not buf.debug:
+        gear_ids = [gear_id for gear_id, _tier in gears_list]
+        tiers = [tier for _gear_id, tier in gears_list]
+        buf.write_segment(bulkpack.pack_columns([(gear_ids, GEARTYPE_BITS), (tiers, GearType.const_176)],
+                                                len(gears_list)))
+        gears_list = ()  # traced buffers write them field by field below
     for gear_id, tier in gears_list:
         buf.write_method_6(gear_id, GEARTYPE_BITS)  # 11 bits for gearID
         buf.write_method_6(tier, GearType.const_176)  # 2 bits for tier
     payload = buf.to_bytes()
-    return struct.pack(">HH", 0xF5, len(payload)) + payload
+    return framing.frame(0xF5, payload)
+
+# gears per 0xF5 packet that always fit the frame: 13 bits each, plus the count
+LEVEL_GEARS_PER_PACKET = (framing.MAX_PAYLOAD * 8 - 64) // (GEARTYPE_BITS + GearType.const_176)
+
+def build_level_gears_packets(gears_list: list[tuple[int, int]]) -> list[bytes]:
+    """
+    build_level_gears_packet split over as many 0xF5 packets as the
+    16-bit frame length needs.
+    """
+    return [build_level_gears_packet(gears_list[i:i + LEVEL_GEARS_PER_PACKET])
+            for i in range(0, len(gears_list), LEVEL_GEARS_PER_PACKET)] or [build_level_gears_packet([])]
 
 def get_inventory_gears(char: dict) -> list[tuple[int, int]]:
     """
@@ -115,31 +136,20 @@ DEFAULT_GEAR = {
 CHAR_SAVE_DIR = "saves"
 
 def load_characters(user_id: str) -> list[dict]:
-    """Load the list of characters for a given user_id."""
-    path = os.path.join(CHAR_SAVE_DIR, f"{user_id}.json")
-    if not os.path.exists(path):
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data.get("characters", [])
+    """The live list of characters for a given user_id (cached, see char_store)."""
+    return char_store.get_characters(user_id)
 
 
 def save_characters(user_id: str, char_list: list[dict]):
-    """Save the list of characters for a given user_id, preserving other fields."""
-    os.makedirs(CHAR_SAVE_DIR, exist_ok=True)
-    path = os.path.join(CHAR_SAVE_DIR, f"{user_id}.json")
-    # Load existing to preserve email and other fields
+    """
+    Save the list of characters for a given user_id, preserving other fields.
+    Write-behind: the account is written by the char_store flusher.
+    """
     if user_id is None:
         print("Warning: Attempted to save characters with user_id=None")
         return
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    else:
-        data = {"email": None, "characters": []}
-    data["characters"] = char_list
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    char_store.put_characters(user_id, char_list)
+    name_index.sync_account(user_id, char_list)
 
 
 def build_paperdoll_packet(character_dict):
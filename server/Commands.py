@@ -1,12 +1,12 @@
 
 import json, struct
 import math
-import pprint
 import random
 import secrets
 import time
 
 from Character import save_characters, build_paperdoll_packet
+from char_store import put_account
 from accounts import build_popup_packet
 from bitreader import BitReader
 from constants import GearType, EntType, class_64, class_1, DyeType, class_118, method_277, \
@@ -15,18 +15,22 @@ from constants import GearType, EntType, class_64, class_1, DyeType, class_118,
     index_to_node_id, door
 from BitBuffer import BitBuffer
 from constants import get_dye_color
-from entity import Send_Entity_Data
+from entity import Send_Entity_Data, build_entity_full_update
 from level_config import SPAWN_POINTS, DOOR_MAP, LEVEL_CONFIG
 from scheduler import scheduler, _on_research_done_for, schedule_building_upgrade, _on_building_done_for, \
     schedule_forge, _on_talent_done_for, schedule_Talent_point_research
 from missions import _MISSION_DEFS_BY_ID
-
-SAVE_PATH_TEMPLATE = "saves/{user_id}.json"
+from packet_registry import packet_handler, SESSION, CONN, ALL_SESSIONS
+from levels import broadcast_to_level, broadcast_entity_update, broadcast_near_player
+import forwarding
+import checkpoints
+import name_index
 
 
 
 
 #TODO...
+@packet_handler(0x7A, needs=ALL_SESSIONS)
 def handle_talk_to_npc(session, data, all_sessions):
     payload = data[4:]
     br = BitReader(payload)
@@ -124,7 +128,8 @@ def handle_talk_to_npc(session, data, all_sessions):
 """
 
 #TODO...
-def handle_collect_hatched_egg(conn, char):
+@packet_handler(0xEA)
+def handle_collect_hatched_egg(session, data):
       pass
 
 REWARD_TYPES = ['gear', 'item', 'gold', 'chest', 'xp', 'potion']
@@ -165,7 +170,8 @@ def build_loot_drop_packet(entity_id: int, x: int, y: int,
     return header + payload
 
 
-def handle_grant_reward(session, data, all_sessions):
+@packet_handler(0x2A)
+def handle_grant_reward(session, data):
     payload = data[4:]
     br = BitReader(payload, debug=True)
     try:
@@ -226,13 +232,12 @@ def handle_grant_reward(session, data, all_sessions):
             value1=v1,
             value2=v2
         )
-        for other in all_sessions:
-            if other.world_loaded and other.current_level == session.current_level:
-                other.conn.sendall(pkt)
-                #print(f"[PKT2A] → DROP {rtype} @({drop_x},{drop_y}) to {other.addr}")
+        broadcast_to_level(session, pkt, include_self=True)
+        #print(f"[PKT2A] → DROP {rtype} @({drop_x},{drop_y}) to level {session.current_level}")
 
 
-def handle_change_max_speed(session, data, all_sessions):
+@packet_handler(0x8A)
+def handle_change_max_speed(session, data):
     payload = data[4:]
     br = BitReader(payload, debug=True)
 
@@ -262,11 +267,10 @@ def handle_change_max_speed(session, data, all_sessions):
     packet = struct.pack(">HH", 0x8A, len(payload)) + payload
 
     # Broadcast to all clients in the same level
-    for other_session in all_sessions:
-        if other_session.world_loaded and other_session.current_level == session.current_level:
-            other_session.conn.sendall(packet)
+    broadcast_to_level(session, packet, include_self=True)
 
 
+@packet_handler(0x107, needs=SESSION)
 def handle_lockbox_reward(session):
     CAT_BITS = 3
     ID_BITS = 6
@@ -350,6 +354,7 @@ def send_talent_tree_packet(session, entity_id):
 
 
 
+@packet_handler(0xC3)
 def handle_masterclass_packet(session, raw_data):
     payload = raw_data[4:]
     br = BitReader(payload)
@@ -376,6 +381,7 @@ def handle_masterclass_packet(session, raw_data):
 
     send_talent_tree_packet(session, entity_id)
 
+@packet_handler(0xDF)
 def handle_clear_talent_research(session, data):
     """
     Handle 0xDF: client cleared the current talent research.
@@ -414,6 +420,7 @@ def handle_clear_talent_research(session, data):
 
     print(f"[{session.addr}] [0xDF] talentResearch cleared for {session.current_character}")
 
+@packet_handler(0x31)
 def handle_gear_packet(session, raw_data):
     payload = raw_data[4:]
     br = BitReader(payload)
@@ -467,6 +474,7 @@ def handle_gear_packet(session, raw_data):
     save_characters(session.user_id, session.char_list)
     print(f"[Save] slot {slot} updated with gear {gear_id}, inventory count = {len(inv)}")
 
+@packet_handler(0xB0)
 def handle_rune_packet(session, raw_data):
     payload = raw_data[4:]
     br = BitReader(payload)
@@ -615,7 +623,8 @@ def send_look_update_packet(session, entity_id, head, hair, mouth, face, gender,
     # Optional logging for debugging
     print(f"[LookUpdate] Sent packet 0x{packet_type:02X} for entity {entity_id}")
 
-def handle_change_look(session, raw_data, all_sessions):
+@packet_handler(0x8E)
+def handle_change_look(session, raw_data):
     """
     Handle the look change request from the client (e.g., packet 0x8E),
     update both the live entity and the saved character data, persist,
@@ -675,10 +684,8 @@ def handle_change_look(session, raw_data, all_sessions):
     )
 
     # ─── (6) Broadcast to nearby clients ────────────────────────────────────────
-    for other in all_sessions:
-        if (other is not session and
-            other.world_loaded and
-            other.current_level == session.current_level):
+    if session.level:
+        for other in session.level.observers(exclude=session):
             send_look_update_packet(
                 other,
                 entity_id,
@@ -687,6 +694,7 @@ def handle_change_look(session, raw_data, all_sessions):
             )
 
 
+@packet_handler(0xC7)
 def handle_create_gearset(session, raw_data):
     """
     Packet 0xC7: client wants to create a new gear-set slot.
@@ -719,14 +727,13 @@ def handle_create_gearset(session, raw_data):
         return
 
     # persist
-    save_path = SAVE_PATH_TEMPLATE.format(user_id=session.user_id)
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(pd, f, indent=2)
-    print(f"[Save] Created gearset slot {slot_idx} in {save_path}")
+    put_account(session.user_id, pd)
+    print(f"[Save] Created gearset slot {slot_idx} (account {session.user_id})")
 
     # echo back so the client will show the "Enter name" popup
     session.conn.sendall(raw_data)
 
+@packet_handler(0xC8)
 def handle_name_gearset(session, raw_data):
     """
     Packet 0xC8: client sends the chosen name for a gear-set.
@@ -769,14 +776,13 @@ def handle_name_gearset(session, raw_data):
         return
 
     # Persist
-    save_path = SAVE_PATH_TEMPLATE.format(user_id=session.user_id)
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(pd, f, indent=2)
-    print(f"[Save] Renamed gearset slot {slot_idx} to “{name}” in {save_path}")
+    put_account(session.user_id, pd)
+    print(f"[Save] Renamed gearset slot {slot_idx} to “{name}” (account {session.user_id})")
 
     # Echo back to client
     session.conn.sendall(raw_data)
 
+@packet_handler(0xC6)
 def handle_apply_gearset(session, raw_data):
     """
     Packet 0xC6: client assigns currently equipped gears to a gearset slot.
@@ -811,14 +817,13 @@ def handle_apply_gearset(session, raw_data):
         return
 
     # Persist
-    save_path = SAVE_PATH_TEMPLATE.format(user_id=session.user_id)
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(pd, f, indent=2)
-    print(f"[Save] Assigned equipped gears to gearset slot {slot_idx} in {save_path}")
+    put_account(session.user_id, pd)
+    print(f"[Save] Assigned equipped gears to gearset slot {slot_idx} (account {session.user_id})")
 
     # Echo back to client
     session.conn.sendall(raw_data)
 
+@packet_handler(0x30)
 def handle_update_equipment(session, raw_data):
     """
     Packet 0x30: client updates equipped gears for a gearset.
@@ -872,14 +877,13 @@ def handle_update_equipment(session, raw_data):
         return
 
     # Persist
-    save_path = SAVE_PATH_TEMPLATE.format(user_id=session.user_id)
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(pd, f, indent=2)
-    print(f"[Save] Updated equippedGears for {session.current_character} in {save_path}")
+    put_account(session.user_id, pd)
+    print(f"[Save] Updated equippedGears for {session.current_character} (account {session.user_id})")
 
     # Echo back to client
     session.conn.sendall(raw_data)
 
+@packet_handler(0xE2)
 def magic_forge_packet(session, data):
     payload = data[4:]
     br = BitReader(payload)
@@ -916,9 +920,7 @@ def magic_forge_packet(session, data):
         mf["hasSession"] = False
 
         # 4) Persist save
-        save_path = SAVE_PATH_TEMPLATE.format(user_id=session.user_id)
-        with open(save_path, "w", encoding="utf-8") as f:
-            json.dump(session.player_data, f, indent=2)
+        put_account(session.user_id, session.player_data)
 
         # 5) Build & send the 0xCD “forge update” response
         bb = BitBuffer()
@@ -936,6 +938,7 @@ def magic_forge_packet(session, data):
         print(f"[{session.addr}] Speed‑up denied: hasSession={mf.get('hasSession')}, idols={available}")
 
 #TODO... for every collect the forge should gain level XP
+@packet_handler(0xD0)
 def collect_forge_charm(session, data):
     """
     Handle 0xD0 "collect charm" from client:
@@ -988,9 +991,7 @@ def collect_forge_charm(session, data):
     })
 
     # Save file
-    save_path = SAVE_PATH_TEMPLATE.format(user_id=session.user_id)
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(session.player_data, f, indent=2)
+    put_account(session.user_id, session.player_data)
     print(f"[{session.addr}] Forge session cleared and saved")
 
     # Reply with 0xD0 ACK
@@ -998,6 +999,7 @@ def collect_forge_charm(session, data):
     session.conn.sendall(resp)
     print(f"[{session.addr}] Sent 0xD0 collect-ack")
 #TODO... implement the proper system to calculate the runnes  for each craft and the timers
+@packet_handler(0xB1)
 def start_forge_packet(session, data):
     """
     Handle 0xB1: client clicked Craft on the Magic Forge.
@@ -1096,6 +1098,7 @@ def start_forge_packet(session, data):
     print(f"[{session.addr}] Forge completion scheduled at {run_at}")
 
 
+@packet_handler(0xE1)
 def cancel_forge_packet(session, data):
     """
     Handle 0xE1: client clicked Cancel on the Magic Forge.
@@ -1124,11 +1127,10 @@ def cancel_forge_packet(session, data):
     mf["var_2434"]   = False
 
     # 3) Persist the change
-    save_path = SAVE_PATH_TEMPLATE.format(user_id=session.user_id)
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(session.player_data, f, indent=2)
+    put_account(session.user_id, session.player_data)
     print(f"[{session.addr}] Forge session canceled and save updated")
 
+@packet_handler(0xD3)
 def allocate_talent_points(session, data):
     """
     Handle 0xD3: client sent new craftTalentPoints.
@@ -1152,11 +1154,10 @@ def allocate_talent_points(session, data):
     char["craftTalentPoints"] = points
 
     # Persist
-    save_path = SAVE_PATH_TEMPLATE.format(user_id=session.user_id)
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(session.player_data, f, indent=2)
+    put_account(session.user_id, session.player_data)
     print(f"[{session.addr}] Saved new craftTalentPoints for {char['name']}")
 
+@packet_handler(0x110)
 def use_forge_xp_consumable(session, data):
     """
     Handle 0x110: player used a forge‑XP consumable.
@@ -1195,12 +1196,11 @@ def use_forge_xp_consumable(session, data):
     print(f"[{session.addr}] Forge XP +{xp_gain} (capped), total now = {char['craftXP']}")
 
     # Save file
-    save_path = SAVE_PATH_TEMPLATE.format(user_id=session.user_id)
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(session.player_data, f, indent=2)
+    put_account(session.user_id, session.player_data)
     print(f"[{session.addr}] Save updated with capped forge XP")
 
-def handle_private_message(session, data, all_sessions):
+@packet_handler(0x46)
+def handle_private_message(session, data):
     payload = data[4:]
     try:
         br = BitReader(payload)
@@ -1209,13 +1209,9 @@ def handle_private_message(session, data, all_sessions):
         print(f"[{session.addr}] [PKT46] Private message from {session.current_character} to {recipient_name}: {message}")
 
         # Find recipient session
-        recipient_session = next(
-            (s for s in all_sessions
-             if s.current_character
-             and s.current_character.lower() == recipient_name.lower()
-             and s.authenticated),
-            None
-        )
+        recipient_session = name_index.find_online(recipient_name)
+        if recipient_session and not recipient_session.authenticated:
+            recipient_session = None
 
         # For recipient (0x47): senderName + message
         bb_recipient = BitBuffer()
@@ -1254,6 +1250,7 @@ def handle_private_message(session, data, all_sessions):
 
 
 
+@packet_handler(0x7C)
 def Client_Crash_Reports(session, data):
     """
     Read a CLIENT ERROR (0x7C) packet and log it.
@@ -1264,12 +1261,13 @@ def Client_Crash_Reports(session, data):
     # extract exactly `length` bytes of payload
     payload = data[4:4 + length]
     try:
-        msg = payload.decode("utf-8", errors="replace")
+        msg = bytes(payload).decode("utf-8", errors="replace")
     except Exception:
         msg = repr(payload)
     print(f"[{session.addr}] CLIENT ERROR (0x7C): {msg}")
 
 
+@packet_handler(0x41, needs=CONN)
 def handle_request_door_state(session, data, conn):
     """
     Handle packet 0x41: client requests the state of a door.
@@ -1350,6 +1348,7 @@ def handle_request_door_state(session, data, conn):
 
 
 
+@packet_handler(0xBE, needs=CONN)
 def Start_Skill_Research(session, data, conn):
     br = BitReader(data[4:], debug=True)
     try:
@@ -1389,7 +1388,8 @@ def Start_Skill_Research(session, data, conn):
         sched_id = scheduler.schedule(
             run_at=ready_ts,
             callback=lambda uid=session.user_id, cname=char["name"]:
-                _on_research_done_for(uid, cname)
+                _on_research_done_for(uid, cname),
+            key=(session.user_id, char["name"])
         )
 
         char["research"] = {
@@ -1405,6 +1405,7 @@ def Start_Skill_Research(session, data, conn):
         print(f"[{session.addr}] [0xBE] Error: {e}")
 
 
+@packet_handler(0xD1, needs=SESSION)
 def handle_research_claim(session):
     """
     Handle packet 0xD1: player claims completed skill research.
@@ -1440,6 +1441,7 @@ def handle_research_claim(session):
 
     save_characters(session.user_id, session.char_list)
 
+@packet_handler(0xDD, needs=SESSION)
 def Skill_Research_Cancell_Request(session):
     """
     Handle 0xDD: cancel skill research.
@@ -1478,6 +1480,7 @@ def Skill_Research_Cancell_Request(session):
 
 
 
+@packet_handler(0xDE)
 def Skill_SpeedUp(session, data):
     """
     Handles skill research speed-up request (0xDE).
@@ -1525,6 +1528,7 @@ def Skill_SpeedUp(session, data):
 
 
 
+@packet_handler(0xD7)
 def handle_building_upgrade(session, data):
     """
     Handle 0xD7: client requested a building upgrade.
@@ -1606,6 +1610,7 @@ def handle_building_upgrade(session, data):
 
 
 
+@packet_handler(0xDC)
 def handle_speedup_request(session, data):
     """
     Handle 0xDC: client clicked 'Speed-up' for building upgrade.
@@ -1683,6 +1688,7 @@ def handle_speedup_request(session, data):
 
 
 
+@packet_handler(0xDB)
 def handle_cancel_upgrade(session, data):
     """
     Handle 0xDB: client canceled an ongoing building upgrade.
@@ -1722,6 +1728,7 @@ def handle_cancel_upgrade(session, data):
         print(f"[{session.addr}] [0xDB] failed to send 0xE3: {e}")
 
 
+@packet_handler(0xD9)
 def handle_building_claim(session, data):
     """
     Handle 0xD9: client acknowledged a completed building upgrade.
@@ -1757,6 +1764,7 @@ def handle_building_claim(session, data):
 
 
 
+@packet_handler(0xD4)
 def handle_train_talent_point(session, data):
     payload = data[4:]
     br = BitReader(payload, debug=True)
@@ -1815,6 +1823,7 @@ def handle_train_talent_point(session, data):
 
 
 
+@packet_handler(0xE0)
 def handle_talent_speedup(session, data):
     """
     Handle 0xE0: client clicked Speed-up on talent research.
@@ -1881,6 +1890,7 @@ def handle_talent_speedup(session, data):
 
 
 
+@packet_handler(0xD6)
 def handle_talent_claim(session, data):
     """
     Handle 0xD6: client claiming a completed talent research.
@@ -1919,16 +1929,20 @@ def handle_talent_claim(session, data):
 
 
 
+@packet_handler(0xBB)
 def handle_hp_increase_notice(session, data):
        pass
 
+@packet_handler(0x78)
 def handle_char_regen(session, data):
       pass
 
 
+@packet_handler(0xF0)
 def handle_volume_enter(session, data):
      pass
 
+@packet_handler(0x7D)
 def handle_change_offset_y(session, data):
     payload = data[4:]
     br = BitReader(payload, debug=True)
@@ -1948,6 +1962,7 @@ def handle_change_offset_y(session, data):
     except Exception as e:
         print(f"[{session.addr}] [PKT125] Error parsing packet: {e}")
 
+@packet_handler(0x77, needs=ALL_SESSIONS)
 def handle_request_respawn(session, data, all_sessions):
     br = BitReader(data[4:], debug=False)
     try:
@@ -2051,8 +2066,9 @@ def _send_error(conn, msg):
 
 
 
-def handle_apply_dyes(session, payload):
-    br = BitReader(payload)
+@packet_handler(0xBA)
+def handle_apply_dyes(session, data):
+    br = BitReader(data[4:])
     try:
         entity_id = br.read_method_4()
         dyes_by_slot = {}
@@ -2226,6 +2242,7 @@ def send_dye_sync_packet(session, entity_id, dyes_by_slot, shirt_color=None, pan
 
 
 
+@packet_handler(0x19, needs=CONN)
 def PaperDoll_Request(session, data, conn):
     """
     Handles paperdoll request (0x19). Reads character name,
@@ -2247,7 +2264,8 @@ def PaperDoll_Request(session, data, conn):
         #print(f"[{session.addr}] [PKT0x19] Character '{name}' not found. Sent empty paperdoll.")
 
 
-def handle_pet_info_packet(session, data, all_sessions):
+@packet_handler(0xB3)
+def handle_pet_info_packet(session, data):
     """
     Handle packet type 0xB3 (SendPetInfoToServer).
     Updates the active pet (equippedPetID) and the restingPets list in the save file.
@@ -2301,7 +2319,8 @@ def handle_pet_info_packet(session, data, all_sessions):
         for line in reader.get_debug_log():
             print(line)
 
-def handle_mount_equip_packet(session, data, all_sessions):
+@packet_handler(0xB2)
+def handle_mount_equip_packet(session, data):
     """
     Handle packet type 0xB2 for equipping a mount on an entity.
     Parses the payload to extract Entity ID and Mount ID, prints them,
@@ -2337,10 +2356,8 @@ def handle_mount_equip_packet(session, data, all_sessions):
             print(f"[{session.addr}] [WARNING] Character {session.current_character} not found for PKT0xB2")
 
         # Broadcast to other sessions (optional, based on game design)
-        for other in all_sessions:
-            if other is not session and other.world_loaded and other.current_level == session.current_level:
-                other.conn.sendall(data)
-                print(f"[{session.addr}] [PKT0xB2] Broadcasted mount update to {other.addr}")
+        sent = broadcast_to_level(session, data)
+        print(f"[{session.addr}] [PKT0xB2] Broadcasted mount update to {sent} peers")
 
     except Exception as e:
         print(f"[{session.addr}] [PKT0xB2] Error parsing packet: {e}")
@@ -2348,7 +2365,8 @@ def handle_mount_equip_packet(session, data, all_sessions):
             print(line)
 
 
-def handle_emote_begin(session, data, all_sessions):
+@packet_handler(0x7E)
+def handle_emote_begin(session, data):
     """
     Packet 0x7E: an entity starts an emote.
     Client sends:
@@ -2373,16 +2391,10 @@ def handle_emote_begin(session, data, all_sessions):
     print(f"[{session.addr}] [PKT7E] Entity {entity_id} began emote \"{emote}\"")
 
     # 2) Broadcast unchanged packet to all other clients in the same level
-    for other in all_sessions:
-        if (other is not session
-            and other.world_loaded
-            and other.current_level == session.current_level):
-            try:
-                other.conn.sendall(data)
-            except Exception as e:
-                print(f"[{session.addr}] [PKT7E] Error forwarding to {other.addr}: {e}")
+    broadcast_to_level(session, data)
 
-def handle_entity_destroy(session, data, all_sessions):
+@packet_handler(0x0D)
+def handle_entity_destroy(session, data):
     """
     Packet 0x0D: an entity is destroyed/removed.
     Client sends: method_9(entityID)
@@ -2413,17 +2425,11 @@ def handle_entity_destroy(session, data, all_sessions):
         session.clientEntID = None
 
     # 4) Broadcast to peers
-    for other in all_sessions:
-        if (other is not session
-            and other.world_loaded
-            and other.current_level == session.current_level):
-            try:
-                other.conn.sendall(data)
-                print(f"[{session.addr}] [PKT0D] Broadcasted destroy to {other.addr}")
-            except Exception as e:
-                print(f"[{session.addr}] [PKT0D] Error sending to {other.addr}: {e}")
+    sent = broadcast_to_level(session, data)
+    print(f"[{session.addr}] [PKT0D] Broadcasted destroy to {sent} peers")
 
-def PKTTYPE_BUFF_TICK_DOT(session, data, all_sessions):
+@packet_handler(0x79)
+def PKTTYPE_BUFF_TICK_DOT(session, data):
 
 
     # 1) Strip off 0x79 + length, feed to BitReader
@@ -2443,17 +2449,11 @@ def PKTTYPE_BUFF_TICK_DOT(session, data, all_sessions):
           f"source={source_id}, power={power_type_id}, amount={amount}")
 
     # 2) Rebroadcast the exact same bytes to peers
-    for other in all_sessions:
-        if (other is not session
-            and other.world_loaded
-            and other.current_level == session.current_level):
-            try:
-                other.conn.sendall(data)
-            except Exception as e:
-                print(f"[{session.addr}] [PKT79] Forward error to {other.addr}: {e}")
+    broadcast_to_level(session, data)
 
 
-def handle_respawn_ack(session, data, all_sessions):
+@packet_handler(0x82)
+def handle_respawn_ack(session, data):
 
     br = BitReader(data[4:], debug=False)
     try:
@@ -2473,13 +2473,12 @@ def handle_respawn_ack(session, data, all_sessions):
         print(f"[{session.addr}] [PKT82] Entity {entity_id} respawned at {spawn_pos}, potion={used_potion}")
 
         # Optionally broadcast to peers: raw 0x82 or a custom update
-        for other in all_sessions:
-            if other is not session and other.world_loaded and other.current_level == session.current_level:
-                other.conn.sendall(data)
+        broadcast_to_level(session, data)
     else:
         print(f"[{session.addr}] [PKT82] Unknown entity {entity_id}")
 
-def handle_group_invite(session, data, all_sessions):
+@packet_handler(0x65)
+def handle_group_invite(session, data):
     """
     Packet 0x65: /invite <player>
     Only the invitee gets the 0x58 invite packet.
@@ -2500,14 +2499,9 @@ def handle_group_invite(session, data, all_sessions):
 
 
     # 2) Find the invitee’s session
-    invitee = next((
-        s for s in all_sessions
-        if s.authenticated
-           and s.current_character
-           and s.current_character.lower() == invitee_name.lower()
-    ), None)
-
-    if not invitee:
+    invitee = name_index.find_online(invitee_name)
+
+    if not invitee or not invitee.authenticated:
         _send_error(session.conn, f"Player {invitee_name} not found")
         print(f"[{session.addr}] [PKT65] Invitee {invitee_name} not found")
         return
@@ -2539,7 +2533,8 @@ def handle_group_invite(session, data, all_sessions):
     print(f"[{session.addr}] [PKT65] Sent 0x58 invite to {invitee.current_character}")
 
 
-def handle_public_chat(session, data, all_sessions):
+@packet_handler(0x2C)
+def handle_public_chat(session, data):
     """
     Packet 0x2C: global (level-wide) chat.
     Client sends: method_9(entity_id), method_26(message)
@@ -2569,61 +2564,37 @@ def handle_public_chat(session, data, all_sessions):
     packet = header + body
 
     # 3) Send to everyone else in the same level
-    for other in all_sessions:
-        if other is session:
-            continue
-        if not other.world_loaded or other.current_level != session.current_level:
-            continue
-        try:
-            other.conn.sendall(packet)
-            print(f"[{session.addr}] [PKT2C] → \"{message}\" to {other.addr} ({other.current_character})")
-        except Exception as e:
-            print(f"[{session.addr}] [PKT2C] Error sending to {other.addr}: {e}")
+    sent = broadcast_to_level(session, packet)
+    print(f"[{session.addr}] [PKT2C] → \"{message}\" to {sent} players in {session.current_level}")
 
-def handle_remove_buff(session, data, all_sessions):
+@packet_handler(0x0C)
+def handle_remove_buff(session, data):
     """
     Packet 0x0C: “remove buff” — client telling server to remove a buff.
     Mirrors AS3 method_1837:
       method_9(entity.id),
       method_9(buffTypeID),
       method_9(param2)
+    Forwarded as-is; only parsed when forwarding validation picks it.
     """
+    if forwarding.should_validate(0x0C):
+        payload = data[4:]
+        br = BitReader(payload, debug=False)
+        try:
+            br.read_method_9()  # param1.id
+            br.read_method_9()  # param2
+            br.read_method_9()  # param3
+        except Exception as e:
+            forwarding.record_invalid(0x0C)
+            print(f"[{session.addr}] [PKT0C] Error parsing remove-buff: {e}, raw={payload.hex()}")
+            return
 
+    # Broadcast unchanged packet to peers
+    sent = broadcast_to_level(session, data)
+    print(f"[{session.addr}] [PKT0C] Broadcasted to {sent} peers")
 
-    # 1) Strip header
-    payload = data[4:]
-    br = BitReader(payload, debug=False)
-
-    try:
-        # 2) Read all three var‐ints
-        entity_id   = br.read_method_9()  # param1.id
-        buff_type   = br.read_method_9()  # param2
-        instance_id = br.read_method_9()  # param3
-
-        # 3) Log parsed values
-        props = {
-            'entity_id':   entity_id,
-            'buff_type':   buff_type,
-            'instance_id': instance_id,
-        }
-        #print(f"[{session.addr}] [PKT0C] Parsed remove-buff:")
-        #pprint.pprint(props, indent=4)
-
-        # 4) Broadcast unchanged packet to peers
-        for other in all_sessions:
-            if (other is not session
-                and other.world_loaded
-                and other.current_level == session.current_level):
-                other.conn.sendall(data)
-                print(f"[{session.addr}] [PKT0C] Broadcasted to {other.addr}")
-
-    except Exception as e:
-        print(f"[{session.addr}] [PKT0C] Error parsing remove-buff: {e}, raw={payload.hex()}")
-        if br.debug:
-            for line in br.get_debug_log():
-                print(line)
-
-def handle_add_buff(session, data, all_sessions):
+@packet_handler(0x0B)
+def handle_add_buff(session, data):
     """
     Packet 0x0B: “add buff” — applies a buff/debuff with optional numeric modifiers.
     Mirrors AS3 method_1262:
@@ -2635,64 +2606,38 @@ def handle_add_buff(session, data, all_sessions):
       method_9(param6),
       method_15(vector!=null),
       [vector length + (powerNodeTypeID, modCount, modValues...)]
+    Forwarded as-is; only parsed when forwarding validation picks it.
     """
+    if forwarding.should_validate(0x0B):
+        payload = data[4:]
+        br = BitReader(payload, debug=False)
+        try:
+            # The six uints (all via method_9)
+            br.read_method_9()   # entity.id
+            br.read_method_9()   # param2
+            br.read_method_9()   # param3
+            br.read_method_9()   # param5 (note: client writes param5 _before_ param4)
+            br.read_method_9()   # param4
+            br.read_method_9()   # param6
+
+            # Optional Vector.<class_140>
+            if br.read_method_15():
+                length = br.read_method_9()
+                for _ in range(length):
+                    br.read_method_9()  # powerNodeTypeID
+                    for _ in range(br.read_method_9()):  # modCount
+                        br.read_method_560()
+        except Exception as e:
+            forwarding.record_invalid(0x0B)
+            print(f"[{session.addr}] [PKT0B] Error parsing add-buff: {e}, raw={payload.hex()}")
+            return
 
-
-    # 1) Strip header
-    payload = data[4:]
-    br = BitReader(payload, debug=False)
-
-    try:
-        # 2) Read the six uints (all via method_9)
-        entity_id  = br.read_method_9()
-        param2     = br.read_method_9()
-        param3     = br.read_method_9()
-        param5     = br.read_method_9()   # note: client writes param5 _before_ param4
-        param4     = br.read_method_9()
-        param6     = br.read_method_9()
-
-        # 3) Optional Vector.<class_140>
-        has_vector = bool(br.read_method_15())
-        vector     = []
-        if has_vector:
-            length = br.read_method_9()
-            for _ in range(length):
-                power_node_type_id = br.read_method_9()
-                mod_count          = br.read_method_9()
-                mods               = [br.read_method_560() for _ in range(mod_count)]
-                vector.append({
-                    'power_node_type_id': power_node_type_id,
-                    'mod_values':         mods
-                })
-
-        # 4) Log parsed values
-        props = {
-            'entity_id': entity_id,
-            'param2':     param2,
-            'param3':     param3,
-            'param4':     param4,
-            'param5':     param5,
-            'param6':     param6,
-            'vector':     vector if has_vector else None
-        }
-        #print(f"[{session.addr}] [PKT0B] Parsed add-buff:")
-        #pprint.pprint(props, indent=4)
-
-        # 5) Broadcast unchanged packet to peers
-        for other in all_sessions:
-            if (other is not session
-                and other.world_loaded
-                and other.current_level == session.current_level):
-                other.conn.sendall(data)
-
-    except Exception as e:
-        print(f"[{session.addr}] [PKT0B] Error parsing add-buff: {e}, raw={payload.hex()}")
-        if br.debug:
-            for line in br.get_debug_log():
-                print(line)
+    # Broadcast unchanged packet to peers
+    broadcast_to_level(session, data)
 
 
-def handle_projectile_explode(session, data, all_sessions):
+@packet_handler(0x0E)
+def handle_projectile_explode(session, data):
     """
     Packet 0x0E: “projectile explode” event.
     Mirrors AS3 WriteProjectileExplode:
@@ -2700,182 +2645,119 @@ def handle_projectile_explode(session, data, all_sessions):
       method_9(remoteMissileID),
       method_24(param3), method_24(param4),
       method_15(flag)
+    Forwarded as-is; only parsed when forwarding validation picks it.
     """
+    if forwarding.should_validate(0x0E):
+        payload = data[4:]
+        br = BitReader(payload, debug=False)
+        try:
+            # Projectile owner entity ID and the missile’s remote ID
+            br.read_method_9()
+            br.read_method_9()
 
+            # Explosion position (24-bit var‐int)
+            br.read_method_24()
+            br.read_method_24()
 
-    # 1) Strip packet header
-    payload = data[4:]
-    br = BitReader(payload, debug=False)
-
-    try:
-        # 2) Read projectile owner entity ID and the missile’s remote ID
-        entity_id       = br.read_method_9()
-        remote_missile  = br.read_method_9()
-
-        # 3) Read explosion position (24-bit var‐int)
-        x = br.read_method_24()
-        y = br.read_method_24()
-
-        # 4) Read the final flag (e.g. “spawn splatter”)
-        flag = bool(br.read_method_15())
-
-        # 5) Log for verification
-        props = {
-            'entity_id':      entity_id,
-            'remote_missile': remote_missile,
-            'x':              x,
-            'y':              y,
-            'flag':           flag,
-        }
-        #print(f"[{session.addr}] [PKT0E] Parsed projectile-explode:")
-        #pprint.pprint(props, indent=4)
-
-        # 6) Broadcast raw packet to peers
-        for other in all_sessions:
-            if (other is not session
-                and other.world_loaded
-                and other.current_level == session.current_level):
-                other.conn.sendall(data)
+            # The final flag (e.g. “spawn splatter”)
+            br.read_method_15()
+        except Exception as e:
+            forwarding.record_invalid(0x0E)
+            print(f"[{session.addr}] [PKT0E] Error parsing projectile explode: {e}, raw={payload.hex()}")
+            return
 
-    except Exception as e:
-        print(f"[{session.addr}] [PKT0E] Error parsing projectile explode: {e}, raw={payload.hex()}")
-        if br.debug:
-            for line in br.get_debug_log():
-                print(line)
+    # Broadcast raw packet to peers
+    broadcast_to_level(session, data)
 
 
-def handle_power_hit(session, data, all_sessions):
+@packet_handler(0x0A)
+def handle_power_hit(session, data):
     """
     Packet 0x0A: “power hit” event — source hit target, with optional extra params.
     Mirrors AS3 method_1092 exactly.
+    Forwarded as-is; only parsed (and logged) when forwarding validation picks it.
     """
+    if forwarding.should_validate(0x0A):
+        payload = data[4:]
+        br = BitReader(payload, debug=False)
+        try:
+            # IDs (both written with method_9 in AS3)
+            target_id = br.read_method_9()   # param3.id in client
+            source_id = br.read_method_9()   # param1.id in client
 
+            # Damage/effect value as 24-bit
+            value     = br.read_method_24()  # param4
 
-    # 1) Strip packet header
-    payload = data[4:]
-    br = BitReader(payload, debug=False)
-
-    try:
-        # 2) Read IDs (both written with method_9 in AS3)
-        target_id = br.read_method_9()   # param3.id in client
-        source_id = br.read_method_9()   # param1.id in client
-
-        # 3) Read damage/effect value as 24-bit
-        value     = br.read_method_24()  # param4
-
-        # 4) Read powerID (var-int)
-        power_id  = br.read_method_9()   # param2.powerID
-
-        # 5) Optional param5 (var-int)
-        has_p5    = bool(br.read_method_15())
-        param5    = br.read_method_9() if has_p5 else 0
-
-        # 6) Optional param6 (var-int)
-        has_p6    = bool(br.read_method_15())
-        param6    = br.read_method_9() if has_p6 else 0
-
-        # 7) Final boolean flag (crit? or similar)
-        param7    = bool(br.read_method_15())
-
-        # 8) Log what we got
-        props = {
-            'target_id': target_id,
-            'source_id': source_id,
-            'value':      value,
-            'power_id':   power_id,
-            'param5':     param5 if has_p5 else None,
-            'param6':     param6 if has_p6 else None,
-            'flag':       param7,
-        }
-        print(f"[{session.addr}] [PKT0A] Parsed power-hit:")
-        pprint.pprint(props, indent=4)
-
-        # 9) Broadcast unchanged packet to other clients
-        for other in all_sessions:
-            if (other is not session
-                and other.world_loaded
-                and other.current_level == session.current_level):
-                other.conn.sendall(data)
-
-    except Exception as e:
-        print(f"[{session.addr}] [PKT0A] Error parsing power-hit: {e}, raw={payload.hex()}")
-        if br.debug:
-            for line in br.get_debug_log():
-                print(line)
-
-def handle_power_cast(session, data, all_sessions):
-
+            # powerID (var-int)
+            power_id  = br.read_method_9()   # param2.powerID
 
-    payload = data[4:]
-    br = BitReader(payload, debug=False)
+            # Optional param5 (var-int)
+            has_p5    = bool(br.read_method_15())
+            param5    = br.read_method_9() if has_p5 else None
 
-    try:
-        ent_id   = br.read_method_9()
-        power_id = br.read_method_9()
-
-        # ← CORRECTED TARGET‐POINT HANDSHAKE
-        _ = br.read_method_15()                        # discard hasTargetEntity
-        has_target_pos = bool(br.read_method_15())     # var_2846: does this power type support coords?
-        target_pt = None
-        if has_target_pos:
-            target_x = br.read_method_24()
-            target_y = br.read_method_24()
-            target_pt = (target_x, target_y)
-
-        # projectile
-        has_proj = bool(br.read_method_15())
-        proj_id  = br.read_method_9() if has_proj else None
-
-        # charged flag
-        is_charged = bool(br.read_method_15())
-
-        # melee‐combo / var_674 branch
-        has_extra = bool(br.read_method_15())
-        secondary_id = tertiary_id = None
-        if has_extra:
-            is_secondary = bool(br.read_method_15())
-            if is_secondary:
-                secondary_id = br.read_method_9()
-            else:
-                tertiary_id = br.read_method_9()
+            # Optional param6 (var-int)
+            has_p6    = bool(br.read_method_15())
+            param6    = br.read_method_9() if has_p6 else None
 
-        # cooldown & mana
-        has_flags = bool(br.read_method_15())
-        cooldown_tick = mana_cost = None
-        if has_flags:
-            if bool(br.read_method_15()):
-                cooldown_tick = br.read_method_9()
-            if bool(br.read_method_15()):
-                MANA_BITS = PowerType.const_423
-                mana_cost = br.read_method_6(MANA_BITS)
+            # Final boolean flag (crit? or similar)
+            param7    = bool(br.read_method_15())
+        except Exception as e:
+            forwarding.record_invalid(0x0A)
+            print(f"[{session.addr}] [PKT0A] Error parsing power-hit: {e}, raw={payload.hex()}")
+            return
+        print(f"[{session.addr}] [PKT0A] Parsed power-hit: target={target_id}, source={source_id}, "
+              f"value={value}, power={power_id}, param5={param5}, param6={param6}, flag={param7}")
 
-        props = {
-            #'caster_ent_id': ent_id,
-            'power_id':      power_id,
-            #'target_pt':     target_pt,
-            #'projectile_id': proj_id,
-            #'is_charged':    is_charged,
-            #'secondary_id':  secondary_id,
-            #'tertiary_id':   tertiary_id,
-            #'cooldown_tick': cooldown_tick,
-            #'mana_cost':     mana_cost,
-        }
-        #print(f"[{session.addr}] [PKT09] Parsed power-cast:")
-        #pprint.pprint(props, indent=4)
+    # Broadcast unchanged packet to other clients
+    broadcast_near_player(session, data)
 
-        # broadcast to peers
-        for other in all_sessions:
-            if (other is not session
-                and other.world_loaded
-                and other.current_level == session.current_level):
-                other.conn.sendall(data)
+@packet_handler(0x09)
+def handle_power_cast(session, data):
+    """
+    Packet 0x09: power cast. Forwarded as-is; only parsed when forwarding
+    validation picks it.
+    """
+    if forwarding.should_validate(0x09):
+        payload = data[4:]
+        br = BitReader(payload, debug=False)
+        try:
+            br.read_method_9()                             # entity id
+            br.read_method_9()                             # power id
+
+            # ← CORRECTED TARGET‐POINT HANDSHAKE
+            _ = br.read_method_15()                        # discard hasTargetEntity
+            has_target_pos = bool(br.read_method_15())     # var_2846: does this power type support coords?
+            if has_target_pos:
+                br.read_method_24()                        # target x
+                br.read_method_24()                        # target y
+
+            # projectile
+            if br.read_method_15():
+                br.read_method_9()                         # projectile id
+
+            # charged flag
+            br.read_method_15()
+
+            # melee‐combo / var_674 branch
+            if br.read_method_15():
+                br.read_method_15()                        # secondary vs tertiary id
+                br.read_method_9()
+
+            # cooldown & mana
+            if br.read_method_15():
+                if br.read_method_15():
+                    br.read_method_9()                     # cooldown tick
+                if br.read_method_15():
+                    br.read_method_6(PowerType.const_423)  # mana cost
+        except Exception as e:
+            forwarding.record_invalid(0x09)
+            print(f"[{session.addr}] [PKT09] Error parsing power-cast: {e}")
+            return
 
-    except Exception as e:
-        print(f"[{session.addr}] [PKT09] Error parsing power-cast: {e}")
-        if br.debug:
-            for line in br.get_debug_log():
-                print(line)
+    # broadcast to peers
+    broadcast_near_player(session, data)
 
+@packet_handler(0xA2, needs=ALL_SESSIONS)
 def handle_linkupdater(session, data, all_sessions):
     # Only handle 0xA2 internally
 
@@ -2906,7 +2788,8 @@ def handle_linkupdater(session, data, all_sessions):
 
 
 
-def handle_entity_full_update(session, data, all_sessions):
+@packet_handler(0x08)
+def handle_entity_full_update(session, data):
     """
     Handle a full entity spawn/update (packet type 0x08) from a client.
     Parses the entity data, learns the client's own entity ID, maintains a server-side
@@ -3000,12 +2883,10 @@ def handle_entity_full_update(session, data, all_sessions):
         if not session.world_loaded:
             session.world_loaded = True
 
-        # 5) Broadcast raw packet to peers
-        for other in all_sessions:
-            if other is not session and other.world_loaded and other.current_level == session.current_level:
-                other.conn.sendall(data)
-                # Optionally log broadcast:
-                #print(f"[{session.addr}] [PKT08] Broadcasted to {other.addr}")
+        # 5) Broadcast raw packet to the peers that have this entity in view
+        broadcast_entity_update(session, data, entity_id, session.entities[entity_id])
+        # Optionally log broadcast:
+        #print(f"[{session.addr}] [PKT08] Broadcasted to level {session.current_level}")
 
     except Exception as e:
         print(f"[{session.addr}] [PKT08] Error parsing packet: {e}")
@@ -3014,7 +2895,8 @@ def handle_entity_full_update(session, data, all_sessions):
                 print(log_line)
 
 
-def handle_entity_incremental_update(session, data, all_sessions):
+@packet_handler(0x07)
+def handle_entity_incremental_update(session, data):
     # Only handle 0x07
 
     payload = data[4:]
@@ -3083,20 +2965,19 @@ def handle_entity_incremental_update(session, data, all_sessions):
         })
         session.entities[entity_id] = ent
 
-        # 7) Persist file only when non-dungeon and truly moving
+        # 7) Track the position only when non-dungeon, saved at checkpoints (see checkpoints.py)
         if ent.get('is_player') and not is_dungeon:
             for char in session.char_list:
                 if char['name'] == session.current_character:
-                    char['CurrentLevel'] = {'name': session.current_level, 'x': new_x, 'y': new_y}
-                    save_characters(session.user_id, session.char_list)
+                    checkpoints.record_position(session, char, new_x, new_y)
                     break
 
         print(f"[{session.addr}] [PKT07] | Entity_ID:{entity_id} | Moved to =({new_x},{new_y}), state={ent_state}")
 
-        # 8) Broadcast raw packet to peers
-        for other in all_sessions:
-            if other is not session and other.world_loaded and other.current_level == session.current_level:
-                other.conn.sendall(data)
+        # 8) Broadcast raw packet to peers in range; peers it just came into
+        #    view for need a full update first, the deltas alone would desync them
+        snapshot = (lambda: build_entity_full_update(entity_id, ent)) if 'ent_name' in ent else None
+        broadcast_entity_update(session, data, entity_id, ent, snapshot)
 
     except Exception as e:
         print(f"[{session.addr}] [PKT07] Error parsing packet: {e}")
@@ -3104,7 +2985,8 @@ def handle_entity_incremental_update(session, data, all_sessions):
             print(line)
 
 
-def handle_start_skit(session, data, all_sessions):
+@packet_handler(0xC5)
+def handle_start_skit(session, data):
     """
     Handle packet 0xC5: Client requests to start or stop a skit for an entity.
     - Reads entity ID, boolean flag, and text.
@@ -3127,9 +3009,7 @@ def handle_start_skit(session, data, all_sessions):
         payload = bb.to_bytes()
         packet = struct.pack(">HH", 0x76, len(payload)) + payload
 
-        for other_session in all_sessions:
-            if other_session.world_loaded and other_session.current_level == session.current_level:
-                other_session.conn.sendall(packet)
+        broadcast_to_level(session, packet, include_self=True)
 
         print(f"[{session.addr}] [PKT0xC5] Sent skit message from entity {entity_id}: '{text}'")
     else:
@@ -3137,6 +3017,7 @@ def handle_start_skit(session, data, all_sessions):
 
 
 
+@packet_handler(0xBD)
 def handle_hotbar_packet(session, raw_data):
     payload = raw_data[4:]
     reader = BitReader(payload)
@@ -3180,6 +3061,7 @@ def handle_hotbar_packet(session, raw_data):
 
 
 
+@packet_handler(0xD2)
 def handle_respec_talent_tree(session, data):
     """
     Handles client request 0xD2 to reset the talent tree using a Respec Stone.
@@ -3224,6 +3106,7 @@ def handle_respec_talent_tree(session, data):
 
 
 
+@packet_handler(0xC0)
 def allocate_talent_tree_points(session, data):
     payload = data[4:]
     br = BitReader(payload, debug=True)
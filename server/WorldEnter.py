@@ -2,6 +2,9 @@
 from typing import Dict
 
 from BitBuffer import BitBuffer
+import bulkpack
+import framing
+import segments
 import struct
 import time
 from constants import (
@@ -30,12 +33,55 @@ from constants import (
     class_119, class_111, class_9, class_66, MASTERCLASS_TO_BUILDING, class_21, Game, Mission, Entity,
 )
 from missions import get_total_mission_defs, get_mission_def
+from Character import build_level_gears_packets
+
+# the extended block counts the inventory in GEARTYPE_BITSTOSEND bits,
+# gears past that go out in follow-up 0xF5 packets (build_player_data_packets)
+MAX_INVENTORY_GEARS = (1 << GearType.GEARTYPE_BITSTOSEND) - 1
 
 CLASS_BUILD_ORDER = {
     "paladin": [2, 12, 3, 4, 5, 1, 13],
     "mage":    [2, 12, 6, 7, 8, 1, 13],
     "rogue":   [2, 12, 9, 10,11, 1, 13],
 }
+def _pack_inventory_gears(inventory_gears):
+    """
+    The inventory gear entries of the extended block as one segment (same
+    bits as the per-gear loop in Player_Data_Packet): gearID, tier,
+    has_modifiers, then if it is set a presence bit + value per rune/colour.
+    """
+    rows = len(inventory_gears)
+    gear_ids = [gear.get("gearID", 0) for gear in inventory_gears]
+    tiers = [gear.get("tier", 0) for gear in inventory_gears]
+    modifiers = []  # (runes, colors) when the gear has any, else None
+    for gear in inventory_gears:
+        runes = gear.get("runes", [0, 0, 0])
+        colors = gear.get("colors", [0, 0])
+        has_modifiers = runes.count(0) != len(runes) or colors.count(0) != len(colors)
+        modifiers.append((runes, colors) if has_modifiers else None)
+
+    has_mods = [0 if m is None else 1 for m in modifiers]
+    columns = [(gear_ids, 11), (tiers, GearType.const_176), (has_mods, 1)]
+    if any(has_mods):
+        # presence bit only when has_modifiers, value only when present
+        for part, i, width in ((0, 0, 16), (0, 1, 16), (0, 2, 16), (1, 0, 8), (1, 1, 8)):
+            values = [0 if m is None else m[part][i] for m in modifiers]
+            present = [1 if v != 0 else 0 for v in values]
+            columns.append((present, has_mods))
+            columns.append((values, [width if p else 0 for p in present]))
+    return bulkpack.pack_columns(columns, rows)
+
+
+def _inventory_gear_bits(gear):
+    """Bits one inventory gear takes in the extended block."""
+    bits = GEARTYPE_BITS + GearType.const_176 + 1  # id, tier, has_modifiers
+    runes = gear.get("runes", [0, 0, 0])
+    colors = gear.get("colors", [0, 0])
+    if any(rune != 0 for rune in runes) or any(color != 0 for color in colors):
+        bits += 5 + 16 * sum(1 for rune in runes[:3] if rune != 0) + 8 * sum(1 for color in colors[:2] if color != 0)
+    return bits
+
+
 def Player_Data_Packet(char: dict,
                        event_index: int = 5,
                        transfer_token: int = 0,
@@ -45,7 +91,8 @@ def Player_Data_Packet(char: dict,
                        new_x: int = None,
                        new_y: int = None,
                        new_has_coord: bool = True,
-                       send_extended: bool = False) -> bytes:
+                       send_extended: bool = False,
+                       max_inventory_gears: int = MAX_INVENTORY_GEARS) -> bytes:
     buf = BitBuffer()
 
     # ──────────────(Preamble)──────────────
@@ -59,18 +106,19 @@ def Player_Data_Packet(char: dict,
     buf.write_method_4(bonus_levels)  # _loc5_
 
     # ──────────────(Customization)──────────────
-    buf.write_method_13(char.get("name", "") or "")
-    buf.write_method_11(1, 1)  # hasCustomization
-    buf.write_method_13(char.get("class", "") or "")
-    buf.write_method_13(char.get("gender", "") or "")
-    buf.write_method_13(char.get("headSet", "") or "")
-    buf.write_method_13(char.get("hairSet", "") or "")
-    buf.write_method_13(char.get("mouthSet", "") or "")
-    buf.write_method_13(char.get("faceSet", "") or "")
-    buf.write_method_11(char.get("hairColor", 0), 24)
-    buf.write_method_11(char.get("skinColor", 0), 24)
-    buf.write_method_11(char.get("shirtColor", 0), 24)
-    buf.write_method_11(char.get("pantColor", 0), 24)
+    # name, hasCustomization, class/gender/head/hair/mouth/face, 4 colours (24 bits)
+    segments.write_appearance(buf,
+                              char.get("name", "") or "",
+                              char.get("class", "") or "",
+                              char.get("gender", "") or "",
+                              char.get("headSet", "") or "",
+                              char.get("hairSet", "") or "",
+                              char.get("mouthSet", "") or "",
+                              char.get("faceSet", "") or "",
+                              char.get("hairColor", 0),
+                              char.get("skinColor", 0),
+                              char.get("shirtColor", 0),
+                              char.get("pantColor", 0))
 
     # ──────────────(Gear Slots)──────────────
     gear_list = char.get("equippedGears", [])
@@ -135,8 +183,11 @@ def Player_Data_Packet(char: dict,
 
 
         # ──────────────(Inventory Gears)──────────────
-        inventory_gears = char.get("inventoryGears", [])
+        inventory_gears = char.get("inventoryGears", [])[:max_inventory_gears]
         buf.write_method_6(len(inventory_gears), GearType.GEARTYPE_BITSTOSEND)  # Number of gears (11 bits)
+        if not buf.debug:
+            buf.write_segment(_pack_inventory_gears(inventory_gears))
+            inventory_gears = ()  # traced buffers write them field by field below
         for gear in inventory_gears:
             gear_id = gear.get("gearID", 0)
             tier = gear.get("tier", 0)
@@ -168,7 +219,7 @@ def Player_Data_Packet(char: dict,
         gear_sets = char.get("gearSets", [])
         buf.write_method_6(len(gear_sets), GearType.const_348)
         for gs in gear_sets:
-            buf.write_method_13(gs.get("name", ""))
+            segments.write_method_13(buf, gs.get("name", ""))
             slots = gs.get("slots", [])
             slots = (slots + [0] * 6)[:6]  # pad/truncate to 6
             for gear_id in slots:
@@ -252,9 +303,12 @@ def Player_Data_Packet(char: dict,
         # ──────────────(dyes)──────────────
         owned_dyes = set(char.get("OwnedDyes", []))  # fast membership checking
 
-        for dye_id in range(1, class_21.const_763 + 1):
-            has_dye = 1 if dye_id in owned_dyes else 0
-            buf.write_method_11(has_dye, 1)
+        if not buf.debug:
+            buf.write_segment(bulkpack.pack_flags(owned_dyes, class_21.const_763))
+        else:
+            for dye_id in range(1, class_21.const_763 + 1):
+                has_dye = 1 if dye_id in owned_dyes else 0
+                buf.write_method_11(has_dye, 1)
 
 
         # ──────────────(consumables)──────────────
@@ -616,7 +670,40 @@ def Player_Data_Packet(char: dict,
        # client automatically adds your own entry at the end
 
     payload = buf.to_bytes()
-    return struct.pack(">HH", 0x10, len(payload)) + payload
+    return framing.frame(0x10, payload)
+
+
+def build_player_data_packets(char: dict, send_extended: bool = False, send_overflow: bool = True,
+                              **kwargs) -> list[bytes]:
+    """
+    Player_Data_Packet, split to fit the frame: the extended block carries
+    at most MAX_INVENTORY_GEARS inventory gears, fewer if the payload would
+    pass framing.MAX_PAYLOAD, and the rest follow as 0xF5 level-gear
+    packets (gear ID and tier only). send_overflow=False leaves those out,
+    for callers that send the whole inventory as 0xF5 anyway (CraftTown).
+    """
+    inventory = char.get("inventoryGears", [])
+    limit = MAX_INVENTORY_GEARS
+    while True:
+        try:
+            packet = Player_Data_Packet(char, send_extended=send_extended, max_inventory_gears=limit, **kwargs)
+            break
+        except framing.PacketTooLarge as e:
+            sent = min(limit, len(inventory))
+            if not send_extended or not sent:
+                raise
+            # drop gears off the end until their bits cover the excess
+            over_bits = (e.size - framing.MAX_PAYLOAD) * 8
+            while sent and over_bits > 0:
+                sent -= 1
+                over_bits -= _inventory_gear_bits(inventory[sent])
+            limit = sent
+    packets = [packet]
+    if send_extended and send_overflow and len(inventory) > limit:
+        overflow = inventory[limit:]
+        print(f"[DEBUG] {char.get('name')}: {len(overflow)} inventory gears moved to 0xF5 packets")
+        packets.extend(build_level_gears_packets([(gear.get("gearID", 0), gear.get("tier", 0)) for gear in overflow]))
+    return packets
 
 #TODO... all this does is just update the building visuals when the player join the game from a saved account nothing important
 # it should be send as a response on (0x1f) packet when joining "CraftTown" level
@@ -679,7 +766,7 @@ def build_enter_world_packet(
     buf.write_method_4(old_level_id)
 
     # 3) old SWF path (_loc6_)
-    buf.write_method_13(old_swf)
+    segments.write_method_13(buf, old_swf)
 
     # 4) old coords? + values (_loc8_, _loc2_, _loc3_)
     buf.write_method_11(1 if has_old_coord else 0, 1)
@@ -688,22 +775,22 @@ def build_enter_world_packet(
         buf.write_method_4(old_y)
 
     # 5) host (_loc9_)
-    buf.write_method_13(host)
+    segments.write_method_13(buf, host)
 
     # 6) port (_loc10_)
     buf.write_method_4(port)
 
     # 7) new SWF path (_loc11_)
-    buf.write_method_13(new_level_swf)
+    segments.write_method_13(buf, new_level_swf)
 
     # 8) new_map_lvl, new_base_lvl (_loc12_, _loc13_, 6 bits each)
     buf.write_method_6(new_map_lvl, MAX_CHAR_LEVEL_BITS)
     buf.write_method_6(new_base_lvl, MAX_CHAR_LEVEL_BITS)
 
     # 9) new strings (_loc14_, _loc15_, _loc16_)
-    buf.write_method_13(new_internal)
-    buf.write_method_13(new_moment)
-    buf.write_method_13(new_alter)
+    segments.write_method_13(buf, new_internal)
+    segments.write_method_13(buf, new_moment)
+    segments.write_method_13(buf, new_alter)
 
     # 10) new_is_dungeonanced flag (_loc17_)
     buf.write_method_11(1 if new_is_dungeon else 0, 1)
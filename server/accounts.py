@@ -1,56 +1,60 @@
 # accounts.py
 
-import os
-import json
 import struct
-import tempfile
-from threading import Lock
+import time
+from threading import Lock, Thread
 from uuid import uuid4
 
 from BitBuffer import BitBuffer
+import storage
 
-_ACCOUNTS_PATH = "Accounts.json"
-_SAVES_DIR     = "saves"
 _lock          = Lock()
 
-def _atomic_write(path: str, data) -> None:
-    """
-    Atomically write JSON-serializable `data` to `path`.
-    Writes to a temp file then renames it into place.
-    """
-    # Ensure directory exists
-    dirpath = os.path.dirname(path) or "."
-    os.makedirs(dirpath, exist_ok=True)
+COMPACT_AFTER    = 1000  # journal entries that trigger a compaction
+COMPACT_INTERVAL = 60.0  # seconds between compaction checks
 
-    # Write to a temp file in the same directory
-    with tempfile.NamedTemporaryFile("w", dir=dirpath, delete=False, encoding="utf-8") as tf:
-        json.dump(data, tf, ensure_ascii=False, indent=2)
-        tf.flush()
-        os.fsync(tf.fileno())
+# email -> user_id, loaded once from the storage backend and kept in step
+_index    = None
+_compactor = None
 
-    # Atomically replace the target
-    os.replace(tf.name, path)
+def _load_index():
+    global _index
+    _index = storage.get_backend().load_directory()
 
-def load_accounts() -> dict[str, str]:
-    """
-    Load Accounts.json and return a dict mapping email → user_id.
-    If the file is missing or corrupted, returns an empty dict.
-    """
-    try:
-        with open(_ACCOUNTS_PATH, "r", encoding="utf-8") as f:
-            entries = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-    # entries is a list of {"email":..., "user_id":...}
-    return { e["email"]: e["user_id"] for e in entries }
-
-def save_accounts_index(index: dict[str, str]) -> None:
-    """
-    Persist the email→user_id map to Accounts.json atomically.
-    """
-    entries = [ {"email": email, "user_id": uid} for email, uid in index.items() ]
+def lookup_user_id(email: str):
+    """user_id for an email, or None. Asks the backend again on a miss in case another process registered it."""
+    email = email.strip().lower()
     with _lock:
-        _atomic_write(_ACCOUNTS_PATH, entries)
+        if _index is None:
+            _load_index()
+        user_id = _index.get(email)
+        if user_id is None:
+            _index.update(storage.get_backend().directory_updates())
+            user_id = _index.get(email)
+        return user_id
+
+def compact_accounts() -> bool:
+    """Fold the registration journal into Accounts.json (JSON backend only)."""
+    if _index is None:
+        return False
+    return storage.get_backend().compact(_index, _lock)
+
+def _run_compactor():
+    while True:
+        time.sleep(COMPACT_INTERVAL)
+        try:
+            if storage.get_backend().pending() >= COMPACT_AFTER:
+                compact_accounts()
+        except Exception as e:
+            print(f"[Accounts] Compaction failed: {e}")
+
+def start_compactor():
+    """Start the background journal compaction (once)."""
+    global _compactor
+    if _compactor is None:
+        _compactor = Thread(target=_run_compactor, name="accounts-compactor", daemon=True)
+        _compactor.start()
+    return _compactor
 
 def get_or_create_user_id(email: str) -> str:
     """
@@ -58,42 +62,24 @@ def get_or_create_user_id(email: str) -> str:
     Always lowercases the email for consistency.
     """
     email = email.strip().lower()
-    accounts = load_accounts()
-
-    if email in accounts:
-        return accounts[email]
+    user_id = lookup_user_id(email)
+    if user_id is not None:
+        return user_id
 
     # New registration
-    user_id = uuid4().hex[:12]
-    accounts[email] = user_id
-    save_accounts_index(accounts)
+    with _lock:
+        user_id = _index.get(email)
+        if user_id is not None:
+            return user_id
+        user_id = uuid4().hex[:12]
+        storage.get_backend().register(email, user_id)
+        _index[email] = user_id
 
-    # Initialize an empty save file
-    os.makedirs(_SAVES_DIR, exist_ok=True)
-    save_path = os.path.join(_SAVES_DIR, f"{user_id}.json")
-    _atomic_write(save_path, {"email": email, "characters": []})
+    # Initialize an empty save
+    storage.get_backend().save(user_id, {"email": email, "characters": []})
 
     return user_id
 
-def is_character_name_taken(name: str) -> bool:
-    """
-    Check if a character name exists in any user's save file.
-    """
-    name = name.strip().lower()
-    accounts = load_accounts()
-    for user_id in accounts.values():
-        save_path = os.path.join(_SAVES_DIR, f"{user_id}.json")
-        try:
-            with open(save_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                characters = data.get("characters", [])
-                for char in characters:
-                    if char.get("name", "").strip().lower() == name:
-                        return True
-        except (FileNotFoundError, json.JSONDecodeError):
-            continue
-    return False
-
 def build_popup_packet(message: str, disconnect: bool = False) -> bytes:
     """
     Build a 0x1B packet with a message and disconnect flag.
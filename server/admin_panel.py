@@ -8,6 +8,13 @@ import threading
 import time
 from BitBuffer import BitBuffer
 from entity import Send_Entity_Data
+from packet_registry import get_packet_stats
+from simulation import get_simulation_stats
+from forwarding import get_forward_stats
+from char_store import get_store_stats
+from checkpoints import get_checkpoint_stats
+from name_index import get_name_stats
+import tracing
 
 app = Flask(__name__)
 
@@ -83,6 +90,68 @@ def active_players():
     return jsonify(players)
 
 
+@app.route('/packet_stats', methods=['GET'])
+def packet_stats():
+    return jsonify(get_packet_stats())
+
+
+@app.route('/simulation_stats', methods=['GET'])
+def simulation_stats():
+    return jsonify(get_simulation_stats())
+
+
+@app.route('/forward_stats', methods=['GET'])
+def forward_stats():
+    return jsonify(get_forward_stats())
+
+
+@app.route('/store_stats', methods=['GET'])
+def store_stats():
+    return jsonify(get_store_stats())
+
+
+@app.route('/checkpoint_stats', methods=['GET'])
+def checkpoint_stats():
+    return jsonify(get_checkpoint_stats())
+
+
+@app.route('/name_stats', methods=['GET'])
+def name_stats():
+    return jsonify(get_name_stats())
+
+
+@app.route('/tracing', methods=['GET', 'POST'])
+def tracing_toggle():
+    """POST {"enabled": true, "opcodes": ["0x07"], "sessions": ["Name"]} to trace, {"enabled": false} to stop."""
+    if request.method == 'POST':
+        data = request.json or {}
+        if data.get('enabled'):
+            try:
+                opcodes = [int(str(op), 16) for op in data.get('opcodes') or []]
+            except ValueError:
+                return jsonify({'error': 'Opcodes must be hex strings like "0x07"'}), 400
+            tracing.enable(opcodes, data.get('sessions'))
+        else:
+            tracing.disable()
+    return jsonify(tracing.status())
+
+
+@app.route('/session_queues', methods=['GET'])
+def session_queues():
+    """Outbound queue depth/bytes per session, slowest consumers first."""
+    rows = []
+    for session in list(sessions_getter()):
+        queue_stats = getattr(session.conn, "queue_stats", None)
+        if not queue_stats:
+            continue
+        row = queue_stats()
+        row["addr"] = tracing.format_addr(session.addr)
+        row["character"] = session.current_character
+        rows.append(row)
+    rows.sort(key=lambda r: r["pending_bytes"], reverse=True)
+    return jsonify(rows)
+
+
 @app.route('/')
 def index():
     return render_template('admin_panel.html',
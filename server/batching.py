@@ -0,0 +1,124 @@
+"""
+Optional per-tick batching of entity updates.
+
+With batching on, the 0x07/0x08 fan-out of a level (player movement, resync
+snapshots and NPC brain moves) is not sent right away but collected per
+observer, and the simulation loop hands each observer everything collected
+during the tick as one buffer: one sendall() per observer per tick instead
+of one per update. The byte stream is exactly what the observer would have
+received otherwise, only later (at most one tick).
+
+Other packets are still sent immediately, so they may overtake movement
+queued in the same tick.
+"""
+import threading
+import time
+
+BATCH_UPDATES = False
+
+_stats_lock = threading.Lock()
+_stats = {
+    "frames": 0,        # updates queued
+    "writes": 0,        # sendall() calls made for them
+    "bytes": 0,
+    "latency_ns": 0,    # summed over frames, queue -> flush
+    "max_latency_ns": 0,
+    "max_batch": 0,     # most frames in one write
+}
+
+
+def configure(enabled):
+    global BATCH_UPDATES
+    BATCH_UPDATES = bool(enabled)
+
+
+def enabled():
+    return BATCH_UPDATES
+
+
+class UpdateBatch:
+    """Updates waiting for the next tick, per observer session, for one level."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # session -> [(queued_ns, frame), ...]
+
+    def add(self, recipients, frame):
+        now = time.perf_counter_ns()
+        entry = (now, frame)
+        with self._lock:
+            pending = self._pending
+            for other in recipients:
+                queued = pending.get(other)
+                if queued is None:
+                    pending[other] = [entry]
+                else:
+                    queued.append(entry)
+
+    def __bool__(self):
+        return bool(self._pending)
+
+    def flush(self, level_name=""):
+        """Send everything queued, one write per observer. Returns the number of writes."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+        now = time.perf_counter_ns()
+        writes = frames = size = latency = max_latency = max_batch = 0
+        for other, queued in pending.items():
+            if len(queued) == 1:
+                buf = queued[0][1]
+            else:
+                buf = b"".join(frame for _, frame in queued)
+            try:
+                other.conn.sendall(buf)
+            except Exception as e:
+                print(f"[{other.addr}] [Level {level_name}] Batched update error: {e}")
+                continue
+            writes += 1
+            frames += len(queued)
+            size += len(buf)
+            if len(queued) > max_batch:
+                max_batch = len(queued)
+            for queued_ns, _ in queued:
+                waited = now - queued_ns
+                latency += waited
+                if waited > max_latency:
+                    max_latency = waited
+        _record(writes, frames, size, latency, max_latency, max_batch)
+        return writes
+
+
+def _record(writes, frames, size, latency, max_latency, max_batch):
+    with _stats_lock:
+        _stats["writes"] += writes
+        _stats["frames"] += frames
+        _stats["bytes"] += size
+        _stats["latency_ns"] += latency
+        if max_latency > _stats["max_latency_ns"]:
+            _stats["max_latency_ns"] = max_latency
+        if max_batch > _stats["max_batch"]:
+            _stats["max_batch"] = max_batch
+
+
+def get_batch_stats():
+    with _stats_lock:
+        st = dict(_stats)
+    frames = st["frames"]
+    return {
+        "enabled": BATCH_UPDATES,
+        "frames": frames,
+        "writes": st["writes"],
+        "sends_saved": frames - st["writes"],
+        "bytes": st["bytes"],
+        "avg_frames_per_write": frames / st["writes"] if st["writes"] else 0.0,
+        "max_frames_per_write": st["max_batch"],
+        "avg_added_latency_ms": st["latency_ns"] / frames / 1e6 if frames else 0.0,
+        "max_added_latency_ms": st["max_latency_ns"] / 1e6,
+    }
+
+
+def reset_batch_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Account directory (accounts.py: in-memory index + append-only journal of
+the JSON storage backend)
+vs. the old Accounts.json handling, on synthetic accounts:
+
+- lookup:   old = parse the whole Accounts.json per login, new = dict lookup
+- register: old = parse + rewrite the whole file per signup, new = one
+            journal line (both also create the empty save file)
+- startup load and compaction of the journal into Accounts.json
+
+Then checks that a fresh load (Accounts.json + journal) and a load after
+compaction both give exactly the expected directory. Runs in a temporary
+directory, nothing in the server tree is touched.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_accounts.py [--accounts 100000] [--signups 20]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import accounts
+import storage
+
+
+ACCOUNTS_PATH = "Accounts.json"
+SAVES_DIR = "saves"
+
+
+# the old load_accounts / get_or_create_user_id, for comparison
+###################################
+def legacy_atomic_write(path, data):
+    dirpath = os.path.dirname(path) or "."
+    os.makedirs(dirpath, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=dirpath, delete=False, encoding="utf-8") as tf:
+        json.dump(data, tf, ensure_ascii=False, indent=2)
+        tf.flush()
+        os.fsync(tf.fileno())
+    os.replace(tf.name, path)
+
+
+def legacy_load_accounts():
+    try:
+        with open(ACCOUNTS_PATH, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return {e["email"]: e["user_id"] for e in entries}
+
+
+def legacy_get_or_create_user_id(email):
+    email = email.strip().lower()
+    index = legacy_load_accounts()
+    if email in index:
+        return index[email]
+    user_id = uuid4().hex[:12]
+    index[email] = user_id
+    legacy_atomic_write(ACCOUNTS_PATH, [{"email": e, "user_id": u} for e, u in index.items()])
+    legacy_atomic_write(os.path.join(SAVES_DIR, f"{user_id}.json"), {"email": email, "characters": []})
+    return user_id
+
+
+def reset_directory():
+    storage.configure("json")
+    accounts._index = None
+
+
+def load_directory():
+    """Load the directory the way the first login does, return it."""
+    accounts.lookup_user_id("")
+    return accounts._index
+
+
+def timed(fn, items):
+    t0 = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - t0) / len(items)
+
+
+def fmt(seconds):
+    return f"{seconds * 1e3:9.3f} ms" if seconds >= 1e-4 else f"{seconds * 1e6:9.2f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=100000)
+    parser.add_argument("--signups", type=int, default=20, help="registrations timed on the old path")
+    parser.add_argument("--lookups", type=int, default=20, help="logins timed on the old path")
+    args = parser.parse_args()
+    rnd = random.Random(23)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        expected = {f"player{i}@example.com": f"{i:012x}" for i in range(args.accounts)}
+        with open(ACCOUNTS_PATH, "w", encoding="utf-8") as f:
+            json.dump([{"email": e, "user_id": u} for e, u in expected.items()], f, indent=2)
+        emails = list(expected)
+        print(f"{args.accounts} accounts, Accounts.json {os.path.getsize(ACCOUNTS_PATH) / 1e6:.1f} MB")
+        print(f"{'operation':<28}{'old':>13}{'new':>13}")
+
+        sample = [rnd.choice(emails) for _ in range(args.lookups)]
+        old_lookup = timed(lambda e: legacy_load_accounts()[e], sample)
+        t0 = time.perf_counter()
+        load_directory()
+        startup = time.perf_counter() - t0
+        new_lookup = timed(accounts.lookup_user_id, [rnd.choice(emails) for _ in range(10000)])
+        print(f"{'login lookup':<28}{fmt(old_lookup):>13}{fmt(new_lookup):>13}")
+        print(f"{'startup load':<28}{'-':>13}{fmt(startup):>13}")
+
+        old_signups = [f"legacy{i}@example.com" for i in range(args.signups)]
+        old_register = timed(legacy_get_or_create_user_id, old_signups)
+        expected.update(legacy_load_accounts())
+        reset_directory()
+        load_directory()
+        new_signups = [f"new{i}@example.com" for i in range(max(args.signups, 1000))]
+        new_register = timed(accounts.get_or_create_user_id, new_signups)
+        print(f"{'registration':<28}{fmt(old_register):>13}{fmt(new_register):>13}")
+
+        for email in new_signups:
+            expected[email] = accounts.lookup_user_id(email)
+        reset_directory()
+        ok = load_directory() == expected  # Accounts.json + journal replay
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            accounts.compact_accounts()
+        print(f"{'compaction':<28}{'-':>13}{fmt(time.perf_counter() - t0):>13}")
+        reset_directory()
+        ok &= load_directory() == expected and not os.path.exists(storage.get_backend().journal_path)
+        print("directory after journal replay and compaction:", "OK" if ok else "MISMATCH")
+        os.chdir(cwd)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
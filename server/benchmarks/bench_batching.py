@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Per-tick update batching: 30 players moving around CraftTown, each sending
+0x07 at the client's update rate, fanned out by the real 0x07 handler to
+OutboundQueues over socket pairs. Runs once sending right away and once
+with batching.BATCH_UPDATES, and compares the socket writes the outbound
+writer threads had to make (each flush is one sendmsg/sendall syscall) and
+the latency batching adds.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_batching.py [--players 30] [--seconds 5] [--tick-rate 10]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Commands  # registers the packet handlers
+import batching
+import simulation
+from bench_interest import FakeSession, full_update, movement
+from levels import join_level, leave_level
+from outbound import OutboundQueue
+from packet_registry import get_handler
+
+LEVEL = "CraftTown"
+CLIENT_RATE = 20  # 0x07 per player per second while moving
+
+
+def drain(sock):
+    try:
+        while sock.recv(65536):
+            pass
+    except OSError:
+        pass
+
+
+def run(players, seconds, tick_rate, batched):
+    batching.configure(batched)
+    batching.reset_batch_stats()
+    simulation.configure(tick_rate)
+    rnd = random.Random(3)
+    on_full = get_handler(0x08)
+    on_move = get_handler(0x07)
+
+    sessions, peers = [], []
+    for i in range(players):
+        ours, theirs = socket.socketpair()
+        threading.Thread(target=drain, args=(theirs,), daemon=True).start()
+        s = FakeSession(i)
+        s.current_level = LEVEL
+        s.conn = OutboundQueue(ours, s.addr)
+        s.clientEntID = 2000 + i
+        join_level(s, LEVEL)
+        sessions.append(s)
+        peers.append(theirs)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for s in sessions:
+            s.world_loaded = True
+            on_full(s, full_update(s.clientEntID, rnd.randint(0, 3000), 600, s.current_character))
+    simulation.tick()  # spawns go out before measuring
+    time.sleep(0.2)
+    batching.reset_batch_stats()
+    base = sum(s.conn.flushes for s in sessions)
+    base_frames = sum(s.conn.frames_queued for s in sessions)
+
+    stop = threading.Event()
+
+    def ticker():
+        period = 1.0 / tick_rate
+        deadline = time.monotonic()
+        while not stop.is_set():
+            simulation.tick()
+            deadline += period
+            time.sleep(max(0.0, deadline - time.monotonic()))
+
+    tick_thread = threading.Thread(target=ticker, daemon=True)
+    tick_thread.start()
+
+    # clients are not in lockstep: spread each round of updates over the period
+    sink = io.StringIO()
+    step = 1.0 / CLIENT_RATE / players
+    deadline = time.monotonic()
+    with contextlib.redirect_stdout(sink):
+        for _ in range(seconds * CLIENT_RATE):
+            for s in sessions:
+                on_move(s, movement(s.clientEntID, rnd.randint(-12, 12), 0, 0, True))
+                deadline += step
+                time.sleep(max(0.0, deadline - time.monotonic()))
+            sink.seek(0)
+            sink.truncate()
+    stop.set()
+    tick_thread.join()
+    simulation.tick()
+    time.sleep(0.3)
+
+    writes = sum(s.conn.flushes for s in sessions) - base
+    sends = sum(s.conn.frames_queued for s in sessions) - base_frames
+    stats = batching.get_batch_stats()
+    for s in sessions:
+        leave_level(s)
+        s.conn.close()
+    for p in peers:
+        p.close()
+    return writes, sends, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=30)
+    parser.add_argument("--seconds", type=int, default=5)
+    parser.add_argument("--tick-rate", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{args.players} players in {LEVEL}, 0x07 at {CLIENT_RATE} Hz each, "
+          f"{args.seconds}s, ticks at {args.tick_rate} Hz")
+    print(f"{'mode':<10}{'sendall':>10}{'syscalls':>10}{'syscalls/s/player':>19}{'avg +ms':>9}{'max +ms':>9}")
+    results = {}
+    for batched in (False, True):
+        writes, sends, stats = run(args.players, args.seconds, args.tick_rate, batched)
+        results[batched] = writes
+        label = "batched" if batched else "immediate"
+        avg = f"{stats['avg_added_latency_ms']:.1f}" if batched else "-"
+        mx = f"{stats['max_added_latency_ms']:.1f}" if batched else "-"
+        print(f"{label:<10}{sends:>10}{writes:>10}{writes / args.seconds / args.players:>19.1f}{avg:>9}{mx:>9}")
+    print(f"syscalls saved: {results[False] - results[True]} "
+          f"({1 - results[True] / max(1, results[False]):.0%})")
+
+
+if __name__ == "__main__":
+    main()
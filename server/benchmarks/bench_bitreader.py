@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+BitReader (memoryview, word-at-a-time) vs. the old byte-copying reader
+(legacy_codecs.BytearrayBitReader) on the 0x07, 0x08 and 0x0A parse paths, as
+the handlers read them. Before timing, random read sequences over random
+data are checked to give the same values (and the same errors) in both, and
+the same debug logs with debug=True.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_bitreader.py
+"""
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BitBuffer import BitBuffer
+from bitreader import BitReader
+from legacy_codecs import BytearrayBitReader
+from constants import Entity
+from entity import build_entity_full_update
+from movement import encode_movement
+import tracing
+
+
+# parse paths, field for field as handle_entity_incremental_update,
+# handle_entity_full_update and handle_power_hit read them
+###################################
+def parse_0x07(cls, payload):
+    br = cls(payload)
+    entity_id = br.read_method_4()
+    dx, dy, dvx = br.read_method_45(), br.read_method_45(), br.read_method_45()
+    state = br.read_method_6(Entity.const_316)
+    flags = [bool(br.read_method_15()) for _ in range(5)]
+    vy = br.read_method_24() if br.read_method_15() else 0
+    return entity_id, dx, dy, dvx, state, flags, vy
+
+
+def parse_0x08(cls, payload):
+    br = cls(payload)
+    out = [br.read_method_9(), br.read_method_24(), br.read_method_24(), br.read_method_24(),
+           br.read_method_13(), br.read_method_6(Entity.TEAM_BITS), bool(br.read_method_15()),
+           br.read_method_739()]
+    if br.read_method_15():
+        for _ in range(3):
+            out.append(br.read_method_13() if br.read_method_15() else None)
+    out.append(br.read_method_9() if br.read_method_15() else None)
+    out.append(br.read_method_9() if br.read_method_15() else None)
+    out.append(br.read_method_6(Entity.const_316))
+    out.extend(bool(br.read_method_15()) for _ in range(5))
+    return out
+
+
+def parse_0x0A(cls, payload):
+    br = cls(payload)
+    out = [br.read_method_9(), br.read_method_9(), br.read_method_24(), br.read_method_9()]
+    out.append(br.read_method_9() if br.read_method_15() else 0)
+    out.append(br.read_method_9() if br.read_method_15() else 0)
+    out.append(bool(br.read_method_15()))
+    return out
+
+
+def sample_payloads(rnd, count):
+    p07, p08, p0a = [], [], []
+    for _ in range(count):
+        p07.append(encode_movement(rnd.randint(1, 60000), rnd.randint(-40, 40), rnd.randint(-40, 40),
+                                   rnd.randint(-5, 5), rnd.randint(0, 3), rnd.randint(0, 31),
+                                   rnd.choice((None, -420, 310)))[4:])
+        props = {
+            "pos_x": rnd.randint(0, 20000), "pos_y": rnd.randint(0, 1500), "velocity_x": rnd.randint(-300, 300),
+            "ent_name": rnd.choice(("IntroGoblinDagger", "NPCRuggedVillager02", "Hero")),
+            "team": rnd.randint(0, 3), "is_player": rnd.random() < 0.3, "y_offset": rnd.randint(-20, 20),
+            "cue_data": {"character_name": "Mayor", "DramaAnim": "Talk"} if rnd.random() < 0.3 else {},
+            "summoner_id": rnd.choice((None, 12)), "power_id": rnd.choice((None, 140)),
+            "ent_state": rnd.randint(0, 3), "b_left": rnd.random() < 0.5,
+        }
+        p08.append(build_entity_full_update(rnd.randint(1, 60000), props)[4:])
+        bb = BitBuffer(debug=False)
+        bb.write_method_4(rnd.randint(1, 60000))
+        bb.write_method_4(rnd.randint(1, 60000))
+        bb.write_signed_method_45(rnd.randint(-5000, 5000))
+        bb.write_method_4(rnd.randint(1, 400))
+        for _ in range(2):
+            has = rnd.random() < 0.5
+            bb.write_method_15(has)
+            if has:
+                bb.write_method_4(rnd.randint(0, 1000))
+        bb.write_method_15(rnd.random() < 0.2)
+        p0a.append(bb.to_bytes())
+    # handlers get a memoryview slice of the FrameReader buffer
+    as_views = lambda payloads: [memoryview(struct.pack(">HH", 0, len(p)) + p)[4:] for p in payloads]
+    return {"0x07": (parse_0x07, as_views(p07)), "0x08": (parse_0x08, as_views(p08)),
+            "0x0A": (parse_0x0A, as_views(p0a))}
+
+
+# equivalence
+###################################
+READS = ("read_bit", "read_method_15", "read_method_20", "read_method_739", "read_method_4", "read_method_26",
+         "read_method_706", "read_method_6", "read_method_9", "read_method_45", "read_method_393",
+         "read_method_560", "read_method_13", "read_method_24", "read_float", "align_to_byte", "remaining_bits")
+
+
+def _run(reader, ops):
+    out = []
+    for name, arg in ops:
+        try:
+            fn = getattr(reader, name)
+            out.append(fn(arg) if arg is not None else fn())
+        except (ValueError, IndexError):
+            out.append("error")
+            break
+    return out
+
+
+def check_equivalence(rounds=5000, seed=5):
+    rnd = random.Random(seed)
+    failures = 0
+    for _ in range(rounds):
+        data = bytes(rnd.getrandbits(8) for _ in range(rnd.randint(0, 48)))
+        if rnd.random() < 0.5 and len(data) > 4:
+            # plausible short strings so the string paths get exercised
+            at = rnd.randint(0, len(data) - 3)
+            data = data[:at] + struct.pack(">H", rnd.randint(0, 6)) + data[at + 2:]
+        ops = []
+        for _ in range(rnd.randint(1, 20)):
+            name = rnd.choice(READS)
+            ops.append((name, rnd.randint(0, 40) if name in ("read_method_20", "read_method_6") else None))
+        debug = rnd.random() < 0.3
+        new, old = BitReader(memoryview(data), debug), BytearrayBitReader(data, debug)
+        a, b = _run(new, ops), _run(old, ops)
+        same_floats = [x if x == x else "nan" for x in a] == [x if x == x else "nan" for x in b]
+        if not same_floats or (debug and "error" not in a and new.get_debug_log() != old.get_debug_log()):
+            failures += 1
+            if failures <= 3:
+                print("  mismatch:", data.hex(), ops, a, b)
+    return failures
+
+
+def bench(parse, cls, payloads, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for p in payloads:
+            parse(cls, p)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    print("equivalence ...", end=" ", flush=True)
+    tracing.enable()  # debug=True only logs while tracing
+    failures = check_equivalence()
+    tracing.disable()
+    print("OK" if not failures else f"{failures} MISMATCHES")
+
+    paths = sample_payloads(random.Random(1), 20000)
+    print(f"{'packet':<8}{'old us':>9}{'new us':>9}{'speedup':>9}")
+    for name, (parse, payloads) in paths.items():
+        assert all(parse(BitReader, p) == parse(BytearrayBitReader, p) for p in payloads[:2000])
+        old = bench(parse, BytearrayBitReader, payloads)
+        new = bench(parse, BitReader, payloads)
+        n = len(payloads)
+        print(f"{name:<8}{old / n * 1e6:>9.2f}{new / n * 1e6:>9.2f}{old / new:>8.1f}x")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
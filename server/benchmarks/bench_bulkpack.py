@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Bulk packing (bulkpack.py) of the inventory gears, the 0xF5 gear list and
+the dye bits vs. the per-field write_method_11 loops it replaces, with and
+without NumPy. All three must give the same bytes.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_bulkpack.py [--gears 1800]
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BitBuffer import BitBuffer
+import Character
+import WorldEnter
+import bulkpack
+from constants import GearType, GEARTYPE_BITS, class_21
+
+
+# the loops as Player_Data_Packet / build_level_gears_packet write them field by field
+###################################
+def per_field_inventory(gears):
+    buf = BitBuffer(debug=False)
+    for gear in gears:
+        runes = gear.get("runes", [0, 0, 0])
+        colors = gear.get("colors", [0, 0])
+        buf.write_method_11(gear.get("gearID", 0), 11)
+        buf.write_method_11(gear.get("tier", 0), GearType.const_176)
+        has_modifiers = any(rune != 0 for rune in runes) or any(color != 0 for color in colors)
+        buf.write_method_11(1 if has_modifiers else 0, 1)
+        if has_modifiers:
+            for i in range(3):
+                buf.write_method_11(1 if runes[i] != 0 else 0, 1)
+                if runes[i] != 0:
+                    buf.write_method_11(runes[i], 16)
+            for i in range(2):
+                buf.write_method_11(1 if colors[i] != 0 else 0, 1)
+                if colors[i] != 0:
+                    buf.write_method_11(colors[i], 8)
+    return buf.segment()
+
+
+def per_field_level_gears(gears_list):
+    buf = BitBuffer(debug=False)
+    for gear_id, tier in gears_list:
+        buf.write_method_6(gear_id, GEARTYPE_BITS)
+        buf.write_method_6(tier, GearType.const_176)
+    return buf.segment()
+
+
+def per_field_dyes(owned):
+    buf = BitBuffer(debug=False)
+    owned = set(owned)
+    for dye_id in range(1, class_21.const_763 + 1):
+        buf.write_method_11(1 if dye_id in owned else 0, 1)
+    return buf.segment()
+
+
+def bulk_level_gears(gears_list):
+    return bulkpack.pack_columns([([g for g, _ in gears_list], GEARTYPE_BITS),
+                                  ([t for _, t in gears_list], GearType.const_176)], len(gears_list))
+
+
+def make_gears(rnd, count, modified_share):
+    gears = []
+    for i in range(count):
+        gear = {"gearID": rnd.randint(1, 1500), "tier": rnd.randint(0, 2), "runes": [0, 0, 0], "colors": [0, 0]}
+        if rnd.random() < modified_share:
+            gear["runes"] = [rnd.choice((0, rnd.randint(1, 65535))) for _ in range(3)]
+            gear["colors"] = [rnd.choice((0, rnd.randint(1, 255))) for _ in range(2)]
+        gears.append(gear)
+    return gears
+
+
+def best_of(fn, arg, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1e3, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gears", type=int, default=1800)
+    args = parser.parse_args()
+    rnd = random.Random(4)
+
+    template = Character.load_class_template("paladin")
+    cases = [
+        ("inventory, no modifiers", per_field_inventory, WorldEnter._pack_inventory_gears,
+         make_gears(rnd, args.gears, 0.0)),
+        ("inventory, 30% modified", per_field_inventory, WorldEnter._pack_inventory_gears,
+         make_gears(rnd, args.gears, 0.3)),
+        ("inventory, template", per_field_inventory, WorldEnter._pack_inventory_gears,
+         copy.deepcopy(template.get("inventoryGears", []))),
+        ("0xF5 gear list", per_field_level_gears, bulk_level_gears,
+         [(rnd.randint(1, 1500), rnd.randint(0, 2)) for _ in range(args.gears)]),
+        ("dyes", per_field_dyes, lambda owned: bulkpack.pack_flags(set(owned), class_21.const_763),
+         rnd.sample(range(1, class_21.const_763 + 1), 120)),
+    ]
+    print(f"numpy: {'yes' if bulkpack.np is not None else 'not installed'}")
+    print(f"{'block':<26}{'rows':>6}{'field ms':>10}{'scalar ms':>11}{'numpy ms':>10}  same bytes")
+    ok = True
+    for name, per_field, bulk, data in cases:
+        field_ms, expected = best_of(per_field, data)
+        bulkpack.configure(False)
+        scalar_ms, scalar = best_of(bulk, data)
+        row = f"{name:<26}{len(data):>6}{field_ms:>10.3f}{scalar_ms:>11.3f}"
+        same = scalar == expected
+        if bulkpack.np is not None:
+            bulkpack.configure(True)
+            numpy_ms, vectorized = best_of(bulk, data)
+            same &= vectorized == expected
+            row += f"{numpy_ms:>10.3f}"
+        else:
+            row += f"{'-':>10}"
+        ok &= same
+        print(f"{row}  {'yes' if same else 'NO'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
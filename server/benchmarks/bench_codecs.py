@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Times every packet builder and parser on realistic inputs (the class
+templates, a 1800-gear inventory, every NPC_Data file, every level) and
+checks their output against the golden bytes in benchmarks/golden/codecs.json,
+so a codec change can be shown to be bit-exact for the Flash client.
+
+Builders: Player_Data_Packet (plain and send_extended), Send_Entity_Data
+(players and all NPCs), build_enter_world_packet, build_login_character_list_bitpacked,
+build_paperdoll_packet, build_level_gears_packet.
+Parsers: 0x07 (movement.decode_movement) and 0x08 (handle_entity_full_update);
+their golden entries keep the input packet and the decoded values.
+
+The split check builds Player_Data_Packet for synthetic 5000-gear
+characters (build_player_data_packets): every frame must fit its 16-bit
+length, and the gears past the extended block's limit must all come back
+out of the follow-up 0xF5 packets, in order.
+
+Player_Data_Packet sends the current time, which is frozen while the
+suite runs. A mismatch prints the case, the item and the first differing
+byte. After an intended wire change, rewrite the golden file with --update.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_codecs.py [--update] [--only NAME] [--repeat 5]
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Character
+import Commands
+import WorldEnter
+import entity
+import framing
+import movement
+from bitreader import BitReader
+from constants import GEARTYPE_BITS, GearType
+from level_config import LEVEL_CONFIG
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "codecs.json")
+FROZEN_TIME = 1700000000
+
+
+# inputs
+###################################
+def characters():
+    chars = []
+    for cls in ("paladin", "mage", "rogue"):
+        char = Character.load_class_template(cls)
+        char["name"] = f"Golden{cls.title()}"
+        chars.append(char)
+    # a long-played character's inventory
+    big = copy.deepcopy(chars[0])
+    big["name"] = "GoldenHoarder"
+    gear = (big.get("inventoryGears") or [{"gearID": 1, "tier": 0, "runes": [0, 0, 0], "colors": [0, 0]}])[0]
+    big["inventoryGears"] = [dict(copy.deepcopy(gear), gearID=1 + i % 1500, tier=i % 3,
+                                  runes=[(i * 7) % 90 if i % 5 == 0 else 0, 0, 0], colors=[i % 4, 0])
+                             for i in range(1800)]
+    chars.append(big)
+    return chars
+
+
+def npcs():
+    out = []
+    for name in sorted(os.listdir("NPC_Data")):
+        if name.lower().endswith(".json"):
+            with open(os.path.join("NPC_Data", name), encoding="utf-8") as f:
+                try:
+                    data = json.load(f)
+                except json.JSONDecodeError:
+                    continue
+            if isinstance(data, list):
+                out.extend((f"{name}#{i}", npc) for i, npc in enumerate(data) if isinstance(npc, dict))
+    return out
+
+
+def movement_inputs(rnd, count=500):
+    return [(f"#{i}", (rnd.randint(1, 60000), rnd.randint(-40, 40), rnd.randint(-40, 40), rnd.randint(-5, 5),
+                       rnd.randint(0, 3), rnd.randint(0, 31), rnd.choice((None, -420, 0, 310))))
+            for i in range(count)]
+
+
+def full_update_inputs(rnd, named_npcs, chars):
+    items = []
+    for i, (label, npc) in enumerate(named_npcs):
+        props = {"pos_x": int(npc.get("x", 0)), "pos_y": int(npc.get("y", 0)), "velocity_x": rnd.randint(-300, 300),
+                 "ent_name": npc.get("name", ""), "team": int(npc.get("team", 0)), "is_player": False,
+                 "y_offset": rnd.randint(-20, 20),
+                 "cue_data": {"character_name": "Mayor", "DramaAnim": "Talk"} if i % 7 == 0 else {},
+                 "summoner_id": None, "power_id": 140 if i % 11 == 0 else None,
+                 "ent_state": rnd.randint(0, 3), "b_left": i % 2 == 0}
+        items.append((label, (1000 + i, props)))
+    for i, char in enumerate(chars):
+        props = {"pos_x": 100 + i, "pos_y": 200, "ent_name": char["name"], "team": 1, "is_player": True,
+                 "summoner_id": 5 if i == 1 else None, "b_running": True}
+        items.append((char["name"], (10 + i, props)))
+    return items
+
+
+def veterans(base):
+    """5000-gear characters; the second one's mounts also push the payload past the frame limit."""
+    chars = []
+    for name, mounts in (("GoldenVeteran", 0), ("GoldenCollector", 16000)):
+        char = copy.deepcopy(base)
+        char["name"] = name
+        char["inventoryGears"] = [{"gearID": 1 + i % 1500, "tier": i % 3, "runes": [1 + i % 65000, 0, 7],
+                                   "colors": [i % 256, 3]} for i in range(5000)]
+        char["mounts"] = [1 << 20 | i for i in range(mounts)]
+        chars.append(char)
+    return chars
+
+
+def player_data_split(char):
+    return b"".join(WorldEnter.build_player_data_packets(char, transfer_token=4321, target_level="CraftTown",
+                                                         new_x=120, new_y=-40, send_extended=True))
+
+
+# cases: name -> (kind, fn, [(label, args)])
+###################################
+class _Session:
+    def __init__(self):
+        self.addr = ("golden", 0)
+        self.clientEntID = None
+        self.entities = {}
+        self.world_loaded = False
+
+
+def parse_0x07(packet):
+    return list(movement.decode_movement(packet[4:]))
+
+
+def parse_0x08(packet):
+    session = _Session()
+    Commands.handle_entity_full_update(session, packet)
+    (entity_id, props), = session.entities.items()
+    return [entity_id, props]
+
+
+def enter_world(level, char):
+    cfg = LEVEL_CONFIG[level]
+    return WorldEnter.build_enter_world_packet(
+        transfer_token=4321, old_level_id=0, old_swf="LevelsHome.swf/a_Level_CraftTown", has_old_coord=False,
+        old_x=0, old_y=0, host="127.0.0.1", port=8080, new_level_swf=cfg[0], new_map_lvl=cfg[1],
+        new_base_lvl=cfg[2], new_internal=level, new_moment="", new_alter="", new_is_dungeon=cfg[3],
+        new_has_coord=True, new_x=100, new_y=200, char=char)
+
+
+def player_data(char, extended):
+    return WorldEnter.Player_Data_Packet(char, transfer_token=4321, target_level="CraftTown",
+                                         new_x=120, new_y=-40, send_extended=extended)
+
+
+def build_cases():
+    rnd = random.Random(19)
+    chars = characters()
+    named_npcs = npcs()
+    players = [(c["name"], (dict(c, id=100 + i, x=10, y=20, v=0, is_player=True),)) for i, c in enumerate(chars)]
+    return {
+        "Player_Data_Packet": ("build", player_data, [(c["name"], (c, False)) for c in chars]),
+        "Player_Data_Packet (send_extended)": ("build", player_data, [(c["name"], (c, True)) for c in chars]),
+        "Player_Data_Packet (5000 gears, split)": ("build", player_data_split,
+                                                   [(c["name"], (c,)) for c in veterans(chars[0])]),
+        "Send_Entity_Data (players)": ("build", entity.Send_Entity_Data, players),
+        "Send_Entity_Data (NPC_Data)": ("build", entity.Send_Entity_Data, [(l, (n,)) for l, n in named_npcs]),
+        "build_enter_world_packet": ("build", enter_world, [(name, (name, chars[0])) for name in LEVEL_CONFIG]),
+        "build_login_character_list_bitpacked": ("build", Character.build_login_character_list_bitpacked,
+                                                 [("templates", (chars[:3],))]),
+        "build_paperdoll_packet": ("build", Character.build_paperdoll_packet, [(c["name"], (c,)) for c in chars]),
+        "build_level_gears_packet": ("build", Character.build_level_gears_packet,
+                                     [(c["name"], (Character.get_inventory_gears(c),)) for c in chars]),
+        "parse 0x07": ("parse", (movement.encode_movement, parse_0x07), movement_inputs(rnd)),
+        "parse 0x08": ("parse", (entity.build_entity_full_update, parse_0x08),
+                       full_update_inputs(rnd, named_npcs, chars)),
+    }
+
+
+# golden check
+###################################
+def _jsonable(value):
+    return json.loads(json.dumps(value))
+
+
+def outputs(kind, fn, items):
+    """Golden entries of one case: hex per item, or {"in", "out"} for parsers."""
+    with contextlib.redirect_stdout(io.StringIO()):  # the 0x08 handler logs
+        if kind == "build":
+            return [fn(*args).hex() for _, args in items]
+        build, parse = fn
+        entries = []
+        for _, args in items:
+            packet = build(*args)
+            entries.append({"in": packet.hex(), "out": _jsonable(parse(packet))})
+        return entries
+
+
+def first_difference(got, expected):
+    for i, (a, b) in enumerate(zip(got, expected)):
+        if a != b:
+            return i
+    return min(len(got), len(expected))
+
+
+def compare(name, kind, fn, items, golden):
+    expected = golden.get(name)
+    if expected is None:
+        print(f"  {name}: no golden entry (run with --update)")
+        return 1
+    got = outputs(kind, fn, items)
+    if len(got) != len(expected):
+        print(f"  {name}: {len(got)} items, golden has {len(expected)}")
+        return 1
+    bad = 0
+    for (label, _), g, e in zip(items, got, expected):
+        if kind == "build":
+            problem = g != e and (f"{len(g) // 2} bytes vs {len(e) // 2} golden, "
+                                  f"first difference at byte {first_difference(g, e) // 2}")
+        elif g["in"] != e["in"]:
+            problem = f"built packet differs at byte {first_difference(g['in'], e['in']) // 2}"
+        else:
+            # parse the golden packet too, so the parser is checked apart from the builder
+            decoded = outputs(kind, (lambda packet: packet, fn[1]), [(label, (bytes.fromhex(e["in"]),))])[0]["out"]
+            problem = decoded != e["out"] and f"decoded {decoded} vs golden {e['out']}"
+        if problem:
+            bad += 1
+            if bad <= 3:
+                print(f"  {name} [{label}]: {problem}")
+    return bad
+
+
+def check_split(chars):
+    """Frames fit and add up, and the 0xF5 follow-ups carry exactly the gears the 0x10 left out."""
+    bad = 0
+    for char in chars:
+        with contextlib.redirect_stdout(io.StringIO()):
+            packets = WorldEnter.build_player_data_packets(char, transfer_token=4321, target_level="CraftTown",
+                                                           new_x=120, new_y=-40, send_extended=True)
+        gears = []
+        for packet in packets:
+            pkt_type, length = framing.HEADER.unpack_from(packet)
+            if length != len(packet) - framing.HEADER_SIZE:
+                print(f"  {char['name']}: 0x{pkt_type:02X} length field {length}, payload {len(packet) - 4}")
+                bad += 1
+            if pkt_type == 0xF5:
+                br = BitReader(packet[4:])
+                for _ in range(br.read_method_4()):
+                    gears.append((br.read_method_6(GEARTYPE_BITS), br.read_method_6(GearType.const_176)))
+        inventory = [(g["gearID"], g["tier"]) for g in char["inventoryGears"]]
+        if packets[0][:2] != b"\x00\x10" or inventory[len(inventory) - len(gears):] != gears:
+            print(f"  {char['name']}: {len(gears)} gears in 0xF5 packets do not match the inventory overflow")
+            bad += 1
+        else:
+            print(f"  {char['name']}: {len(packets[0])} byte 0x10 with {len(inventory) - len(gears)} gears"
+                  f" + {len(packets) - 1} 0xF5 packet(s) with {len(gears)}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            alone = WorldEnter.build_player_data_packets(char, transfer_token=4321, target_level="CraftTown",
+                                                         new_x=120, new_y=-40, send_extended=True, send_overflow=False)
+        if alone != packets[:1]:
+            print(f"  {char['name']}: send_overflow=False still sends {len(alone) - 1} 0xF5 packet(s)")
+            bad += 1
+    return bad
+
+
+# timing
+###################################
+def bench(kind, fn, items, repeat):
+    if kind == "parse":
+        build, parse = fn
+        packets = [build(*args) for _, args in items]
+        fn, items = parse, [(None, (p,)) for p in packets]
+    calls = [args for _, args in items]
+    sizes = [len(fn(*args)) for args in calls] if kind == "build" else [len(a[0]) for a in calls]
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for args in calls:
+            fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(calls) * 1e6, sum(sizes) / len(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update", action="store_true", help="rewrite the golden file from the current code")
+    parser.add_argument("--only", default=None, metavar="NAME", help="only the cases whose name contains NAME")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cases = {name: case for name, case in build_cases().items() if not args.only or args.only in name}
+    failures = 0
+    with mock.patch.object(WorldEnter.time, "time", return_value=FROZEN_TIME):
+        if args.update:
+            golden = {}
+            if os.path.exists(GOLDEN_PATH):
+                with open(GOLDEN_PATH, encoding="utf-8") as f:
+                    golden = json.load(f)
+            for name, (kind, fn, items) in cases.items():
+                golden[name] = outputs(kind, fn, items)
+            os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+            with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+                json.dump(golden, f, indent=1, sort_keys=True)
+                f.write("\n")
+            print(f"wrote {len(cases)} cases to {GOLDEN_PATH}")
+        else:
+            with open(GOLDEN_PATH, encoding="utf-8") as f:
+                golden = json.load(f)
+            print("golden bytes ...")
+            for name, (kind, fn, items) in cases.items():
+                failures += compare(name, kind, fn, items, golden)
+            print("  OK" if not failures else f"  {failures} MISMATCHES")
+            print("5000-gear split ...")
+            failures += check_split(veterans(characters()[0]))
+
+        print(f"{'case':<40}{'items':>7}{'avg bytes':>11}{'us each':>10}")
+        for name, (kind, fn, items) in cases.items():
+            with contextlib.redirect_stdout(io.StringIO()):
+                us, size = bench(kind, fn, items, args.repeat)
+            print(f"{name:<40}{len(items):>7}{size:>11.0f}{us:>10.2f}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
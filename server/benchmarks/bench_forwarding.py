@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Forward-only handlers (0x09, 0x0A, 0x0B, 0x0C, 0x0E) on the fast path
+(forward without parsing) vs. with full validation (forwarding.py). The
+broadcast is stubbed out, so this is the per-packet cost of the handler
+itself. Also checks that both modes forward every well-formed packet and
+that validation drops truncated ones.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_forwarding.py [--packets 5000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import struct
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BitBuffer import BitBuffer
+import Commands
+import forwarding
+from bench_schema import hand_encode_0x09, hand_encode_0x0A, sample_values
+
+
+def _framed(opcode, bb):
+    payload = bb.to_bytes()
+    return struct.pack(">HH", opcode, len(payload)) + payload
+
+
+def encode_0x0B(rnd):
+    bb = BitBuffer(debug=False)
+    for _ in range(6):
+        bb.write_method_9(rnd.randint(1, 60000))
+    has_vector = rnd.random() < 0.3
+    bb.write_method_15(has_vector)
+    if has_vector:
+        bb.write_method_9(2)
+        for _ in range(2):
+            bb.write_method_9(rnd.randint(1, 400))
+            bb.write_method_9(1)
+            bb.write_method_20(32, struct.unpack(">I", struct.pack(">f", rnd.uniform(-5, 5)))[0])
+    return _framed(0x0B, bb)
+
+
+def encode_0x0C(rnd):
+    bb = BitBuffer(debug=False)
+    for _ in range(3):
+        bb.write_method_9(rnd.randint(1, 60000))
+    return _framed(0x0C, bb)
+
+
+def encode_0x0E(rnd):
+    bb = BitBuffer(debug=False)
+    bb.write_method_9(rnd.randint(1, 60000))
+    bb.write_method_9(rnd.randint(1, 60000))
+    bb.write_method_24(rnd.randint(1, 3000))
+    bb.write_method_24(rnd.randint(1, 3000))
+    bb.write_method_15(rnd.random() < 0.5)
+    return _framed(0x0E, bb)
+
+
+HANDLERS = {
+    0x09: (Commands.handle_power_cast, lambda rnd: hand_encode_0x09(sample_values(rnd, 0x09))),
+    0x0A: (Commands.handle_power_hit, lambda rnd: hand_encode_0x0A(sample_values(rnd, 0x0A))),
+    0x0B: (Commands.handle_add_buff, encode_0x0B),
+    0x0C: (Commands.handle_remove_buff, encode_0x0C),
+    0x0E: (Commands.handle_projectile_explode, encode_0x0E),
+}
+
+
+def _no_peers(session, data):
+    return 0
+
+
+class Session:
+    addr = ("127.0.0.1", 0)
+
+
+def run(handler, packets, session, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for data in packets:
+            handler(session, data)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(packets) * 1e6
+
+
+def forwarded(handler, packets, session):
+    sent = []
+    with mock.patch.object(Commands, "broadcast_to_level", side_effect=lambda s, d: sent.append(d) or 0), \
+         mock.patch.object(Commands, "broadcast_near_player", side_effect=lambda s, d: sent.append(d) or 0):
+        for data in packets:
+            handler(session, data)
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--packets", type=int, default=5000)
+    args = parser.parse_args()
+    rnd = random.Random(18)
+    session = Session()
+
+    print(f"{'opcode':<8}{'handler':<28}{'validate us':>12}{'fast us':>9}{'speedup':>9}  checks")
+    ok = True
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        rows = []
+        for opcode, (handler, encode) in HANDLERS.items():
+            packets = [encode(rnd) for _ in range(args.packets)]
+            truncated = [p[:5] for p in packets[:50] if len(p) > 6]
+
+            forwarding.configure([opcode], 0)
+            checks = forwarded(handler, packets, session) == packets
+            checks &= not forwarded(handler, truncated, session)
+            with mock.patch.object(Commands, "broadcast_to_level", _no_peers), \
+                 mock.patch.object(Commands, "broadcast_near_player", _no_peers):
+                validate_us = run(handler, packets, session)
+                forwarding.configure([], 0)
+                checks &= forwarded(handler, packets, session) == packets
+                fast_us = run(handler, packets, session)
+            rows.append((opcode, handler.__name__, validate_us, fast_us, checks))
+        log.truncate(0)
+    for opcode, name, validate_us, fast_us, checks in rows:
+        ok &= checks
+        print(f"0x{opcode:02X}    {name:<28}{validate_us:>12.2f}{fast_us:>9.2f}"
+              f"{validate_us / fast_us:>8.1f}x  {'ok' if checks else 'FAILED'}")
+    print("stats:", forwarding.get_forward_stats())
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for packet framing: the old copy-and-delete loop from
+handle_client vs. FrameReader, on recv-sized chunks that carry many frames.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_framing.py
+"""
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from framing import FrameReader
+
+
+def make_stream(frame_count, seed=1):
+    rnd = random.Random(seed)
+    parts = []
+    for _ in range(frame_count):
+        # mostly small movement-sized packets with the odd large one
+        size = rnd.choice((6, 8, 9, 11, 14)) if rnd.random() < 0.95 else rnd.randint(200, 3000)
+        parts.append(struct.pack(">HH", 0x07, size) + os.urandom(size))
+    return b"".join(parts)
+
+
+def chunked(stream, chunk_size):
+    return [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+
+def legacy_framing(chunks):
+    """The loop handle_client used before FrameReader (dispatching every frame)."""
+    handled = 0
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= 4:
+            pkt = int.from_bytes(buffer[0:2], byteorder='big')
+            length = int.from_bytes(buffer[2:4], byteorder='big')
+            total = 4 + length
+            if len(buffer) < total:
+                break
+            data = bytes(buffer[:total])
+            payload = data[4:]
+            del buffer[:total]
+            handled += 1
+    return handled
+
+
+def frame_reader(chunks):
+    handled = 0
+    framer = FrameReader()
+    for chunk in chunks:
+        framer.feed(chunk)
+        for pkt, data in framer.frames():
+            handled += 1
+    return handled
+
+
+def bench(fn, chunks, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        count = fn(chunks)
+        best = min(best, time.perf_counter() - t0)
+    return count, best
+
+
+def main():
+    stream = make_stream(200_000)
+    print(f"stream: {len(stream) / 1e6:.1f} MB, 200000 frames")
+    print(f"{'chunk':>7}  {'impl':<14}{'frames':>9}{'MB/s':>9}{'frames/s':>12}")
+    for chunk_size in (512, 4096, 65536):
+        chunks = chunked(stream, chunk_size)
+        for name, fn in (("legacy", legacy_framing), ("FrameReader", frame_reader)):
+            count, elapsed = bench(fn, chunks, 3)
+            print(f"{chunk_size:>7}  {name:<14}{count:>9}{len(stream) / elapsed / 1e6:>9.1f}{count / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
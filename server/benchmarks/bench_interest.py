@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Bandwidth benchmark for interest management: 100 players spread over one
+20000-unit-wide level (the size of NewbieRoad / ShazariDesert), each sending
+a movement update (0x07) every tick and the odd power cast (0x09). The real
+0x07/0x08/0x09 handlers fan the packets out; connections only count bytes.
+
+Runs once with interest management off (everybody gets everything) and once
+per radius, and prints outbound traffic per player.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_interest.py [--players 100] [--seconds 10]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Commands  # registers the packet handlers
+import interest
+from BitBuffer import BitBuffer
+from constants import Entity
+from levels import join_level, leave_level
+from packet_registry import get_handler
+
+LEVEL = "NewbieRoad"
+LEVEL_WIDTH = 20000
+LEVEL_HEIGHT = 1500
+TICK_RATE = 20
+CAST_CHANCE = 0.02  # per player per tick
+
+
+class CountingConn:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.full_updates = 0  # initial spawns plus resync snapshots
+
+    def sendall(self, data):
+        self.frames += 1
+        self.bytes += len(data)
+        if data[0] == 0 and data[1] == 0x08:
+            self.full_updates += 1
+
+
+class FakeSession:
+    def __init__(self, index):
+        self.addr = ("bench", index)
+        self.conn = CountingConn()
+        self.clientEntID = None
+        self.entities = {}
+        self.world_loaded = False
+        self.level = None
+        self.current_level = LEVEL
+        self.char_list = []
+        self.current_character = f"Bench{index}"
+        self.user_id = index
+
+
+def frame(pkt, bb):
+    payload = bb.to_bytes()
+    return struct.pack(">HH", pkt, len(payload)) + payload
+
+
+def full_update(entity_id, x, y, name):
+    bb = BitBuffer(debug=False)
+    bb.write_method_4(entity_id)  # method_9 fields, see build_entity_full_update
+    bb.write_signed_method_45(x)
+    bb.write_signed_method_45(y)
+    bb.write_signed_method_45(0)
+    bb.write_method_13(name)
+    bb.write_method_6(1, Entity.TEAM_BITS)
+    bb.write_method_15(True)     # is_player
+    bb.write_method_739(0)       # y_offset
+    bb.write_method_15(False)    # cue data
+    bb.write_method_15(False)    # summoner
+    bb.write_method_15(False)    # power
+    bb.write_method_6(0, Entity.const_316)
+    for _ in range(5):
+        bb.write_method_15(False)
+    return frame(0x08, bb)
+
+
+def movement(entity_id, dx, dy, dvx, running):
+    bb = BitBuffer(debug=False)
+    bb.write_method_4(entity_id)
+    bb.write_signed_method_45(dx)
+    bb.write_signed_method_45(dy)
+    bb.write_signed_method_45(dvx)
+    bb.write_method_6(0, Entity.const_316)
+    bb.write_method_15(dx < 0)   # b_left
+    bb.write_method_15(running)  # b_running
+    bb.write_method_15(False)
+    bb.write_method_15(False)
+    bb.write_method_15(False)
+    bb.write_method_15(False)    # not airborne
+    return frame(0x07, bb)
+
+
+def power_cast(entity_id, power_id):
+    bb = BitBuffer(debug=False)
+    bb.write_method_4(entity_id)
+    bb.write_method_4(power_id)
+    bb.write_method_15(False)    # target entity
+    bb.write_method_15(False)    # target point
+    bb.write_method_15(False)    # projectile
+    bb.write_method_15(False)    # charged
+    bb.write_method_15(False)    # combo
+    bb.write_method_15(False)    # cooldown / mana
+    return frame(0x09, bb)
+
+
+def run(players, seconds, radius, seed=7):
+    interest.configure(radius)
+    rnd = random.Random(seed)
+    on_full = get_handler(0x08)
+    on_move = get_handler(0x07)
+    on_cast = get_handler(0x09)
+
+    sessions = []
+    for i in range(players):
+        s = FakeSession(i)
+        s.clientEntID = 1000 + i
+        join_level(s, LEVEL)
+        sessions.append(s)
+
+    state = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for s in sessions:
+            x = rnd.randint(0, LEVEL_WIDTH)
+            y = rnd.randint(200, LEVEL_HEIGHT)
+            state.append([x, y, rnd.choice((-1, 1)) * rnd.randint(150, 400) // TICK_RATE])
+            s.world_loaded = True
+            on_full(s, full_update(s.clientEntID, x, y, s.current_character))
+
+    ticks = seconds * TICK_RATE
+    sink = io.StringIO()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        for _ in range(ticks):
+            for s, st in zip(sessions, state):
+                if rnd.random() < 0.05:
+                    st[2] = -st[2]
+                dx = st[2]
+                if not 0 <= st[0] + dx <= LEVEL_WIDTH:
+                    dx = st[2] = -st[2]
+                dy = rnd.randint(-3, 3)
+                st[0] += dx
+                st[1] += dy
+                on_move(s, movement(s.clientEntID, dx, dy, 0, True))
+                if rnd.random() < CAST_CHANCE:
+                    on_cast(s, power_cast(s.clientEntID, rnd.randint(1, 200)))
+            sink.seek(0)
+            sink.truncate()
+    elapsed = time.perf_counter() - t0
+
+    frames = sum(s.conn.frames for s in sessions)
+    sent = sum(s.conn.bytes for s in sessions)
+    full_updates = sum(s.conn.full_updates for s in sessions)
+    for s in sessions:
+        leave_level(s)
+    return frames, sent, full_updates, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--radius", type=int, action="append", dest="radii",
+                        help="interest radius to test, repeatable (default: 1000 1500 2500)")
+    args = parser.parse_args()
+    radii = [0] + (args.radii or [1000, 1500, 2500])
+
+    print(f"{args.players} players, {LEVEL_WIDTH}x{LEVEL_HEIGHT} level, {TICK_RATE} Hz, "
+          f"{args.seconds}s, hysteresis {interest.INTEREST_HYSTERESIS}")
+    print(f"{'radius':>7}{'frames':>11}{'MB out':>9}{'kbit/s/player':>15}{'0x08 out':>11}{'vs off':>8}{'handler s':>11}")
+    baseline = None
+    for radius in radii:
+        frames, sent, full_updates, elapsed = run(args.players, args.seconds, radius)
+        baseline = baseline or sent
+        per_player = sent * 8 / 1000 / args.seconds / args.players
+        label = "off" if radius == 0 else str(radius)
+        print(f"{label:>7}{frames:>11}{sent / 1e6:>9.2f}{per_player:>15.1f}{full_updates:>11}"
+              f"{sent / baseline:>8.0%}{elapsed:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
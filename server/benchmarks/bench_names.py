@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Character-name checks (0x17 creation): the old is_character_name_taken,
+which parsed every save file per check, vs. the name index (name_index.py),
+on synthetic saves:
+
+- name check:  old = scan all saves, new = dict lookup
+- index build: the one-time scan of saves/ when CharacterNames.json is missing
+- index load:  later starts read CharacterNames.json only
+
+Then checks the index through creation, rename and deletion of characters
+(save_characters diffs), a reload from disk, and the online registry.
+Runs in a temporary directory, nothing in the server tree is touched.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_names.py [--accounts 20000] [--checks 5]
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import char_store
+import name_index
+from Character import save_characters
+
+
+# the old is_character_name_taken, for comparison
+###################################
+def legacy_is_character_name_taken(name):
+    name = name.strip().lower()
+    for path in glob.glob(os.path.join("saves", "*.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+        for char in data.get("characters", []):
+            if char.get("name", "").strip().lower() == name:
+                return True
+    return False
+
+
+def reset_index():
+    name_index._names = None
+    name_index._by_user = {}
+    name_index._source = None
+
+
+class _Session:
+    def __init__(self, name):
+        self.current_character = None
+        name_index.set_online(self, name)
+        self.current_character = name
+        self.authenticated = True
+
+
+def timed(fn, items):
+    t0 = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - t0) / len(items)
+
+
+def fmt(seconds):
+    return f"{seconds * 1e3:9.3f} ms" if seconds >= 1e-4 else f"{seconds * 1e6:9.2f} us"
+
+
+def check_updates():
+    """Creation, rename, deletion and a reload from disk keep the index exact."""
+    ok = True
+    ok &= name_index.claim("Newbie", "u1") and not name_index.claim("NEWBIE", "u2")
+    chars = [{"name": "Newbie"}]
+    save_characters("u1", chars)
+    chars[0]["name"] = "Veteran"  # rename
+    save_characters("u1", chars)
+    ok &= not name_index.is_taken("newbie") and name_index.owner("veteran") == "u1"
+    chars.append({"name": "Alt"})
+    save_characters("u1", chars)
+    chars.pop(0)  # delete
+    save_characters("u1", chars)
+    ok &= not name_index.is_taken("Veteran") and name_index.is_taken("alt")
+    snapshot = dict(name_index._names)
+    reset_index()
+    ok &= name_index.owner("ALT") == "u1" and name_index._names == snapshot
+
+    a, b = _Session("Alpha"), _Session("Beta")
+    ok &= name_index.find_online("alpha") is a and name_index.find_online("BETA") is b
+    name_index.set_online(a, "Gamma")  # a switched characters
+    a.current_character = "Gamma"
+    ok &= name_index.find_online("alpha") is None and name_index.find_online("gamma") is a
+    name_index.set_online(b, None)
+    ok &= name_index.find_online("beta") is None
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=20000)
+    parser.add_argument("--checks", type=int, default=5, help="name checks timed on the old path")
+    args = parser.parse_args()
+    rnd = random.Random(24)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        char_store.configure(0)  # write-through, the saves on disk are what both paths read
+        os.makedirs("saves")
+        names = []
+        for i in range(args.accounts):
+            chars = [{"name": f"Hero{i}x{j}", "class": "Paladin", "level": 50, "inventoryGears": [{"gearID": g} for g in range(40)]}
+                     for j in range(rnd.randint(1, 3))]
+            names += [c["name"] for c in chars]
+            with open(os.path.join("saves", f"{i:012x}.json"), "w", encoding="utf-8") as f:
+                json.dump({"email": f"player{i}@example.com", "characters": chars}, f, indent=2)
+        print(f"{args.accounts} accounts, {len(names)} characters")
+        print(f"{'operation':<28}{'old':>13}{'new':>13}")
+
+        probes = [rnd.choice(names).upper() for _ in range(args.checks // 2)] + [f"free{i}" for i in range(args.checks - args.checks // 2)]
+        old_check = timed(legacy_is_character_name_taken, probes)
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            name_index.is_taken("warmup")
+            build = time.perf_counter() - t0
+        reset_index()
+        t0 = time.perf_counter()
+        name_index.is_taken("warmup")
+        load = time.perf_counter() - t0
+        probes = [rnd.choice(names).upper() for _ in range(5000)] + [f"free{i}" for i in range(5000)]
+        new_check = timed(name_index.is_taken, probes)
+        print(f"{'name check':<28}{fmt(old_check):>13}{fmt(new_check):>13}")
+        print(f"{'index build (first start)':<28}{'-':>13}{fmt(build):>13}")
+        print(f"{'index load':<28}{'-':>13}{fmt(load):>13}")
+
+        ok = all(name_index.is_taken(n) == legacy_is_character_name_taken(n)
+                 for n in rnd.sample(names, 5) + ["nobody"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok &= check_updates()
+        print("index vs. saves, create/rename/delete and online lookups:", "OK" if ok else "MISMATCH")
+        os.chdir(cwd)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
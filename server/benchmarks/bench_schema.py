@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Schema-compiled codecs (packet_schema.py, data/packet_schemas.json) vs. the
+hand-written BitBuffer/BitReader code, per opcode.
+
+1. Random values for every schema packet are encoded both ways and must give
+   the same bytes; the client -> server packets are decoded both ways and must
+   give the same values.
+2. Every data/packet_types.json entry the admin panel can send is compiled
+   with schema_from_packet_types() and must encode to the bytes
+   build_custom_packet() sends.
+3. Encode/decode times, hand-written vs. compiled.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_schema.py [--show 0x09]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BitBuffer import BitBuffer
+from bitreader import BitReader
+from constants import GearType, PowerType
+import Commands
+import movement
+import packet_schema
+
+
+def _framed(opcode, bb):
+    payload = bb.to_bytes()
+    return struct.pack(">HH", opcode, len(payload)) + payload
+
+
+# hand-written versions, as the handlers and builders do it
+###################################
+def hand_encode_0x07(v):
+    return movement.encode_movement(v["entity_id"], v["dx"], v["dy"], v["dvx"], v["ent_state"],
+                                    movement.pack_flags(v), v["velocity_y"] if v["airborne"] else None)
+
+
+def hand_decode_0x07(payload):
+    entity_id, dx, dy, dvx, state, flags, vy = movement.decode_movement(payload)
+    return dict(movement.unpack_flags(flags), entity_id=entity_id, dx=dx, dy=dy, dvx=dvx, ent_state=state,
+                airborne=vy is not None, velocity_y=vy)
+
+
+def hand_encode_0x09(v):
+    bb = BitBuffer(debug=False)
+    bb.write_method_9(v["ent_id"])
+    bb.write_method_9(v["power_id"])
+    bb.write_method_15(v["has_target_entity"])
+    bb.write_method_15(v["has_target_pos"])
+    if v["has_target_pos"]:
+        bb.write_method_24(v["target_x"])
+        bb.write_method_24(v["target_y"])
+    bb.write_method_15(v["has_projectile"])
+    if v["has_projectile"]:
+        bb.write_method_9(v["projectile_id"])
+    bb.write_method_15(v["is_charged"])
+    bb.write_method_15(v["has_extra"])
+    if v["has_extra"]:
+        bb.write_method_15(v["is_secondary"])
+        bb.write_method_9(v["secondary_id"] if v["is_secondary"] else v["tertiary_id"])
+    bb.write_method_15(v["has_flags"])
+    if v["has_flags"]:
+        bb.write_method_15(v["has_cooldown"])
+        if v["has_cooldown"]:
+            bb.write_method_9(v["cooldown_tick"])
+        bb.write_method_15(v["has_mana"])
+        if v["has_mana"]:
+            bb.write_method_6(v["mana_cost"], PowerType.const_423)
+    return _framed(0x09, bb)
+
+
+def hand_decode_0x09(payload):
+    br = BitReader(payload)
+    out = {"ent_id": br.read_method_9(), "power_id": br.read_method_9(),
+           "has_target_entity": bool(br.read_method_15())}
+    out["has_target_pos"] = bool(br.read_method_15())
+    out["target_x"] = br.read_method_24() if out["has_target_pos"] else None
+    out["target_y"] = br.read_method_24() if out["has_target_pos"] else None
+    out["has_projectile"] = bool(br.read_method_15())
+    out["projectile_id"] = br.read_method_9() if out["has_projectile"] else None
+    out["is_charged"] = bool(br.read_method_15())
+    out["has_extra"] = bool(br.read_method_15())
+    out["is_secondary"] = out["secondary_id"] = out["tertiary_id"] = None
+    if out["has_extra"]:
+        out["is_secondary"] = bool(br.read_method_15())
+        if out["is_secondary"]:
+            out["secondary_id"] = br.read_method_9()
+        else:
+            out["tertiary_id"] = br.read_method_9()
+    out["has_flags"] = bool(br.read_method_15())
+    out["has_cooldown"] = out["cooldown_tick"] = out["has_mana"] = out["mana_cost"] = None
+    if out["has_flags"]:
+        out["has_cooldown"] = bool(br.read_method_15())
+        out["cooldown_tick"] = br.read_method_9() if out["has_cooldown"] else None
+        out["has_mana"] = bool(br.read_method_15())
+        out["mana_cost"] = br.read_method_6(PowerType.const_423) if out["has_mana"] else None
+    return out
+
+
+def hand_encode_0x0A(v):
+    bb = BitBuffer(debug=False)
+    bb.write_method_9(v["target_id"])
+    bb.write_method_9(v["source_id"])
+    bb.write_method_24(v["value"])
+    bb.write_method_9(v["power_id"])
+    for flag, name in (("has_param5", "param5"), ("has_param6", "param6")):
+        bb.write_method_15(v[flag])
+        if v[flag]:
+            bb.write_method_9(v[name])
+    bb.write_method_15(v["flag"])
+    return _framed(0x0A, bb)
+
+
+def hand_decode_0x0A(payload):
+    br = BitReader(payload)
+    out = {"target_id": br.read_method_9(), "source_id": br.read_method_9(),
+           "value": br.read_method_24(), "power_id": br.read_method_9()}
+    for flag, name in (("has_param5", "param5"), ("has_param6", "param6")):
+        out[flag] = bool(br.read_method_15())
+        out[name] = br.read_method_9() if out[flag] else None
+    out["flag"] = bool(br.read_method_15())
+    return out
+
+
+LOOT_FIELDS = {"gear": ("is_gear", "gear_type"), "item": ("is_item", "item_id"), "gold": ("is_gold", "gold"),
+               "chest": ("is_chest", "chest_id"), "xp": ("is_xp", "xp"), "potion": ("is_potion", "potion_id")}
+
+
+def hand_encode_0x32(v):
+    reward = next((rt for rt, (flag, _) in LOOT_FIELDS.items() if v.get(flag)), None)
+    field = LOOT_FIELDS[reward][1] if reward else None
+    return Commands.build_loot_drop_packet(v["entity_id"], v["x"], v["y"], reward, v.get(field, 0),
+                                           v.get("gear_tier", 0))
+
+
+def hand_encode_0x76(v):
+    bb = BitBuffer(debug=False)
+    bb.write_method_4(v["npc_id"])
+    bb.write_method_13(v["text"])
+    return _framed(0x76, bb)
+
+
+def hand_encode_0x7B(v):
+    return Commands.build_start_skit_packet(v["entity_id"], v["dialogue_id"], v["mission_id"])
+
+
+def hand_encode_0xA2(v):
+    bb = BitBuffer(debug=False)
+    bb.write_method_24(v["client_time"])
+    bb.write_method_15(v["is_desync"])
+    bb.write_method_24(v["server_time"])
+    return _framed(0xA2, bb)
+
+
+def hand_decode_0xA2(payload):
+    br = BitReader(payload)
+    return {"client_time": br.read_method_24(), "is_desync": bool(br.read_method_15()),
+            "server_time": br.read_method_24()}
+
+
+HAND = {
+    0x07: (hand_encode_0x07, hand_decode_0x07),
+    0x09: (hand_encode_0x09, hand_decode_0x09),
+    0x0A: (hand_encode_0x0A, hand_decode_0x0A),
+    0x32: (hand_encode_0x32, None),
+    0x76: (hand_encode_0x76, None),
+    0x7B: (hand_encode_0x7B, None),
+    0xA2: (hand_encode_0xA2, hand_decode_0xA2),
+}
+
+
+# sample values (ids > 0: method_9(0) does not decode, in either version)
+###################################
+def sample_values(rnd, opcode):
+    pos = lambda: rnd.randint(1, 60000)
+    if opcode == 0x07:
+        v = {name: rnd.random() < 0.5 for name in movement.FLAG_NAMES}
+        airborne = rnd.random() < 0.3
+        v.update(entity_id=pos(), dx=rnd.randint(-40, 40), dy=rnd.randint(-40, 40), dvx=rnd.randint(-5, 5),
+                 ent_state=rnd.randint(0, 3), airborne=airborne,
+                 velocity_y=rnd.choice((-420, 310, 12)) if airborne else None)
+        return v
+    if opcode == 0x09:
+        has_extra, has_flags = rnd.random() < 0.3, rnd.random() < 0.3
+        is_secondary = has_extra and rnd.random() < 0.5
+        has_cooldown, has_mana = has_flags and rnd.random() < 0.5, has_flags and rnd.random() < 0.5
+        has_target_pos, has_projectile = rnd.random() < 0.5, rnd.random() < 0.4
+        return {"ent_id": pos(), "power_id": rnd.randint(1, 400), "has_target_entity": rnd.random() < 0.5,
+                "has_target_pos": has_target_pos,
+                "target_x": rnd.choice((-1, 1)) * rnd.randint(1, 20000) if has_target_pos else None,
+                "target_y": rnd.choice((-1, 1)) * rnd.randint(1, 2000) if has_target_pos else None,
+                "has_projectile": has_projectile, "projectile_id": pos() if has_projectile else None,
+                "is_charged": rnd.random() < 0.2, "has_extra": has_extra,
+                "is_secondary": is_secondary if has_extra else None,
+                "secondary_id": rnd.randint(1, 400) if is_secondary else None,
+                "tertiary_id": rnd.randint(1, 400) if has_extra and not is_secondary else None,
+                "has_flags": has_flags, "has_cooldown": has_cooldown if has_flags else None,
+                "cooldown_tick": pos() if has_cooldown else None,
+                "has_mana": has_mana if has_flags else None,
+                "mana_cost": rnd.randint(0, 127) if has_mana else None}
+    if opcode == 0x0A:
+        has5, has6 = rnd.random() < 0.5, rnd.random() < 0.3
+        return {"target_id": pos(), "source_id": pos(), "value": rnd.choice((-1, 1)) * rnd.randint(1, 5000),
+                "power_id": rnd.randint(1, 400), "has_param5": has5, "param5": rnd.randint(1, 1000) if has5 else None,
+                "has_param6": has6, "param6": rnd.randint(1, 1000) if has6 else None, "flag": rnd.random() < 0.2}
+    if opcode == 0x32:
+        v = {"entity_id": pos(), "x": rnd.randint(-3000, 3000), "y": rnd.randint(-3000, 3000), "no_offset": True}
+        reward = rnd.choice(list(LOOT_FIELDS))
+        flag, field = LOOT_FIELDS[reward]
+        v[flag] = True
+        v[field] = rnd.randint(0, (1 << GearType.GEARTYPE_BITSTOSEND) - 1)
+        v["gear_tier"] = rnd.randint(0, 2)
+        return v
+    if opcode == 0x76:
+        return {"npc_id": pos(), "text": rnd.choice(("Hello there!", "Välkommen", "The goblins took the bridge."))}
+    if opcode == 0x7B:
+        return {"entity_id": pos(), "dialogue_id": rnd.randint(0, 5), "mission_id": rnd.randint(0, 300)}
+    if opcode == 0xA2:
+        return {"client_time": rnd.randint(1, 1 << 30), "is_desync": rnd.random() < 0.1,
+                "server_time": rnd.randint(1, 1 << 30)}
+    raise KeyError(opcode)
+
+
+def check_schemas(codecs, rounds=2000, seed=9):
+    rnd = random.Random(seed)
+    failures = 0
+    for opcode, codec in codecs.items():
+        hand_encode, hand_decode = HAND[opcode]
+        for _ in range(rounds):
+            v = sample_values(rnd, opcode)
+            ours, theirs = codec.encode(v), hand_encode(v)
+            bad = ours != theirs
+            if not bad and hand_decode is not None:
+                bad = codec.decode(memoryview(ours)[4:]) != hand_decode(memoryview(ours)[4:])
+            if bad:
+                failures += 1
+                if failures <= 3:
+                    print(f"  0x{opcode:02X} mismatch: {v} {ours.hex()} {theirs.hex()}")
+        # short data must fail like it does for the handlers
+        if hand_decode is not None:
+            frame = codec.encode(sample_values(rnd, opcode))
+            for cut in range(4, len(frame) - 1):
+                try:
+                    codec.decode(frame[4:cut])
+                except ValueError:
+                    continue
+                try:
+                    hand_decode(frame[4:cut])
+                except (ValueError, IndexError):
+                    failures += 1
+                    print(f"  0x{opcode:02X}: {cut - 4} bytes decoded by the schema only")
+    return failures
+
+
+def check_packet_types(path=os.path.join("data", "packet_types.json")):
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    checked = skipped = failures = 0
+    for name, entry in entries.items():
+        try:
+            opcode, fields, values = packet_schema.schema_from_packet_types(entry)
+            codec = packet_schema.compile_packet(f"custom_{checked + skipped}", opcode, fields)
+        except ValueError as e:
+            skipped += 1
+            print(f"  skipped {name.strip()!r}: {e}")
+            continue
+        bb = BitBuffer(debug=False)
+        try:
+            for buf in entry["buffers"]:
+                args = [int(a) if a.strip().lstrip("-").isdigit() else a.strip() for a in buf["value"].split(",")]
+                getattr(bb, buf["method"].strip())(*args)
+        except AttributeError as e:
+            skipped += 1
+            print(f"  skipped {name.strip()!r}: {e}")
+            continue
+        checked += 1
+        if codec.encode(values) != _framed(opcode, bb):
+            failures += 1
+            print(f"  {name.strip()!r}: schema bytes differ")
+    return checked, skipped, failures
+
+
+def bench(fn, items, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--show", metavar="OPCODE", help="print the generated code for this opcode")
+    args = parser.parse_args()
+
+    codecs = packet_schema.load_schemas()
+    if args.show:
+        print(codecs[int(args.show, 16)].source)
+        return
+
+    print("schemas vs hand-written ...", end=" ", flush=True)
+    failures = check_schemas(codecs)
+    print("OK" if not failures else f"{failures} MISMATCHES")
+    print("packet_types.json ...")
+    checked, skipped, bad = check_packet_types()
+    print(f"  {checked} compiled and identical, {skipped} skipped" + (f", {bad} MISMATCHES" if bad else ""))
+    failures += bad
+
+    rnd = random.Random(2)
+    print(f"{'packet':<30}{'enc hand':>9}{'enc gen':>9}{'x':>6}{'dec hand':>10}{'dec gen':>9}{'x':>6}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = []
+        for opcode, codec in codecs.items():
+            hand_encode, hand_decode = HAND[opcode]
+            values = [sample_values(rnd, opcode) for _ in range(5000)]
+            enc_hand, enc_gen = bench(hand_encode, values), bench(codec.encode, values)
+            row = f"0x{opcode:02X} {codec.name:<25}{enc_hand:>9.2f}{enc_gen:>9.2f}{enc_hand / enc_gen:>5.1f}x"
+            if hand_decode is not None:
+                payloads = [memoryview(codec.encode(v))[4:] for v in values]
+                dec_hand, dec_gen = bench(hand_decode, payloads), bench(codec.decode, payloads)
+                row += f"{dec_hand:>10.2f}{dec_gen:>9.2f}{dec_hand / dec_gen:>5.1f}x"
+            rows.append(row)
+    print("\n".join(rows))
+    print("(us per packet)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
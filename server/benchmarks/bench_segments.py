@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Segment cache (segments.py) on vs. off for the packets that splice cached
+segments: Send_Entity_Data for every NPC file and for players,
+build_enter_world_packet for every level, and Player_Data_Packet (level
+transfer, no extended block). Bytes must be the same either way.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_segments.py
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Character
+import WorldEnter
+import entity
+import segments
+from level_config import LEVEL_CONFIG
+
+
+def load_npcs():
+    npcs = []
+    for name in sorted(os.listdir("NPC_Data")):
+        if name.lower().endswith(".json"):
+            with open(os.path.join("NPC_Data", name), encoding="utf-8") as f:
+                try:
+                    data = json.load(f)
+                except json.JSONDecodeError:
+                    continue
+            if isinstance(data, list):
+                npcs.extend(n for n in data if isinstance(n, dict))
+    return npcs
+
+
+def players():
+    chars = []
+    for i, cls in enumerate(("paladin", "mage", "rogue")):
+        char = Character.load_class_template(cls)
+        char["name"] = f"Bench{cls.title()}"
+        chars.append(dict(char, id=100 + i, x=10, y=20, v=0, is_player=True))
+    return chars
+
+
+def enter_world_args(char):
+    args = []
+    for name, cfg in LEVEL_CONFIG.items():
+        swf, map_lvl, base_lvl, is_dungeon = cfg[0], cfg[1], cfg[2], cfg[3]
+        args.append(dict(transfer_token=4321, old_level_id=0, old_swf="LevelsHome.swf/a_Level_CraftTown",
+                         has_old_coord=False, old_x=0, old_y=0, host="127.0.0.1", port=8080,
+                         new_level_swf=swf, new_map_lvl=map_lvl, new_base_lvl=base_lvl, new_internal=name,
+                         new_moment="", new_alter="", new_is_dungeon=is_dungeon, new_has_coord=True,
+                         new_x=100, new_y=200, char=char))
+    return args
+
+
+def run(cases, enabled, repeat=7):
+    segments.configure(enabled)
+    segments.clear_segments()
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, (fn, items) in cases.items():
+            out = [fn(item) for item in items]  # fills the cache
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                for item in items:
+                    fn(item)
+                best = min(best, time.perf_counter() - t0)
+            results[name] = (best / len(items) * 1e6, out)
+    return results
+
+
+def main():
+    chars = players()
+    cases = {
+        "Send_Entity_Data (NPCs)": (entity.Send_Entity_Data, load_npcs()),
+        "Send_Entity_Data (players)": (entity.Send_Entity_Data, chars),
+        "build_enter_world_packet": (lambda kw: WorldEnter.build_enter_world_packet(**kw), enter_world_args(chars[0])),
+        "Player_Data_Packet (transfer)": (lambda c: WorldEnter.Player_Data_Packet(
+            c, transfer_token=4321, target_level="CraftTown", new_x=120, new_y=-40), chars),
+    }
+    with mock.patch.object(WorldEnter.time, "time", return_value=1700000000):  # same bytes both runs
+        off = run(cases, False)
+        on = run(cases, True)
+    print(f"{'packet':<32}{'count':>7}{'off us':>9}{'on us':>9}{'speedup':>9}  same bytes")
+    same_all = True
+    for name, (fn, items) in cases.items():
+        same = off[name][1] == on[name][1]
+        same_all &= same
+        print(f"{name:<32}{len(items):>7}{off[name][0]:>9.2f}{on[name][0]:>9.2f}"
+              f"{off[name][0] / on[name][0]:>8.1f}x  {'yes' if same else 'NO'}")
+    print("cache:", segments.get_segment_stats())
+    sys.exit(0 if same_all else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Connection count vs. latency benchmark for the threaded and asyncio serving modes.
+
+Each mode is started in its own server process. The benchmark then opens N
+client connections that all ping the server concurrently with 0x11 (login
+challenge request) and time the 0x12 reply. The round trip goes through the
+full recv -> framing -> dispatch -> sendall path of the server.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_server_modes.py
+    python benchmarks/bench_server_modes.py --clients 10 100 400 --rounds 50
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PING = struct.pack(">HH", 0x11, 0)
+
+
+def _start_server(mode, port):
+    code = f"import server; server.serve_forever({mode!r}, [{port}])"
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=SERVER_DIR,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not come up on port {port}")
+
+
+async def _client(reader, writer, rounds, samples):
+    try:
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            writer.write(PING)
+            header = await reader.readexactly(4)
+            _, length = struct.unpack(">HH", header)
+            await reader.readexactly(length)
+            samples.append(time.perf_counter() - t0)
+    finally:
+        writer.close()
+
+
+async def _run_load(port, clients, rounds):
+    samples = []
+    streams = []
+    for _ in range(clients):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        # wait for one round trip so the server has accepted the connection
+        writer.write(PING)
+        _, length = struct.unpack(">HH", await reader.readexactly(4))
+        await reader.readexactly(length)
+        streams.append((reader, writer))
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(r, w, rounds, samples) for r, w in streams))
+    return samples, time.perf_counter() - t0
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 50, 100, 200, 400])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--modes", nargs="+", default=["threaded", "asyncio"])
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'clients':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'req/s':>10}")
+    for mode in args.modes:
+        proc = _start_server(mode, args.port)
+        try:
+            for clients in args.clients:
+                samples, elapsed = asyncio.run(_run_load(args.port, clients, args.rounds))
+                print(f"{mode:<10}{clients:>8}"
+                      f"{statistics.median(samples) * 1000:>10.2f}"
+                      f"{_percentile(samples, 99) * 1000:>10.2f}"
+                      f"{max(samples) * 1000:>10.2f}"
+                      f"{len(samples) / elapsed:>10.0f}")
+        finally:
+            proc.kill()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
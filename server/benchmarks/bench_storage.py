@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Storage backends (storage.py) on synthetic accounts built from the class
+templates in data/: JSON saves vs. the SQLite database.
+
+- migration:  migrate_json_to_sqlite() of all the JSON saves
+- directory:  loading the email -> user_id directory at startup
+- login:      directory lookup + cold load of the account (char_store)
+- save:       write-through save after a position checkpoint (one field
+              of one character) and after an inventory change
+- names:      building the name index from the saves, and a name check
+
+Then checks that every account reads back the same from both backends,
+after the migration and after the timed saves. Runs in a temporary
+directory, nothing in the server tree is touched.
+
+Usage (from the server/ directory):
+    python benchmarks/bench_storage.py [--accounts 300]
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import accounts
+import char_store
+import name_index
+import storage
+
+TEMPLATES = [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", f"{c}_template.json")
+             for c in ("paladin", "mage", "rogue")]
+
+
+def make_saves(count, rnd):
+    """Accounts.json and saves/ with 1-3 template characters per account, returns email -> user_id."""
+    templates = []
+    for path in TEMPLATES:
+        with open(path, "r", encoding="utf-8") as f:
+            templates.append(json.load(f))
+    source = storage.JsonBackend()
+    directory = {}
+    for i in range(count):
+        user_id, email = f"{i:012x}", f"player{i}@example.com"
+        chars = []
+        for j in range(rnd.randint(1, 3)):
+            char = copy.deepcopy(rnd.choice(templates))
+            char["name"] = f"Hero{i}x{j}"
+            char["level"] = rnd.randint(1, 50)
+            chars.append(char)
+        source.save(user_id, {"email": email, "characters": chars})
+        directory[email] = user_id
+    with open(source.accounts_path, "w", encoding="utf-8") as f:
+        json.dump([{"email": e, "user_id": u} for e, u in directory.items()], f, indent=2)
+    return directory
+
+
+def use(kind):
+    """Switch every layer to a fresh backend of this kind, with cold caches."""
+    storage.configure(kind)
+    accounts._index = None
+    char_store._accounts.clear()
+    name_index._names = None
+    name_index._by_user = {}
+    name_index._source = None
+    return storage.get_backend()
+
+
+def per_call(fn, items):
+    t0 = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - t0) / len(items)
+
+
+def fmt(seconds):
+    return f"{seconds * 1e3:9.3f} ms" if seconds >= 1e-4 else f"{seconds * 1e6:9.2f} us"
+
+
+def run(kind, emails, rnd):
+    """Timings of one backend, plus the saves it ended up with."""
+    use(kind)
+    times = {}
+    t0 = time.perf_counter()
+    accounts.lookup_user_id(emails[0])  # loads the directory
+    times["directory load"] = time.perf_counter() - t0
+
+    def login(email):
+        user_id = accounts.lookup_user_id(email)
+        char_store.get_account(user_id)
+        char_store._accounts.pop(user_id)  # keep the next login cold
+    sample = [rnd.choice(emails) for _ in range(len(emails) // 2 or 1)]
+    times["login (lookup + load)"] = per_call(login, sample)
+
+    users = [accounts.lookup_user_id(e) for e in sample]
+    for user_id in users:
+        char_store.get_account(user_id)
+
+    def checkpoint(user_id):
+        chars = char_store.get_characters(user_id)
+        chars[0]["CurrentLevel"] = {"name": "NewbieRoad", "x": rnd.randint(0, 5000), "y": rnd.randint(0, 800)}
+        char_store.put_characters(user_id, chars)
+    times["save (position)"] = per_call(checkpoint, users)
+
+    def loot(user_id):
+        chars = char_store.get_characters(user_id)
+        chars[-1]["inventoryGears"].append({"gearID": rnd.randint(1, 1200), "tier": 0, "runes": [0, 0, 0], "colors": [0, 0]})
+        char_store.put_characters(user_id, chars)
+    times["save (inventory)"] = per_call(loot, users)
+    saved = {user_id: copy.deepcopy(char_store.get_account(user_id)) for user_id in users}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        name_index.rebuild()
+        times["name index build"] = time.perf_counter() - t0
+    probes = [f"hero{rnd.randrange(len(emails))}x0" for _ in range(5000)] + [f"free{i}" for i in range(5000)]
+    times["name check"] = per_call(name_index.is_taken, probes)
+    return times, saved
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=300)
+    args = parser.parse_args()
+    rnd = random.Random(25)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        char_store.configure(0)  # write-through, so the timed saves hit the backend
+        directory = make_saves(args.accounts, rnd)
+        emails = list(directory)
+        size = sum(os.path.getsize(os.path.join("saves", n)) for n in os.listdir("saves"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            storage.migrate_json_to_sqlite()
+            migration = time.perf_counter() - t0
+        print(f"{args.accounts} accounts, saves/ {size / 1e6:.1f} MB, {storage.DB_PATH} "
+              f"{os.path.getsize(storage.DB_PATH) / 1e6:.1f} MB, migrated in {migration:.2f} s")
+
+        json_backend, sqlite_backend = storage.JsonBackend(), storage.SqliteBackend()
+        ok = sqlite_backend.load_directory() == directory
+        ok &= all(sqlite_backend.load(u) == json_backend.load(u) for u in directory.values())
+
+        results = {}
+        for kind in ("json", "sqlite"):
+            results[kind] = run(kind, emails, random.Random(rnd.random()))
+        print(f"{'operation':<26}{'json':>13}{'sqlite':>13}")
+        for op in results["json"][0]:
+            print(f"{op:<26}{fmt(results['json'][0][op]):>13}{fmt(results['sqlite'][0][op]):>13}")
+
+        for kind, backend in (("json", json_backend), ("sqlite", sqlite_backend)):
+            ok &= all(backend.load(u) == data for u, data in results[kind][1].items())
+        storage.get_backend().close()  # the sqlite run's
+        sqlite_backend.close()
+        print("migration and saves read back identically:", "OK" if ok else "MISMATCH")
+        os.chdir(cwd)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
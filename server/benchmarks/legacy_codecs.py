@@ -0,0 +1,387 @@
+"""
+The original codecs, kept only as references for the benchmarks: the
+one-list-entry-per-bit writer BitBuffer replaced (verify_bitbuffer.py)
+and the byte-copying reader BitReader replaced (bench_bitreader.py).
+The new ones must produce the same bytes, values, errors and debug logs.
+"""
+import struct
+from typing import List
+
+
+class ListBitBuffer:
+    """
+    The original one-list-entry-per-bit writer. BitBuffer must produce the
+    same bytes; kept as the reference for benchmarks/verify_bitbuffer.py.
+    """
+    def __init__(self, debug=True):
+        self.bits = []
+        self.debug = debug
+        self.debug_log = [] if debug else None
+
+    def align_to_byte(self):# the client does not use padding it expects everything in a single bitstream but who knows we might need it
+        while len(self.bits) % 8 != 0:
+            self.bits.append(0)
+            if self.debug:
+                self.debug_log.append("align_pad=0")
+
+    def write_method_15(self, flag: bool):
+        """Write a single boolean (1 bit) to the bitstream, matching client method_15."""
+        self.write_method_11(1 if flag else 0, 1)
+        if self.debug:
+            self.debug_log.append(f"method_15={flag}")
+
+    def to_bytes(self):
+        while len(self.bits) % 8 != 0:
+            self.bits.append(0)
+            if self.debug:
+                self.debug_log.append("pad_to_byte=0")
+        out = bytearray()
+        for i in range(0, len(self.bits), 8):
+            byte = 0
+            for bit in self.bits[i:i + 8]:
+                byte = (byte << 1) | bit
+            out.append(byte)
+        return bytes(out)
+
+    def write_method_20(self, bit_count: int, value: int):
+        while bit_count > 0:
+            byte_index = len(self.bits) // 8
+            bit_offset = len(self.bits) & 7
+            bits_left_in_byte = 8 - bit_offset
+            bits_to_write = min(bit_count, bits_left_in_byte)
+
+            shift = bit_count - bits_to_write
+            mask = (value >> shift) & ((1 << bits_to_write) - 1)
+
+            for i in range(bits_to_write):
+                self.bits.append((mask >> (bits_to_write - 1 - i)) & 1)
+
+            bit_count -= bits_to_write
+
+            if self.debug:
+                self.debug_log.append(f"write_method_20: value={value}, bits_written={bits_to_write}")
+
+
+    def write_method_739(self, value: int):
+        if value < 0:
+            self.write_method_11(1, 1)
+            self.write_method_91(-value)
+        else:
+            self.write_method_11(0, 1)
+            self.write_method_91(value)
+        if self.debug:
+            self.debug_log.append(f"method_739={value}")
+
+    def write_method_4(self, val: int):
+        bits_needed = val.bit_length() if val > 0 else 1
+        bits_to_use = max(2, (bits_needed + 1) & ~1)
+        prefix = (bits_to_use // 2) - 1
+        assert 0 <= prefix <= 15, f"Value too large for method_4: {val}"
+        self.write_method_11(prefix, 4)
+        self.write_method_11(val, bits_to_use)
+        if self.debug:
+            self.debug_log.append(f"method_4={val}, prefix={prefix}, bits={bits_to_use}")
+
+    def write_method_26(self, val: str):
+        """
+        Write a UTF-8 encoded string with a 16-bit length prefix, capped at 65535.
+        - val: String to write (None or empty string treated as empty).
+        """
+        if val is None:
+            val = ""
+        encoded = val.encode('utf-8')
+        length = min(len(encoded), 65535)
+        self.write_method_11(length, 16)
+        for byte in encoded[:length]:
+            self.write_method_11(byte, 8)
+        if self.debug:
+            self.debug_log.append(f"method_26={val}, length={length}")
+
+    def write_method_6(self, val: int, bit_count: int):
+        self.write_method_11(val, bit_count)
+        if self.debug:
+            self.debug_log.append(f"method_6={val}, bits={bit_count}")
+
+    def write_method_91(self, val: int):
+        bits_needed = val.bit_length() if val > 0 else 1
+        bits_to_use = max(2, (bits_needed + 1) & ~1)
+        n = (bits_to_use // 2) - 1
+        self.write_method_11(n, 3)
+        self.write_method_11(val, bits_to_use)
+        if self.debug:
+            self.debug_log.append(f"method_91={val}, n={n}, bits={bits_to_use}")
+
+
+    def write_method_9(self, val: int):
+        bitlen = val.bit_length()
+        if bitlen % 2:
+            bitlen += 1
+        prefix = (bitlen // 2) - 1
+        self.write_method_11(prefix, 4)
+        self.write_method_11(val, bitlen)
+
+    def write_signed_method_45(self, val: int):
+        if val < 0:
+            self.write_method_11(1, 1)
+            self.write_method_4(-val)
+        else:
+            self.write_method_11(0, 1)
+            self.write_method_4(val)
+        if self.debug:
+            self.debug_log.append(f"method_45={val}, sign={1 if val < 0 else 0}")
+
+    def write_method_11(self, value, bit_count):
+        if self.debug:
+            self.debug_log.append(f"write_method_6={value:0{bit_count}b} ({bit_count} bits)")
+        for i in reversed(range(bit_count)):
+            self.bits.append((value >> i) & 1)
+
+    def write_method_393(self, val):
+        self.write_method_11(val & 0xFF, 8)
+
+    def write_method_13(self, *vals: str):
+        # Join multiple parts into one string
+        val = " ".join(str(v) for v in vals)
+        encoded = val.encode('utf-8')
+        length = min(len(encoded), 65535)
+
+        self.write_method_11(length, 16)  # write length as 16-bit
+        for byte in encoded[:length]:
+            self.write_method_11(byte, 8)
+
+        if self.debug:
+            self.debug_log.append(f"method_13={val}, length={length}")
+
+    def write_float(self, val: float):
+        b = struct.pack(">f", val)
+        for byte in b:
+            self.write_method_11(byte, 8)
+
+    def write_method_309(self, val: float):
+        self.write_float(val)
+        if self.debug:
+            self.debug_log.append(f"method_309={val}")
+
+
+    def write_method_24(self, val: int):
+        """
+        Write a signed integer as a 1-bit sign flag followed by the magnitude via method_9.
+        - val: Signed integer to write.
+        """
+        sign = 1 if val < 0 else 0
+        self.write_method_11(sign, 1)
+        self.write_method_9(abs(val))
+        if self.debug:
+            self.debug_log.append(f"method_24={val}, sign={sign}")
+
+    def segment(self):
+        value = 0
+        for bit in self.bits:
+            value = (value << 1) | bit
+        return value, len(self.bits)
+
+    def write_segment(self, segment):
+        value, bit_count = segment
+        if self.debug:
+            self.debug_log.append(f"segment: {bit_count} bits")
+        for i in range(bit_count - 1, -1, -1):
+            self.bits.append((value >> i) & 1)
+
+    def get_debug_log(self):
+        return self.debug_log if self.debug else []
+
+
+class BytearrayBitReader:
+    """
+    The original reader: copies the payload and reads bit by bit / byte by
+    byte. BitReader must return the same values; kept as the reference for
+    benchmarks/bench_bitreader.py.
+    """
+    def __init__(self, data: bytes, debug: bool = False):
+        self.data = bytearray(data)
+        self.bit_index = 0
+        self.debug = debug
+        self.debug_log: List[str] = [] if debug else []
+
+    def align_to_byte(self):
+        remainder = self.bit_index % 8
+        if remainder:
+            skip_bits = 8 - remainder
+            for _ in range(skip_bits):
+                self.read_bit()
+            if self.debug:
+                self.debug_log.append(f"align_to_byte=skipped {skip_bits} bits")
+
+    def remaining_bits(self) -> int:
+        """
+        Server-only helper: return how many unread bits remain in the buffer.
+        The Flash client does not expose an equivalent method; it always knows
+        how many bits to read based on the packet type.
+        """
+        total_bits = len(self.data) * 8
+        return max(0, total_bits - self.bit_index)
+
+    def read_bit(self) -> int:
+        byte_index = self.bit_index // 8
+        bit_offset = self.bit_index & 7
+        if byte_index >= len(self.data):
+            raise ValueError("Not enough data to read bit")
+        bit = (self.data[byte_index] >> (7 - bit_offset)) & 1
+        self.bit_index += 1
+        if self.debug:
+            self.debug_log.append(f"read_bit={bit} at bit_index={self.bit_index-1}")
+        return bit
+
+    def read_method_15(self) -> bool:
+        """Read a single boolean (1 bit) from the bitstream, matching client method_15."""
+        bit = self.read_bit()
+        if self.debug:
+            self.debug_log.append(f"method_15={bool(bit)}")
+        return bool(bit)
+
+    def read_method_20(self, bit_count: int) -> int:
+        """Read bit_count bits across byte boundaries, MSB-first."""
+        val = 0
+        while bit_count > 0:
+            byte_index = self.bit_index // 8
+            bit_offset = self.bit_index & 7
+            bits_left_in_byte = 8 - bit_offset
+            bits_to_read = min(bit_count, bits_left_in_byte)
+
+            mask = (1 << bits_to_read) - 1
+            shift = bits_left_in_byte - bits_to_read
+            current_byte = self.data[byte_index]
+            extracted = (current_byte >> shift) & mask
+
+            val = (val << bits_to_read) | extracted
+            self.bit_index += bits_to_read
+            bit_count -= bits_to_read
+
+            if self.debug:
+                self.debug_log.append(
+                    f"read_method_20: byte_index={byte_index}, bit_offset={bit_offset}, "
+                    f"bits_to_read={bits_to_read}, extracted={extracted}, val={val}"
+                )
+        return val
+
+    def read_method_739(self) -> int:  # Add if needed
+        sign = self.read_bit()
+        prefix = self.read_method_20(3)
+        bits_to_use = (prefix + 1) * 2
+        magnitude = self.read_method_20(bits_to_use)
+        return -magnitude if sign else magnitude
+
+    def read_method_4(self) -> int:
+        prefix = self.read_method_20(4)
+        bits_to_use = (prefix + 1) * 2
+        if self.bit_index + bits_to_use > len(self.data) * 8:
+            raise ValueError(f"Not enough data to read {bits_to_use} bits for method_4")
+        value = self.read_method_20(bits_to_use)
+        if self.debug:
+            self.debug_log.append(f"read_method_4={value}, prefix={prefix}, bits={bits_to_use}")
+        return value
+
+    def read_method_26(self) -> str:
+        # 1) read 16 bits for the length
+        length = self.read_method_20(16)          # big-endian unsigned by design
+        # 2) read `length` bytes
+        raw = bytearray(self.read_method_20(8) for _ in range(length))
+        # 3) decode as UTF-8
+        try:
+            return raw.decode('utf-8')
+        except UnicodeDecodeError:
+            # fallback if you ever have non-utf8 data
+            return raw.decode('latin-1', errors='replace')
+
+    def read_method_706(self) -> int:
+        # 1) sign flag (1 bit)
+        is_negative = bool(self.read_bit())
+
+        # 2) read 3-bit “prefix” that encodes how many bits follow
+        prefix = self.read_method_20(3)
+        #    prefix = (bit_length + (bit_length & 1)) / 2 - 1
+        # => bit_length = (prefix + 1) * 2
+        bit_length = (prefix + 1) * 2
+
+        # 3) read that many bits of the absolute value
+        value = self.read_method_20(bit_length)
+
+        return -value if is_negative else value
+
+    def read_method_6(self, bit_count: int) -> int:
+        if self.bit_index + bit_count > len(self.data) * 8:
+            raise ValueError(f"Not enough data to read {bit_count} bits for method_6")
+        value = self.read_method_20(bit_count)
+        if self.debug:
+            self.debug_log.append(f"read_method_6={value}, bits={bit_count}")
+        return value
+
+    def read_method_9(self) -> int:
+        prefix = self.read_method_20(4)
+        n_bits = (prefix + 1) * 2
+        if self.bit_index + n_bits > len(self.data) * 8:
+            raise ValueError(f"Not enough data to read {n_bits} bits for method_9")
+        value = self.read_method_20(n_bits)
+        if self.debug:
+            self.debug_log.append(f"read_method_9={value}, prefix={prefix}, bits={n_bits}")
+        return value
+
+    def read_method_45(self) -> int:
+        sign = self.read_bit()
+        if self.bit_index + 4 > len(self.data) * 8:  # Need at least 4 bits for prefix
+            raise ValueError("Not enough data to read method_4 prefix for method_45")
+        magnitude = self.read_method_4()
+        value = -magnitude if sign else magnitude
+        if self.debug:
+            self.debug_log.append(f"read_method_45={value}, sign={sign}, magnitude={magnitude}")
+        return value
+
+    def read_method_393(self) -> int:
+        value = self.read_method_20(8)
+        if self.debug:
+            self.debug_log.append(f"read_method_393={value}")
+        return value
+
+    def read_method_560(self) -> float:
+        if self.bit_index + 32 > len(self.data) * 8:
+            raise ValueError("Not enough data to read float")
+        bits = self.read_method_20(32)
+        bytes_val = struct.pack('>I', bits)
+        float_val = struct.unpack('>f', bytes_val)[0]
+        if self.debug:
+            self.debug_log.append(f"read_method_560={float_val}")
+        return float_val
+
+    def read_method_13(self) -> str:
+        length = self.read_method_20(16)
+        if self.bit_index + length * 8 > len(self.data) * 8:
+            raise ValueError("Not enough data to read string")
+        result_bytes = bytearray()
+        for _ in range(length):
+            result_bytes.append(self.read_method_20(8))
+        try:
+            return result_bytes.decode('utf-8')
+        except UnicodeDecodeError:
+            return result_bytes.decode('latin1')
+
+    def read_method_24(self) -> int:
+        if self.bit_index + 1 > len(self.data) * 8:
+            raise ValueError("Not enough data to read sign bit for method_24")
+        sign = self.read_bit()
+        magnitude = self.read_method_9()
+        value = -magnitude if sign else magnitude
+        if self.debug:
+            self.debug_log.append(f"read_method_24={value}, sign={sign}, magnitude={magnitude}")
+        return value
+
+    def read_method_309(self) -> float:
+        return self.read_float()  # Reads 32-bit float
+
+    def read_float(self) -> float:
+        bits = self.read_method_20(32)
+        bytes_val = struct.pack('>I', bits)
+        return struct.unpack('>f', bytes_val)[0]
+
+
+    def get_debug_log(self) -> List[str]:
+        return self.debug_log
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Checks that BitBuffer (int accumulator) writes exactly the bytes the old
+list-of-bits writer (legacy_codecs.ListBitBuffer) does, then times both.
+
+1. Random sequences of every write_method_* (including the quirks: negative
+   values, write_method_9(0), writes after to_bytes() padded the stream),
+   comparing bytes and debug logs.
+2. Every packet builder, run with a lockstep buffer that feeds both
+   implementations the same calls and compares the bytes. Handlers that
+   build packets inline only use the same primitives, which 1. covers.
+   The builders run traced and untraced, and the packets must be the same:
+   untraced they splice in cached segments (segments.py).
+3. Player_Data_Packet with a full inventory, old vs new.
+
+Usage (from the server/ directory):
+    python benchmarks/verify_bitbuffer.py
+"""
+import contextlib
+import copy
+import functools
+import io
+import json
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BitBuffer import BitBuffer
+from legacy_codecs import ListBitBuffer
+
+import Brain
+import Character
+import Commands
+import WorldEnter
+import accounts
+import entity
+import movement
+import scheduler
+import tracing
+
+
+class Lockstep:
+    """Drop-in BitBuffer that drives both implementations and compares to_bytes()."""
+    checked = 0
+    mismatches = []
+    outputs = []
+
+    def __init__(self, debug=True):
+        self._new = BitBuffer(debug)
+        self._ref = ListBitBuffer(debug)
+        self.debug = self._new.debug
+        self.debug_log = self._new.debug_log
+
+    def __getattr__(self, name):
+        new_attr = getattr(self._new, name)
+        if not callable(new_attr):
+            return new_attr
+        ref_attr = getattr(self._ref, name)
+
+        def both(*args, **kwargs):
+            ref_attr(*args, **kwargs)
+            return new_attr(*args, **kwargs)
+        return both
+
+    def to_bytes(self):
+        new, ref = self._new.to_bytes(), self._ref.to_bytes()
+        Lockstep.checked += 1
+        if new != ref:
+            Lockstep.mismatches.append((sys._getframe(1).f_code.co_name, new.hex(), ref.hex()))
+        Lockstep.outputs.append((sys._getframe(1).f_code.co_name, new))
+        return new
+
+
+PATCHED = (Brain, Character, Commands, WorldEnter, accounts, entity, movement, scheduler)
+
+
+@contextlib.contextmanager
+def buffer_class(cls):
+    saved = {mod: getattr(mod, "BitBuffer", None) for mod in PATCHED}
+    for mod in saved:
+        if hasattr(mod, "BitBuffer"):
+            mod.BitBuffer = cls
+    try:
+        yield
+    finally:
+        for mod, orig in saved.items():
+            if orig is not None:
+                mod.BitBuffer = orig
+
+
+# 1. primitives
+###################################
+def random_ops(rnd, count):
+    ops = []
+    for _ in range(count):
+        kind = rnd.randrange(16)
+        if kind == 0:
+            ops.append(("write_method_4", rnd.choice((0, 1, 2, 3, rnd.getrandbits(rnd.randint(1, 32))))))
+        elif kind == 1:
+            ops.append(("write_method_9", rnd.choice((0, 1, rnd.getrandbits(rnd.randint(1, 30))))))
+        elif kind == 2:
+            ops.append(("write_method_24", rnd.randint(-(1 << 29), 1 << 29) if rnd.random() < 0.8 else 0))
+        elif kind == 3:
+            ops.append(("write_signed_method_45", rnd.randint(-(1 << 20), 1 << 20)))
+        elif kind == 4:
+            ops.append(("write_method_739", rnd.randint(-(1 << 15), 1 << 15)))
+        elif kind == 5:
+            ops.append(("write_method_91", rnd.getrandbits(rnd.randint(1, 16))))
+        elif kind == 6:
+            n = rnd.randint(0, 40)
+            ops.append(("write_method_6", rnd.getrandbits(n + 3), n))
+        elif kind == 7:
+            n = rnd.randint(0, 40)
+            ops.append(("write_method_11", rnd.randint(-(1 << n), 1 << n), n))
+        elif kind == 8:
+            n = rnd.randint(0, 40)
+            ops.append(("write_method_20", n, rnd.randint(-(1 << 45), 1 << 45)))
+        elif kind == 9:
+            ops.append(("write_method_15", rnd.random() < 0.5))
+        elif kind == 10:
+            ops.append(("write_method_13", "".join(rnd.choice("abcXYZ é漢") for _ in range(rnd.randint(0, 12)))))
+        elif kind == 11:
+            ops.append(("write_method_26", rnd.choice((None, "", "Hello", "Ωmega"))))
+        elif kind == 12:
+            ops.append(("write_float", rnd.uniform(-1e6, 1e6)))
+        elif kind == 13:
+            ops.append(("write_method_393", rnd.randint(-300, 300)))
+        elif kind == 14:
+            ops.append(("align_to_byte",))
+        else:
+            ops.append(("to_bytes",))
+    return ops
+
+
+def check_primitives(rounds=3000, seed=11):
+    rnd = random.Random(seed)
+    failures = 0
+    for _ in range(rounds):
+        ops = random_ops(rnd, rnd.randint(1, 60))
+        debug = rnd.random() < 0.5
+        new, ref = BitBuffer(debug=debug), ListBitBuffer(debug=debug)
+        for name, *args in ops:
+            getattr(new, name)(*args)
+            getattr(ref, name)(*args)
+        if new.to_bytes() != ref.to_bytes() or new.get_debug_log() != ref.get_debug_log():
+            failures += 1
+            if failures <= 3:
+                print("  mismatch for ops:", ops)
+    return failures
+
+
+# 2. packet builders
+###################################
+class _CaptureConn:
+    def __init__(self):
+        self.sent = []
+
+    def sendall(self, data):
+        self.sent.append(bytes(data))
+
+
+class _Session:
+    def __init__(self):
+        self.conn = _CaptureConn()
+        self.addr = ("verify", 0)
+
+
+def sample_characters():
+    chars = []
+    for cls in ("paladin", "mage", "rogue"):
+        char = Character.load_class_template(cls)
+        char["name"] = f"Verify{cls.title()}"
+        chars.append(char)
+    # one with a big inventory, as a long-played character would have
+    big = copy.deepcopy(chars[0])
+    big["name"] = "VerifyHoarder"
+    gear = (big.get("inventoryGears") or [{"gearID": 1, "tier": 0, "runes": [0, 0, 0], "colors": [0, 0]}])[0]
+    big["inventoryGears"] = [dict(copy.deepcopy(gear), gearID=1 + i % 1500, tier=i % 3) for i in range(1800)]
+    chars.append(big)
+    return chars
+
+
+def run_builders():
+    chars = sample_characters()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for char in chars:
+            for extended in (False, True):
+                WorldEnter.Player_Data_Packet(char, transfer_token=4321, target_level="CraftTown",
+                                              new_x=120, new_y=-40, send_extended=extended)
+            WorldEnter.build_enter_world_packet(
+                transfer_token=4321, old_level_id=0, old_swf="", has_old_coord=False, old_x=0, old_y=0,
+                host="127.0.0.1", port=8080, new_level_swf="LevelsHome.swf/a_Level_CraftTown",
+                new_map_lvl=1, new_base_lvl=1, new_internal="CraftTown", new_moment="", new_alter="",
+                new_is_dungeon=False, new_has_coord=True, new_x=100, new_y=200, char=char)
+            WorldEnter.send_building_update(_Session(), char)
+            Character.build_paperdoll_packet(char)
+            Character.build_level_gears_packet(Character.get_inventory_gears(char))
+            entity.Send_Entity_Data(dict(char, id=77, x=10, y=20, v=0, is_player=True))
+        Character.build_login_character_list_bitpacked(chars[:3])
+        accounts.build_popup_packet("Verify popup", disconnect=True)
+
+        for name in sorted(os.listdir("NPC_Data")):
+            if name.lower().endswith(".json"):
+                with open(os.path.join("NPC_Data", name), encoding="utf-8") as f:
+                    try:
+                        npcs = json.load(f)
+                    except json.JSONDecodeError:
+                        continue
+                for npc in npcs if isinstance(npcs, list) else []:
+                    entity.Send_Entity_Data(npc)
+
+        for reward in Commands.REWARD_TYPES:
+            Commands.build_loot_drop_packet(55, 300, -20, reward, 3, 1)
+        Commands.build_start_skit_packet(55, 2, 0)
+        entity.build_entity_full_update(9, {"pos_x": -5, "pos_y": 0, "ent_name": "V", "cue_data": {"DramaAnim": "x"},
+                                            "summoner_id": 0, "is_player": True, "y_offset": -3})
+        movement.encode_movement(9, -3, 0, 12, 1, 0b10100, 0)
+        Brain._build_pkt_0x07(9, 4, -1, 0, 1, {"b_left": True}, airborne=True, velocity_y=-250)
+
+
+# 3. timing
+###################################
+def time_player_data(cls, char, repeat=20):
+    best = float("inf")
+    with buffer_class(cls), contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            pkt = WorldEnter.Player_Data_Packet(char, transfer_token=4321, send_extended=True)
+            best = min(best, time.perf_counter() - t0)
+    return best, len(pkt)
+
+
+def main():
+    tracing.enable()  # debug=True only logs while tracing
+    print("primitives ...", end=" ", flush=True)
+    failures = check_primitives()
+    print("OK" if not failures else f"{failures} MISMATCHES")
+
+    print("packet builders ...", end=" ", flush=True)
+    # Player_Data_Packet writes the current time; keep it fixed so the three runs can be compared
+    with buffer_class(Lockstep), mock.patch("time.time", return_value=1700000000.0):
+        run_builders()
+        traced, Lockstep.outputs = Lockstep.outputs, []
+        tracing.disable()
+        run_builders()  # twice, cold and warm segment cache
+        cold, Lockstep.outputs = Lockstep.outputs, []
+        run_builders()
+        tracing.enable()
+    segment_mismatches = [a[0] for a, b, c in zip(traced, cold, Lockstep.outputs) if not a == b == c]
+    if len(traced) != len(cold):
+        segment_mismatches.append("packet count")
+    print(f"{Lockstep.checked} buffers compared, "
+          + ("OK" if not Lockstep.mismatches else f"{len(Lockstep.mismatches)} MISMATCHES"))
+    for where, new, ref in Lockstep.mismatches[:5]:
+        print(f"  {where}: new={new[:64]}... ref={ref[:64]}...")
+    print("cached segments vs traced builders ...",
+          "OK" if not segment_mismatches else f"MISMATCHES in {sorted(set(segment_mismatches))}")
+
+    char = sample_characters()[-1]
+    for debug in (True, False):
+        if not debug:
+            tracing.disable()
+        old_t, size = time_player_data(functools.partial(ListBitBuffer, debug=debug), char)
+        new_t, _ = time_player_data(functools.partial(BitBuffer, debug=debug), char)
+        print(f"Player_Data_Packet ({size} bytes, {len(char['inventoryGears'])} gears, debug={debug}): "
+              f"list {old_t * 1e3:.1f} ms, accumulator {new_t * 1e3:.1f} ms ({old_t / new_t:.1f}x)")
+
+    sys.exit(1 if failures or Lockstep.mismatches or segment_mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+0x07 merging in the outbound queues (outbound.py) with batched writes mixed
+in: single 0x07s and batched buffers (several 0x07s of different entities
+joined into one sendall(), as batching.UpdateBatch.flush sends them) go
+through an OutboundQueue and a StreamConnection whose peer does not read
+yet, so frames pile up and merge. The peer then reads everything and sums
+the deltas per entity, which must match what was sent.
+
+Usage (from the server/ directory):
+    python benchmarks/verify_outbound.py [--updates 20000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import struct
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from movement import PKT_MOVEMENT, decode_movement, encode_movement
+from outbound import OutboundQueue, StreamConnection
+
+ENTITIES = (5, 9, 17, 300)
+
+
+def make_writes(count, rnd):
+    """Writes to send (single frames and batched buffers), and the dx sums they carry."""
+    writes, expected = [], {}
+    for _ in range(count):
+        frames = []
+        for _ in range(1 if rnd.random() < 0.6 else rnd.randint(2, 5)):
+            entity_id, dx = rnd.choice(ENTITIES), rnd.randint(-12, 12)
+            frames.append(encode_movement(entity_id, dx, 0, 0, 0, 0))
+            expected[entity_id] = expected.get(entity_id, 0) + dx
+        writes.append(frames[0] if len(frames) == 1 else b"".join(frames))
+    return writes, expected
+
+
+def dx_sums(stream):
+    """Per-entity dx sums of a received byte stream of framed 0x07s."""
+    sums, pos = {}, 0
+    while pos < len(stream):
+        pkt, length = struct.unpack_from(">HH", stream, pos)
+        assert pkt == PKT_MOVEMENT, hex(pkt)
+        entity_id, dx = decode_movement(stream[pos + 4:pos + 4 + length])[:2]
+        sums[entity_id] = sums.get(entity_id, 0) + dx
+        pos += 4 + length
+    return sums
+
+
+def read_all(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def small_socketpair():
+    ours, theirs = socket.socketpair()
+    ours.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    theirs.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    return ours, theirs
+
+
+def run_threaded(writes):
+    ours, theirs = small_socketpair()
+    conn = OutboundQueue(ours, "verify")
+    for data in writes:
+        conn.sendall(data)
+    received = []
+    reader = threading.Thread(target=lambda: received.append(read_all(theirs)))
+    reader.start()
+    conn.close()
+    reader.join()
+    theirs.close()
+    return dx_sums(received[0]), conn.queue_stats()["frames_merged"]
+
+
+def run_asyncio(writes):
+    ours, theirs = small_socketpair()
+    received = []
+    reader = threading.Event()
+
+    def read():
+        reader.wait()
+        received.append(read_all(theirs))
+
+    thread = threading.Thread(target=read)
+    thread.start()
+
+    async def main():
+        _, writer = await asyncio.open_connection(sock=ours)
+        conn = StreamConnection(writer, asyncio.get_running_loop(), "verify")
+        for i, data in enumerate(writes):
+            conn.sendall(data)
+            if i % 64 == 0:
+                await asyncio.sleep(0)  # let flushes run, so the transport fills up
+        reader.set()
+        while conn._frames or conn._flush_scheduled:
+            await asyncio.sleep(0.01)
+        merged = conn.queue_stats()["frames_merged"]
+        conn.close()
+        await writer.wait_closed()
+        return merged
+
+    merged = asyncio.run(main())
+    thread.join()
+    theirs.close()
+    return dx_sums(received[0]), merged
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=20000)
+    args = parser.parse_args()
+    writes, expected = make_writes(args.updates, random.Random(10))
+    print(f"{len(writes)} writes, {sum(1 for w in writes if len(w) != 4 + struct.unpack_from('>H', w, 2)[0])} of them batched")
+    ok = True
+    for label, run in (("OutboundQueue", run_threaded), ("StreamConnection", run_asyncio)):
+        sums, merged = run(writes)
+        match = sums == expected
+        ok &= match
+        print(f"{label:<18} merged {merged:>6} frames, dx sums per entity: {'OK' if match else 'MISMATCH'}")
+        if not match:
+            print(f"  expected {expected}\n  received {sums}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,40 @@
 import struct
 from typing import List
 
+import tracing
+
 class BitReader:
+    """
+    Reads the client's MSB-first bitstream straight from the payload (bytes,
+    bytearray or a FrameReader memoryview; nothing is copied). Every field is
+    pulled with one int.from_bytes() over the bytes it spans, and strings
+    that start on a byte boundary are sliced out whole.
+
+    With debug=True the reader logs exactly what the original reader logged,
+    which means taking the byte-by-byte paths again. It is only honoured
+    while tracing is on (see tracing.py), and the log holds (format, *values)
+    entries that get_debug_log() formats.
+    """
     def __init__(self, data: bytes, debug: bool = False):
-        self.data = bytearray(data)
+        self.data = data if isinstance(data, bytes) else memoryview(data)
+        self._bit_count = len(self.data) * 8
         self.bit_index = 0
-        self.debug = debug
-        self.debug_log: List[str] = [] if debug else []
+        # debug only takes effect while tracing is on for the current packet
+        self.debug = debug and tracing.active()
+        self.debug_log: list = []
+        if self.debug:
+            tracing.register(self)
 
     def align_to_byte(self):
         remainder = self.bit_index % 8
         if remainder:
             skip_bits = 8 - remainder
-            for _ in range(skip_bits):
-                self.read_bit()
             if self.debug:
-                self.debug_log.append(f"align_to_byte=skipped {skip_bits} bits")
+                for _ in range(skip_bits):
+                    self.read_bit()
+                self.debug_log.append(("align_to_byte=skipped {} bits", skip_bits))
+            else:
+                self.bit_index += skip_bits
 
     def remaining_bits(self) -> int:
         """
@@ -23,51 +42,105 @@ class BitReader:
         The Flash client does not expose an equivalent method; it always knows
         how many bits to read based on the packet type.
         """
-        total_bits = len(self.data) * 8
-        return max(0, total_bits - self.bit_index)
+        return max(0, self._bit_count - self.bit_index)
 
     def read_bit(self) -> int:
-        byte_index = self.bit_index // 8
-        bit_offset = self.bit_index & 7
-        if byte_index >= len(self.data):
+        byte_index = self.bit_index >> 3
+        if self.bit_index >= self._bit_count:
             raise ValueError("Not enough data to read bit")
-        bit = (self.data[byte_index] >> (7 - bit_offset)) & 1
+        bit = (self.data[byte_index] >> (7 - (self.bit_index & 7))) & 1
         self.bit_index += 1
         if self.debug:
-            self.debug_log.append(f"read_bit={bit} at bit_index={self.bit_index-1}")
+            self.debug_log.append(("read_bit={} at bit_index={}", bit, self.bit_index - 1))
         return bit
 
     def read_method_15(self) -> bool:
         """Read a single boolean (1 bit) from the bitstream, matching client method_15."""
         bit = self.read_bit()
         if self.debug:
-            self.debug_log.append(f"method_15={bool(bit)}")
+            self.debug_log.append(("method_15={}", bool(bit)))
         return bool(bit)
 
     def read_method_20(self, bit_count: int) -> int:
         """Read bit_count bits across byte boundaries, MSB-first."""
+        if bit_count <= 0:
+            return 0
+        start = self.bit_index
+        end = start + bit_count
+        if end > self._bit_count:
+            raise IndexError("bytearray index out of range")  # what indexing past the end raised
+        first = start >> 3
+        last = (end + 7) >> 3
+        word = int.from_bytes(self.data[first:last], "big")
+        val = (word >> ((last << 3) - end)) & ((1 << bit_count) - 1)
+        self.bit_index = end
+        if self.debug:
+            self._log_read_20(start, bit_count)
+        return val
+
+    def _log_read_20(self, pos, bit_count):
+        """The per-byte log lines the original read_method_20 wrote."""
         val = 0
         while bit_count > 0:
-            byte_index = self.bit_index // 8
-            bit_offset = self.bit_index & 7
+            byte_index = pos // 8
+            bit_offset = pos & 7
             bits_left_in_byte = 8 - bit_offset
             bits_to_read = min(bit_count, bits_left_in_byte)
-
-            mask = (1 << bits_to_read) - 1
-            shift = bits_left_in_byte - bits_to_read
-            current_byte = self.data[byte_index]
-            extracted = (current_byte >> shift) & mask
-
+            extracted = (self.data[byte_index] >> (bits_left_in_byte - bits_to_read)) & ((1 << bits_to_read) - 1)
             val = (val << bits_to_read) | extracted
-            self.bit_index += bits_to_read
+            pos += bits_to_read
             bit_count -= bits_to_read
+            self.debug_log.append(
+                ("read_method_20: byte_index={}, bit_offset={}, bits_to_read={}, extracted={}, val={}",
+                 byte_index, bit_offset, bits_to_read, extracted, val)
+            )
 
-            if self.debug:
-                self.debug_log.append(
-                    f"read_method_20: byte_index={byte_index}, bit_offset={bit_offset}, "
-                    f"bits_to_read={bits_to_read}, extracted={extracted}, val={val}"
-                )
-        return val
+    def _read_prefixed(self, signed: bool, field: str) -> int:
+        """
+        Non-debug fast path for the variable-length ints: optional sign bit,
+        4-bit prefix, (prefix + 1) * 2 value bits, all out of one 6-byte
+        window (at most 7 + 1 + 4 + 32 bits). Raises the same exceptions, with
+        the same messages, as the composed reads of the debug path.
+        """
+        pos = self.bit_index
+        head = 5 if signed else 4
+        if pos + head > self._bit_count:
+            if signed and pos + 1 > self._bit_count:
+                if field == "method_24":
+                    raise ValueError("Not enough data to read sign bit for method_24")
+                raise ValueError("Not enough data to read bit")
+            if field == "method_45":
+                raise ValueError("Not enough data to read method_4 prefix for method_45")
+            raise IndexError("bytearray index out of range")
+        first = pos >> 3
+        window = self.data[first:first + 6]
+        avail = len(window) * 8
+        shift = avail - (pos & 7) - head
+        word = int.from_bytes(window, "big")
+        prefix = (word >> shift) & 15
+        n_bits = (prefix + 1) * 2
+        if pos + head + n_bits > self._bit_count:
+            self.bit_index = pos + head
+            inner = {"method_24": "method_9", "method_45": "method_4"}.get(field, field)
+            raise ValueError(f"Not enough data to read {n_bits} bits for {inner}")
+        value = (word >> (shift - n_bits)) & ((1 << n_bits) - 1)
+        self.bit_index = pos + head + n_bits
+        if signed and (word >> (shift + 4)) & 1:
+            return -value
+        return value
+
+    def _read_bytes(self, length: int) -> bytes:
+        if self.debug:
+            return bytes(bytearray(self.read_method_20(8) for _ in range(length)))
+        if not length:
+            return b""
+        if self.bit_index & 7:
+            return self.read_method_20(length * 8).to_bytes(length, "big")
+        start = self.bit_index >> 3
+        if start + length > len(self.data):
+            raise IndexError("bytearray index out of range")
+        self.bit_index += length * 8
+        return bytes(self.data[start:start + length])
 
     def read_method_739(self) -> int:  # Add if needed
         sign = self.read_bit()
@@ -77,20 +150,22 @@ class BitReader:
         return -magnitude if sign else magnitude
 
     def read_method_4(self) -> int:
+        if not self.debug:
+            return self._read_prefixed(False, "method_4")
         prefix = self.read_method_20(4)
         bits_to_use = (prefix + 1) * 2
-        if self.bit_index + bits_to_use > len(self.data) * 8:
+        if self.bit_index + bits_to_use > self._bit_count:
             raise ValueError(f"Not enough data to read {bits_to_use} bits for method_4")
         value = self.read_method_20(bits_to_use)
         if self.debug:
-            self.debug_log.append(f"read_method_4={value}, prefix={prefix}, bits={bits_to_use}")
+            self.debug_log.append(("read_method_4={}, prefix={}, bits={}", value, prefix, bits_to_use))
         return value
 
     def read_method_26(self) -> str:
         # 1) read 16 bits for the length
         length = self.read_method_20(16)          # big-endian unsigned by design
         # 2) read `length` bytes
-        raw = bytearray(self.read_method_20(8) for _ in range(length))
+        raw = self._read_bytes(length)
         # 3) decode as UTF-8
         try:
             return raw.decode('utf-8')
@@ -114,69 +189,73 @@ class BitReader:
         return -value if is_negative else value
 
     def read_method_6(self, bit_count: int) -> int:
-        if self.bit_index + bit_count > len(self.data) * 8:
+        if self.bit_index + bit_count > self._bit_count:
             raise ValueError(f"Not enough data to read {bit_count} bits for method_6")
         value = self.read_method_20(bit_count)
         if self.debug:
-            self.debug_log.append(f"read_method_6={value}, bits={bit_count}")
+            self.debug_log.append(("read_method_6={}, bits={}", value, bit_count))
         return value
 
     def read_method_9(self) -> int:
+        if not self.debug:
+            return self._read_prefixed(False, "method_9")
         prefix = self.read_method_20(4)
         n_bits = (prefix + 1) * 2
-        if self.bit_index + n_bits > len(self.data) * 8:
+        if self.bit_index + n_bits > self._bit_count:
             raise ValueError(f"Not enough data to read {n_bits} bits for method_9")
         value = self.read_method_20(n_bits)
         if self.debug:
-            self.debug_log.append(f"read_method_9={value}, prefix={prefix}, bits={n_bits}")
+            self.debug_log.append(("read_method_9={}, prefix={}, bits={}", value, prefix, n_bits))
         return value
 
     def read_method_45(self) -> int:
+        if not self.debug:
+            return self._read_prefixed(True, "method_45")
         sign = self.read_bit()
-        if self.bit_index + 4 > len(self.data) * 8:  # Need at least 4 bits for prefix
+        if self.bit_index + 4 > self._bit_count:  # Need at least 4 bits for prefix
             raise ValueError("Not enough data to read method_4 prefix for method_45")
         magnitude = self.read_method_4()
         value = -magnitude if sign else magnitude
         if self.debug:
-            self.debug_log.append(f"read_method_45={value}, sign={sign}, magnitude={magnitude}")
+            self.debug_log.append(("read_method_45={}, sign={}, magnitude={}", value, sign, magnitude))
         return value
 
     def read_method_393(self) -> int:
         value = self.read_method_20(8)
         if self.debug:
-            self.debug_log.append(f"read_method_393={value}")
+            self.debug_log.append(("read_method_393={}", value))
         return value
 
     def read_method_560(self) -> float:
-        if self.bit_index + 32 > len(self.data) * 8:
+        if self.bit_index + 32 > self._bit_count:
             raise ValueError("Not enough data to read float")
         bits = self.read_method_20(32)
         bytes_val = struct.pack('>I', bits)
         float_val = struct.unpack('>f', bytes_val)[0]
         if self.debug:
-            self.debug_log.append(f"read_method_560={float_val}")
+            self.debug_log.append(("read_method_560={}", float_val))
         return float_val
 
     def read_method_13(self) -> str:
         length = self.read_method_20(16)
-        if self.bit_index + length * 8 > len(self.data) * 8:
+        if self.bit_index + length * 8 > self._bit_count:
             raise ValueError("Not enough data to read string")
-        result_bytes = bytearray()
-        for _ in range(length):
-            result_bytes.append(self.read_method_20(8))
+        result_bytes = self._read_bytes(length)
         try:
             return result_bytes.decode('utf-8')
         except UnicodeDecodeError:
             return result_bytes.decode('latin1')
 
     def read_method_24(self) -> int:
-        if self.bit_index + 1 > len(self.data) * 8:
+        if not self.debug:
+            return self._read_prefixed(True, "method_24")
+        if self.bit_index + 1 > self._bit_count:
             raise ValueError("Not enough data to read sign bit for method_24")
         sign = self.read_bit()
         magnitude = self.read_method_9()
         value = -magnitude if sign else magnitude
         if self.debug:
-            self.debug_log.append(f"read_method_24={value}, sign={sign}, magnitude={magnitude}")
+            self.debug_log.append(("read_method_24={}, sign={}, magnitude={}", value, sign, magnitude))
         return value
 
     def read_method_309(self) -> float:
@@ -189,4 +268,4 @@ class BitReader:
 
 
     def get_debug_log(self) -> List[str]:
-        return self.debug_log
\ No newline at end of file
+        return tracing.format_log(self.debug_log)
@@ -0,0 +1,95 @@
+"""
+Bulk bit-packing for long runs of fixed-width fields: the inventory gears
+and dye bits of Player_Data_Packet, the 0xF5 gear list.
+
+pack_columns(columns, rows) packs a table given column by column. Each
+column is (values, widths): one int per row, and a width that is either an
+int or one int per row (0 = the field is not sent for that row). Rows are
+written in order, each row's columns left to right, every field as the low
+`width` bits of its value, MSB-first, which is what write_method_11(value,
+width) per field writes. The result is a (value, bit_count) segment for
+BitBuffer.write_segment().
+
+NumPy is optional. With it, the table becomes one bit matrix (rows x the
+column widths), positions a row does not use are masked out, and
+np.packbits packs the rest in one pass. Without it, or for small tables
+where setting up the arrays costs more than it saves, the fields are
+shifted into an int accumulator. Both give the same bits.
+"""
+try:
+    import numpy as np
+except ImportError:  # optional, the scalar path writes the same bits
+    np = None
+
+BULK_NUMPY = np is not None
+NUMPY_MIN_ROWS = 64    # below this the scalar path is faster
+_FLUSH_BITS = 4096     # scalar path: move whole bytes out of the accumulator past this
+
+
+def configure(use_numpy):
+    """Use NumPy when it is installed (True) or always the scalar path (False)."""
+    global BULK_NUMPY
+    BULK_NUMPY = bool(use_numpy) and np is not None
+
+
+def pack_columns(columns, rows):
+    if BULK_NUMPY and rows >= NUMPY_MIN_ROWS:
+        try:
+            return _pack_numpy(columns, rows)
+        except OverflowError:  # a value that does not fit an int64, the scalar path masks it
+            pass
+    return _pack_scalar(columns, rows)
+
+
+def _pack_scalar(columns, rows):
+    out = bytearray()
+    acc = 0
+    n = 0
+    for i in range(rows):
+        for values, widths in columns:
+            width = widths if widths.__class__ is int else widths[i]
+            if width:
+                acc = (acc << width) | (values[i] & ((1 << width) - 1))
+                n += width
+        if n >= _FLUSH_BITS:
+            rem = n & 7
+            out += (acc >> rem).to_bytes(n >> 3, "big")
+            acc &= (1 << rem) - 1
+            n = rem
+    return (int.from_bytes(out, "big") << n) | acc, (len(out) << 3) + n
+
+
+def _pack_numpy(columns, rows):
+    bits, masks, masked = [], [], False
+    for values, widths in columns:
+        fixed = widths.__class__ is int
+        max_width = widths if fixed else (max(widths) if rows else 0)
+        if not max_width:
+            continue
+        shifts = np.arange(max_width - 1, -1, -1, dtype=np.int64)
+        column = np.asarray(values, dtype=np.int64)
+        bits.append(((column[:, None] >> shifts) & 1).astype(np.uint8))
+        if fixed:
+            masks.append(np.ones((rows, max_width), dtype=bool))
+        else:
+            masks.append(shifts[None, :] < np.asarray(widths, dtype=np.int64)[:, None])
+            masked = True
+    if not bits:
+        return 0, 0
+    table = np.concatenate(bits, axis=1)
+    flat = table[np.concatenate(masks, axis=1)] if masked else table.ravel()
+    bit_count = int(flat.size)
+    packed = np.packbits(flat).tobytes()
+    return int.from_bytes(packed, "big") >> (-bit_count & 7), bit_count
+
+
+def pack_flags(ids, count):
+    """
+    count presence bits, bit i-1 set when i is in ids (1-based), as the
+    dye list sends them: one int, no per-bit work.
+    """
+    value = 0
+    for i in ids:
+        if isinstance(i, int) and 1 <= i <= count:
+            value |= 1 << (count - i)
+    return value, count
@@ -0,0 +1,193 @@
+"""
+Write-behind cache of the account saves (storage.py: saves/<user_id>.json
+or the SQLite database).
+
+An account's save dict ({"email": ..., "characters": [...]}) is read from
+disk once and then kept: load_characters() and the 0x14 login hand out the
+cached objects themselves, so a handler that changes a character changes
+the cached copy. save_characters() / put_account() / mark_dirty() only
+flag the account; the flusher thread writes flagged accounts every
+FLUSH_INTERVAL seconds, so any number of saves in between cost one write.
+
+flush(user_id) writes an account right away: on logout (then the account
+is dropped from the cache) and before a zone handoff, so the worker the
+player moves to reads the current save. flush_all() runs on shutdown.
+A clean account whose save changed since we read or wrote it (another
+zone worker flushed it) is read again on the next access.
+"""
+import atexit
+import collections
+import threading
+import time
+
+import storage
+
+FLUSH_INTERVAL = 5.0   # seconds between flusher passes, 0 = write on every save
+RATE_WINDOW = 60.0     # seconds the write rate is averaged over
+
+_accounts = {}                  # user_id -> _Entry
+_lock = threading.RLock()       # guards _accounts and the entries' flags
+_flush_lock = threading.Lock()  # one writer at a time, so a flush that returned has hit the disk
+_flusher = None
+_recent_writes = collections.deque()  # monotonic time of each write in the last RATE_WINDOW
+_stats = {"saves": 0, "writes": 0, "write_errors": 0, "loads": 0, "reloads": 0, "evictions": 0}
+
+
+class _Entry:
+    __slots__ = ("data", "dirty", "version")
+
+    def __init__(self, data, version):
+        self.data = data
+        self.dirty = False
+        self.version = version  # storage version we read or wrote
+
+
+def configure(interval):
+    global FLUSH_INTERVAL
+    FLUSH_INTERVAL = max(0.0, float(interval))
+
+
+def _load(user_id):
+    backend = storage.get_backend()
+    version = backend.version(user_id)
+    data = backend.load(user_id) if version is not None else None
+    if data is None:
+        data = {"email": None, "characters": []}
+    data.setdefault("characters", [])
+    return _Entry(data, version)
+
+
+def _entry(user_id, check_disk=True):
+    """The cached entry, loaded (or re-read if it is clean and the save changed) as needed."""
+    entry = _accounts.get(user_id)
+    if entry is not None and (entry.dirty or not check_disk or entry.version == storage.get_backend().version(user_id)):
+        return entry
+    _stats["reloads" if entry is not None else "loads"] += 1
+    entry = _accounts[user_id] = _load(user_id)
+    return entry
+
+
+def get_account(user_id):
+    """The live save dict of an account ({"email": None, "characters": []} if it has no file yet)."""
+    with _lock:
+        return _entry(user_id).data
+
+
+def get_characters(user_id):
+    """The live character list of an account."""
+    return get_account(user_id)["characters"]
+
+
+def put_characters(user_id, char_list):
+    with _lock:
+        _entry(user_id, check_disk=False).data["characters"] = char_list
+    mark_dirty(user_id)
+
+
+def put_account(user_id, data):
+    """Replace a whole save dict (handlers that edit session.player_data)."""
+    with _lock:
+        _entry(user_id, check_disk=False).data = data
+    mark_dirty(user_id)
+
+
+def mark_dirty(user_id):
+    with _lock:
+        entry = _accounts.get(user_id)
+        if entry is None:
+            return
+        entry.dirty = True
+        _stats["saves"] += 1
+    if not FLUSH_INTERVAL:
+        flush(user_id)
+
+
+def is_cached(user_id):
+    with _lock:
+        return user_id in _accounts
+
+
+def cached_accounts():
+    """user_id -> save dict for every cached account (they may be newer than their files)."""
+    with _lock:
+        return {user_id: entry.data for user_id, entry in _accounts.items()}
+
+
+def flush(user_id):
+    """Write one account now if it has unsaved changes. True if it was written."""
+    with _flush_lock:
+        with _lock:
+            entry = _accounts.get(user_id)
+            if entry is None or not entry.dirty:
+                return False
+            entry.dirty = False  # changes made while we write flag it again
+            data = entry.data
+        backend = storage.get_backend()
+        try:
+            backend.save(user_id, data)
+        except Exception as e:
+            with _lock:
+                entry.dirty = True
+                _stats["write_errors"] += 1
+            print(f"[Store] Failed to write account {user_id}: {e}")
+            return False
+        now = time.monotonic()
+        with _lock:
+            entry.version = backend.version(user_id)
+            _stats["writes"] += 1
+            _recent_writes.append(now)
+        return True
+
+
+def flush_all():
+    with _lock:
+        dirty = [user_id for user_id, entry in _accounts.items() if entry.dirty]
+    return sum(1 for user_id in dirty if flush(user_id))
+
+
+def evict(user_id):
+    """Flush and forget an account (its player left this process)."""
+    flush(user_id)
+    with _lock:
+        entry = _accounts.get(user_id)
+        if entry is not None and not entry.dirty:
+            del _accounts[user_id]
+            storage.get_backend().forget(user_id)
+            _stats["evictions"] += 1
+
+
+def _run_flusher():
+    while True:
+        time.sleep(FLUSH_INTERVAL or 1.0)
+        try:
+            flush_all()
+        except Exception as e:
+            print(f"[Store] Flush failed: {e}")
+
+
+def start_flusher():
+    """Start the background flusher (once) and flush everything at exit."""
+    global _flusher
+    if _flusher is None:
+        _flusher = threading.Thread(target=_run_flusher, name="char-store", daemon=True)
+        _flusher.start()
+        atexit.register(flush_all)
+    return _flusher
+
+
+def get_store_stats():
+    now = time.monotonic()
+    with _lock:
+        while _recent_writes and now - _recent_writes[0] > RATE_WINDOW:
+            _recent_writes.popleft()
+        dirty = sum(1 for entry in _accounts.values() if entry.dirty)
+        return dict(_stats, backend=storage.get_backend().name, cached=len(_accounts), dirty=dirty, flush_interval=FLUSH_INTERVAL,
+                    coalesced=max(0, _stats["saves"] - _stats["writes"] - dirty),
+                    writes_per_sec=len(_recent_writes) / RATE_WINDOW)
+
+
+def reset_store_stats():
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0
+        _recent_writes.clear()
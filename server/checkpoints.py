@@ -0,0 +1,83 @@
+"""
+Position checkpoints for 0x07 movement.
+
+Every move updates the character's CurrentLevel x/y in memory (the
+character dict is the live one in char_store), but the account is only
+marked for saving once per CHECKPOINT_INTERVAL seconds per character, on
+level change or disconnect (flush) and on shutdown (flush_all). Without
+this every step a player took outside a dungeon was a save_characters()
+call.
+"""
+import threading
+import time
+
+from Character import save_characters, load_characters
+
+CHECKPOINT_INTERVAL = 30.0  # seconds between position saves while moving, 0 = every move
+
+_last_saved = {}   # (user_id, char name) -> monotonic time of the last position save
+_pending = set()   # (user_id, char name) moved since that save
+_lock = threading.Lock()
+_stats = {"moves": 0, "checkpoints": 0, "flushes": 0}
+
+
+def configure(interval):
+    global CHECKPOINT_INTERVAL
+    CHECKPOINT_INTERVAL = max(0.0, float(interval))
+
+
+def record_position(session, char, x, y):
+    """Store a move in the character dict; save it if the last checkpoint is old enough."""
+    char['CurrentLevel'] = {'name': session.current_level, 'x': x, 'y': y}
+    key = (session.user_id, char['name'])
+    now = time.monotonic()
+    with _lock:
+        _stats["moves"] += 1
+        due = now - _last_saved.get(key, float("-inf")) >= CHECKPOINT_INTERVAL
+        if due:
+            _last_saved[key] = now
+            _pending.discard(key)
+            _stats["checkpoints"] += 1
+        else:
+            _pending.add(key)
+    if due:
+        save_characters(session.user_id, session.char_list)
+
+
+def flush(session, forget=False):
+    """Save the session's unsaved position now (level change, disconnect)."""
+    key = (session.user_id, session.current_character)
+    with _lock:
+        pending = key in _pending
+        _pending.discard(key)
+        if pending:
+            _last_saved[key] = time.monotonic()
+            _stats["flushes"] += 1
+        if forget:
+            _last_saved.pop(key, None)
+    if pending and session.user_id:
+        save_characters(session.user_id, session.char_list)
+
+
+def flush_all():
+    """Save every unsaved position (shutdown), before char_store writes the dirty accounts."""
+    with _lock:
+        user_ids = {user_id for user_id, _ in _pending if user_id}
+        _stats["flushes"] += len(_pending)
+        _pending.clear()
+    for user_id in user_ids:
+        save_characters(user_id, load_characters(user_id))
+    return len(user_ids)
+
+
+def get_checkpoint_stats():
+    with _lock:
+        saves = _stats["checkpoints"] + _stats["flushes"]
+        return dict(_stats, pending=len(_pending), saves_avoided=max(0, _stats["moves"] - saves),
+                    interval=CHECKPOINT_INTERVAL)
+
+
+def reset_checkpoint_stats():
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0
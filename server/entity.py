@@ -1,13 +1,15 @@
 import json
 import os
+import struct
 
 from BitBuffer import BitBuffer
+import segments
 from constants import Entity, class_7, class_20, class_3, Game, class_118, \
     LinkUpdater, EntType, GearType, class_64, class_21, method_277, GAME_CONST_209, NUM_TALENT_SLOTS, \
     CLASS_118_CONST_127, SLOT_BIT_WIDTHS
 from typing import Dict, Any
 
-npc_cache = {}
+npc_cache = {}  # level name -> (path, mtime, npcs, framed 0x0F burst)
 
 """
 Hints NPCs data 
@@ -102,21 +104,79 @@ entState :
 
 """
 
+NPC_DIR = "NPC_Data"
+_npc_files = (None, {})  # (NPC_DIR mtime, {lowercase file name: file name})
+
+
+def _npc_file(level_name):
+    """
+    Path of NPC_Data/<level>.json, whatever the case of the extension
+    (the folder mixes .json and .Json). None if there is none.
+    """
+    global _npc_files
+    try:
+        dir_mtime = os.stat(NPC_DIR).st_mtime_ns
+    except OSError:
+        return None, None
+    if _npc_files[0] != dir_mtime:
+        _npc_files = (dir_mtime, {name.lower(): name for name in os.listdir(NPC_DIR)})
+    name = _npc_files[1].get(f"{level_name}.json".lower())
+    return (os.path.join(NPC_DIR, name) if name else None), dir_mtime
+
+
+def _load_npc_entry(level_name):
+    """
+    npc_cache entry for a level: (path, mtime, npcs, burst). A missing file is
+    cached too, keyed by the folder's mtime so that adding the file is seen.
+    """
+    path, dir_mtime = _npc_file(level_name)
+    mtime = dir_mtime
+    if path is not None:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            path = None
+    cached = npc_cache.get(level_name)
+    if cached is not None and cached[0] == path and cached[1] == mtime:
+        return cached
+
+    npcs = []
+    if path is None:
+        print(f"No NPC data for {level_name}")
+    else:
+        try:
+            with open(path, 'r') as file:
+                npcs = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error loading NPC data for {level_name}: {e}")
+    burst = bytearray()
+    for npc in npcs:
+        payload = Send_Entity_Data(npc)
+        burst += struct.pack(">HH", 0x0F, len(payload)) + payload
+    entry = npc_cache[level_name] = (path, mtime, npcs, bytes(burst))
+    return entry
+
+
 def load_npc_data_for_level(level_name: str) -> list:
     """
     Args:
         level_name (str): The level identifier (e.g., 'TutorialBoat').
 
     Returns:
-        list: List of dictionaries, each containing NPC data for the given level.
+        list: List of dictionaries, each containing NPC data for the given level
+        (copies, the caller may change them).
     """
-    json_path = os.path.join("NPC_Data", f"{level_name}.json")
-    try:
-        with open(json_path, 'r') as file:
-            return json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"Error loading NPC data for {level_name}: {e}")
-        return []
+    return [dict(npc) for npc in _load_npc_entry(level_name)[2]]
+
+
+def get_npc_spawn_burst(level_name: str):
+    """
+    (burst, npcs) for a level: every NPC's framed 0x0F packet in one buffer,
+    encoded once per version of the NPC file, and copies of the NPC dicts
+    for the session to track them.
+    """
+    _path, _mtime, npcs, burst = _load_npc_entry(level_name)
+    return burst, [dict(npc) for npc in npcs]
 
 def Send_Entity_Data(entity: Dict[str, Any]) -> bytes:
     bb = BitBuffer(debug=True)
@@ -124,22 +184,20 @@ def Send_Entity_Data(entity: Dict[str, Any]) -> bytes:
     # 1) Entity ID
     bb.write_method_4(entity['id'])
 
-    # 2) Name
-    bb.write_method_13(entity['name'])
-
-    # 3) Player Appearance block
+    # 2) Name + 3) Player Appearance block
     if entity.get("is_player", False):
-        bb.write_method_6(1, 1)  # send visuals block
-        bb.write_method_13(entity.get("class", ""))
-        bb.write_method_13(entity.get("gender", ""))
-        bb.write_method_13(entity.get("headSet", ""))
-        bb.write_method_13(entity.get("hairSet", ""))
-        bb.write_method_13(entity.get("mouthSet", ""))
-        bb.write_method_13(entity.get("faceSet", ""))
-        bb.write_method_6(entity.get("hairColor", 0), 24)
-        bb.write_method_6(entity.get("skinColor", 0), 24)
-        bb.write_method_6(entity.get("shirtColor", 0), 24)
-        bb.write_method_6(entity.get("pantColor", 0), 24)
+        # name, send visuals block, class/gender/head/hair/mouth/face, 4 colours (24 bits)
+        segments.write_appearance(bb, entity['name'],
+                                  entity.get("class", ""),
+                                  entity.get("gender", ""),
+                                  entity.get("headSet", ""),
+                                  entity.get("hairSet", ""),
+                                  entity.get("mouthSet", ""),
+                                  entity.get("faceSet", ""),
+                                  entity.get("hairColor", 0),
+                                  entity.get("skinColor", 0),
+                                  entity.get("shirtColor", 0),
+                                  entity.get("pantColor", 0))
         equipped = entity.get('equippedGears', [])
         for slot in range(1, EntType.MAX_SLOTS):
             idx = slot - 1
@@ -159,6 +217,7 @@ def Send_Entity_Data(entity: Dict[str, Any]) -> bytes:
                 bb.write_method_6(0, 1)
 
     else:
+        segments.write_method_13(bb, entity['name'])
         bb.write_method_6(0, 1)  # skip entire visuals section
 
     # 4) Position + Velocity
@@ -227,7 +286,7 @@ def Send_Entity_Data(entity: Dict[str, Any]) -> bytes:
         val = entity.get(key, "")
         bb.write_method_6(1 if val else 0, 1)
         if val:
-            bb.write_method_13(val)
+            segments.write_method_13(bb, val)
 
     # links this entity to the summoners ID
     summoner_id = entity.get("summonerId", 0)
@@ -331,3 +390,46 @@ def Send_Entity_Data(entity: Dict[str, Any]) -> bytes:
 
     return bb.to_bytes()
 
+
+
+def build_entity_full_update(entity_id: int, props: Dict[str, Any]) -> bytes:
+    """
+    Re-encode packet 0x08 (client entity full update) from the props dict
+    handle_entity_full_update keeps in session.entities, mirroring the
+    client's layout field for field. Used to resync an observer before it
+    gets 0x07 deltas for an entity it had out of view.
+    """
+    # method_9 / method_24 fields are written with write_method_4 /
+    # write_signed_method_45: same wire format, but they also encode 0
+    # (write_method_9(0) emits a bogus 4-bit prefix with no value bits)
+    bb = BitBuffer(debug=False)
+    bb.write_method_4(entity_id)
+    bb.write_signed_method_45(int(props.get('pos_x', 0)))
+    bb.write_signed_method_45(int(props.get('pos_y', 0)))
+    bb.write_signed_method_45(int(props.get('velocity_x', 0)))
+    bb.write_method_13(props.get('ent_name', ""))
+    bb.write_method_6(props.get('team', 0), Entity.TEAM_BITS)
+    bb.write_method_15(props.get('is_player', False))
+    bb.write_method_739(props.get('y_offset', 0))
+
+    cue_data = props.get('cue_data') or {}
+    bb.write_method_15(bool(cue_data))
+    if cue_data:
+        for key in ('character_name', 'DramaAnim', 'SleepAnim'):
+            val = cue_data.get(key)
+            bb.write_method_15(val is not None)
+            if val is not None:
+                bb.write_method_13(val)
+
+    for key in ('summoner_id', 'power_id'):
+        val = props.get(key)
+        bb.write_method_15(val is not None)
+        if val is not None:
+            bb.write_method_4(val)
+
+    bb.write_method_6(props.get('ent_state', 0), Entity.const_316)
+    for key in ('b_left', 'b_running', 'b_jumping', 'b_dropping', 'b_backpedal'):
+        bb.write_method_15(props.get(key, False))
+
+    payload = bb.to_bytes()
+    return struct.pack(">HH", 0x08, len(payload)) + payload
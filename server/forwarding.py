@@ -0,0 +1,56 @@
+"""
+Forward-only packets (power casts/hits, buffs, projectile explosions):
+the server relays the client's bytes unchanged, so by default the handlers
+only decode the leading fields they actually use (none for most of them)
+and forward right away.
+
+Full parsing, which drops a packet that does not parse instead of
+relaying it, can be switched back on per opcode (--validate-forwarded) or
+for a sample of 1 in N forwarded packets (--validate-sample).
+"""
+import threading
+
+FORWARD_VALIDATE = set()  # opcodes always fully parsed before forwarding
+FORWARD_SAMPLE = 0        # also fully parse 1 in N of the others (0 = never)
+
+_stats = {}               # opcode -> [forwarded, validated, invalid]
+_lock = threading.Lock()
+
+
+def configure(validate=None, sample=None):
+    global FORWARD_VALIDATE, FORWARD_SAMPLE
+    if validate is not None:
+        FORWARD_VALIDATE = set(validate)
+    if sample is not None:
+        FORWARD_SAMPLE = max(0, int(sample))
+
+
+def should_validate(opcode):
+    """Count a forwarded packet; True if this one should be fully parsed first."""
+    with _lock:
+        st = _stats.get(opcode)
+        if st is None:
+            st = _stats[opcode] = [0, 0, 0]
+        st[0] += 1
+        validate = opcode in FORWARD_VALIDATE or (FORWARD_SAMPLE and st[0] % FORWARD_SAMPLE == 0)
+        if validate:
+            st[1] += 1
+        return bool(validate)
+
+
+def record_invalid(opcode):
+    with _lock:
+        _stats.setdefault(opcode, [0, 0, 0])[2] += 1
+
+
+def get_forward_stats():
+    with _lock:
+        snapshot = {op: list(st) for op, st in _stats.items()}
+    return [{"opcode": f"0x{op:02X}", "forwarded": f, "validated": v, "invalid": i,
+             "always_validated": op in FORWARD_VALIDATE}
+            for op, (f, v, i) in sorted(snapshot.items())]
+
+
+def reset_forward_stats():
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,75 @@
+import struct
+
+HEADER = struct.Struct(">HH")  # packet type, payload length
+HEADER_SIZE = HEADER.size
+MAX_PAYLOAD = 0xFFFF  # the length field is 16 bits
+
+
+class PacketTooLarge(ValueError):
+    """A payload that does not fit the 16-bit length field."""
+    def __init__(self, pkt_type, size):
+        super().__init__(f"packet 0x{pkt_type:02X}: {size} byte payload, the limit is {MAX_PAYLOAD}")
+        self.pkt_type = pkt_type
+        self.size = size
+
+
+def frame(pkt_type, payload):
+    """
+    Header + payload. Checks the size first: struct would only fail on the
+    length with an unhelpful error, callers that can split the packet catch
+    PacketTooLarge and retry with less in it.
+    """
+    if len(payload) > MAX_PAYLOAD:
+        raise PacketTooLarge(pkt_type, len(payload))
+    return HEADER.pack(pkt_type, len(payload)) + payload
+
+
+class FrameReader:
+    """
+    Splits the client byte stream into packets.
+
+    feed() appends whatever recv() returned, frames() then yields
+    (pkt_type, frame) for every complete packet in the buffer, where frame is
+    a memoryview over the whole packet (header included). Nothing is copied
+    and consumed bytes are only dropped once per feed(), not once per frame.
+
+    A yielded view stays valid even if the caller keeps it around: while a
+    view is alive the buffer cannot be resized, so feed() moves the unread
+    tail into a fresh buffer instead.
+    """
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0  # read cursor, start of the first unconsumed frame
+
+    def feed(self, chunk):
+        try:
+            if self._pos:
+                del self._buf[:self._pos]
+                self._pos = 0
+            self._buf += chunk
+        except BufferError:
+            # someone still holds a frame view of the current buffer
+            self._buf = self._buf[self._pos:] + chunk
+            self._pos = 0
+
+    def frames(self):
+        buf = self._buf
+        end = len(buf)
+        pos = self._pos
+        view = memoryview(buf)
+        try:
+            while end - pos >= HEADER_SIZE:
+                pkt, length = HEADER.unpack_from(buf, pos)
+                total = HEADER_SIZE + length
+                if end - pos < total:
+                    break
+                # consume before handing out, a failing handler must not see it twice
+                self._pos = pos + total
+                yield pkt, view[pos:pos + total]
+                pos += total
+        finally:
+            view.release()
+
+    def pending(self):
+        """Number of buffered bytes that do not form a complete frame yet."""
+        return len(self._buf) - self._pos
@@ -0,0 +1,155 @@
+"""
+Area-of-interest filtering for entity updates.
+
+Every Level keeps an InterestGrid: a uniform grid holding the position of
+each player in the level, fed by the player's own 0x07/0x08 updates.
+Movement (0x07), full updates (0x08) and power packets (0x09/0x0A) are then
+only sent to players within INTEREST_RADIUS of the entity. Something that
+is already in view is only dropped once it is INTEREST_RADIUS +
+INTEREST_HYSTERESIS away, so players walking along the edge do not flicker.
+
+0x07 only carries deltas, so an observer that gets an entity back into view
+is first sent a 0x08 rebuilt from the last known state.
+
+Players whose position is not known yet get everything, as before.
+INTEREST_RADIUS = 0 turns the filtering off (the default).
+"""
+import threading
+
+INTEREST_RADIUS = 0        # world units, 0 = whole level
+INTEREST_HYSTERESIS = 300  # extra distance before something in view is dropped
+MIN_CELL_SIZE = 256
+
+
+def configure(radius, hysteresis=None):
+    global INTEREST_RADIUS, INTEREST_HYSTERESIS
+    INTEREST_RADIUS = max(0, int(radius))
+    if hysteresis is not None:
+        INTEREST_HYSTERESIS = max(0, int(hysteresis))
+
+
+def enabled():
+    return INTEREST_RADIUS > 0
+
+
+class InterestGrid:
+    """Uniform grid of player positions for one level, plus who sees which entity."""
+    def __init__(self, cell_size=None):
+        self.cell_size = cell_size or max(MIN_CELL_SIZE, INTEREST_RADIUS + INTEREST_HYSTERESIS)
+        self._lock = threading.Lock()
+        self._cells = {}        # (cx, cy) -> set of sessions
+        self._where = {}        # session -> (x, y, cell)
+        self._unplaced = set()  # sessions in the level with no known position
+        self._watchers = {}     # entity id -> set of sessions it is currently sent to
+
+    def _cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def add(self, session):
+        with self._lock:
+            if session not in self._where:
+                self._unplaced.add(session)
+
+    def move(self, session, x, y):
+        cell = self._cell(x, y)
+        with self._lock:
+            old = self._where.get(session)
+            if old is None:
+                self._unplaced.discard(session)
+            elif old[2] != cell:
+                self._discard_from_cell(session, old[2])
+            if old is None or old[2] != cell:
+                self._cells.setdefault(cell, set()).add(session)
+            self._where[session] = (x, y, cell)
+
+    def remove(self, session, entity_ids=()):
+        with self._lock:
+            old = self._where.pop(session, None)
+            if old is not None:
+                self._discard_from_cell(session, old[2])
+            self._unplaced.discard(session)
+            for entity_id in entity_ids:
+                self._watchers.pop(entity_id, None)
+            for seen_by in self._watchers.values():
+                seen_by.discard(session)
+
+    def _discard_from_cell(self, session, cell):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.discard(session)
+            if not bucket:
+                del self._cells[cell]
+
+    def position(self, session):
+        where = self._where.get(session)
+        return (where[0], where[1]) if where else None
+
+    def _candidates(self, x, y, radius):
+        """Sessions that may be within radius of (x, y), plus the unplaced ones. Lock held."""
+        cx0, cy0 = self._cell(x - radius, y - radius)
+        cx1, cy1 = self._cell(x + radius, y + radius)
+        found = list(self._unplaced)
+        cells = self._cells
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(cells):
+            for (cx, cy), bucket in cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    found.extend(bucket)
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    bucket = cells.get((cx, cy))
+                    if bucket:
+                        found.extend(bucket)
+        return found
+
+    def near(self, x, y, exclude=None):
+        """Loaded sessions within the outer (radius + hysteresis) range of (x, y)."""
+        outer = INTEREST_RADIUS + INTEREST_HYSTERESIS
+        outer2 = outer * outer
+        result = []
+        with self._lock:
+            for s in self._candidates(x, y, outer):
+                if s is exclude or not s.world_loaded:
+                    continue
+                where = self._where.get(s)
+                if where is not None and (where[0] - x) ** 2 + (where[1] - y) ** 2 > outer2:
+                    continue
+                result.append(s)
+        return result
+
+    def watchers(self, entity_id, x, y, exclude=None):
+        """
+        Work out who gets an update of entity_id at (x, y). Returns
+        (recipients, entering) where entering are the recipients that did
+        not have the entity in view before this update.
+        """
+        inner2 = INTEREST_RADIUS * INTEREST_RADIUS
+        outer = INTEREST_RADIUS + INTEREST_HYSTERESIS
+        outer2 = outer * outer
+        recipients = []
+        entering = []
+        with self._lock:
+            before = self._watchers.get(entity_id, ())
+            for s in self._candidates(x, y, outer):
+                if s is exclude or not s.world_loaded:
+                    continue
+                where = self._where.get(s)
+                if where is not None:
+                    d2 = (where[0] - x) ** 2 + (where[1] - y) ** 2
+                    if d2 > (outer2 if s in before else inner2):
+                        continue
+                recipients.append(s)
+                if s not in before:
+                    entering.append(s)
+            self._watchers[entity_id] = set(recipients)
+        return recipients, entering
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cell_size": self.cell_size,
+                "cells": len(self._cells),
+                "placed": len(self._where),
+                "unplaced": len(self._unplaced),
+                "tracked_entities": len(self._watchers),
+            }
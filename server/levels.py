@@ -0,0 +1,172 @@
+import threading
+
+import batching
+import interest
+
+level_registry = {}  # level name -> Level
+_registry_lock = threading.Lock()
+
+
+class Level:
+    """
+    One running level and the sessions currently in it.
+
+    Membership changes take a lock and publish a new tuple of members, so
+    broadcast() iterates a snapshot without locking and only ever touches
+    the players of this level.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._members = set()
+        self._snapshot = ()
+        self._lock = threading.Lock()
+        self.interest = interest.InterestGrid()
+        self.updates = batching.UpdateBatch()
+
+    def add(self, session):
+        with self._lock:
+            self._members.add(session)
+            self._snapshot = tuple(self._members)
+        self.interest.add(session)
+
+    def remove(self, session):
+        # only the leaving player's own entity; the level's NPC ids are shared
+        own = getattr(session, "clientEntID", None)
+        self.interest.remove(session, () if own is None else (own,))
+        with self._lock:
+            self._members.discard(session)
+            self._snapshot = tuple(self._members)
+            return not self._members
+
+    @property
+    def members(self):
+        return self._snapshot
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def observers(self, exclude=None):
+        """Members that have finished loading the level, minus exclude."""
+        return [s for s in self._snapshot if s is not exclude and s.world_loaded]
+
+    def broadcast(self, frame, exclude=None):
+        """
+        Send an already framed packet to every member that has the world
+        loaded, except exclude. Returns the number of recipients.
+        """
+        return self._send_to(self.observers(exclude), frame)
+
+    def broadcast_near(self, frame, x, y, exclude=None):
+        """Like broadcast(), limited to members within interest range of (x, y)."""
+        if not interest.enabled() or x is None or y is None:
+            return self.broadcast(frame, exclude)
+        return self._send_to(self.interest.near(x, y, exclude), frame)
+
+    def broadcast_entity(self, frame, entity_id, x, y, exclude=None, snapshot=None):
+        """
+        Send an update of entity_id (now at x, y) to the members that have it
+        in view. Members it just came into view for get snapshot() (a full
+        0x08 of the entity) instead, when given. Goes through the per-tick
+        batch when batching is on.
+        """
+        if not interest.enabled() or x is None or y is None:
+            return self._send_update(self.observers(exclude), frame)
+        recipients, entering = self.interest.watchers(entity_id, x, y, exclude)
+        if not entering or snapshot is None:
+            return self._send_update(recipients, frame)
+        full = snapshot()
+        entering = set(entering)
+        self._send_update([s for s in recipients if s in entering], full)
+        self._send_update([s for s in recipients if s not in entering], frame)
+        return len(recipients)
+
+    def broadcast_update(self, frame, exclude=None):
+        """broadcast() for entity updates the server generates itself (NPC moves)."""
+        return self._send_update(self.observers(exclude), frame)
+
+    def _send_update(self, recipients, frame):
+        if batching.enabled():
+            self.updates.add(recipients, frame)
+            return len(recipients)
+        return self._send_to(recipients, frame)
+
+    def flush_updates(self):
+        """Hand each observer the updates batched since the last tick, in one write."""
+        return self.updates.flush(self.name)
+
+    def _send_to(self, recipients, frame):
+        sent = 0
+        for other in recipients:
+            try:
+                other.conn.sendall(frame)
+                sent += 1
+            except Exception as e:
+                print(f"[{other.addr}] [Level {self.name}] Broadcast error: {e}")
+        return sent
+
+
+def get_level(name):
+    return level_registry.get(name)
+
+
+def join_level(session, name):
+    """Move session into level `name` (None just leaves its current level)."""
+    old = getattr(session, "level", None)
+    if old is not None and old.name == name:
+        return old
+    if old is not None:
+        leave_level(session)
+    if name is None:
+        return None
+    with _registry_lock:
+        level = level_registry.get(name)
+        if level is None:
+            level = level_registry[name] = Level(name)
+        level.add(session)
+    session.level = level
+    return level
+
+
+def leave_level(session):
+    level = getattr(session, "level", None)
+    if level is None:
+        return
+    session.level = None
+    with _registry_lock:
+        if level.remove(session) and level_registry.get(level.name) is level:
+            level_registry.pop(level.name, None)
+
+
+def broadcast_to_level(session, frame, include_self=False):
+    """Send frame to everyone in session's level (optionally including session)."""
+    level = getattr(session, "level", None)
+    if level is None:
+        return 0
+    return level.broadcast(frame, exclude=None if include_self else session)
+
+
+def broadcast_entity_update(session, frame, entity_id, props, snapshot=None):
+    """
+    Fan an 0x07/0x08 of entity_id out to the players of session's level that
+    have it in view. props is the server-side entity dict (pos_x/pos_y);
+    updates of the session's own player also move it in the interest grid.
+    """
+    level = getattr(session, "level", None)
+    if level is None:
+        return 0
+    x = props.get("pos_x")
+    y = props.get("pos_y")
+    if interest.enabled() and entity_id == session.clientEntID and x is not None and y is not None:
+        level.interest.move(session, x, y)
+    return level.broadcast_entity(frame, entity_id, x, y, exclude=session, snapshot=snapshot)
+
+
+def broadcast_near_player(session, frame):
+    """Send frame to the players near session's own player (power casts, hits)."""
+    level = getattr(session, "level", None)
+    if level is None:
+        return 0
+    pos = level.interest.position(session) if interest.enabled() else None
+    if pos is None:
+        return level.broadcast(frame, exclude=session)
+    return level.broadcast_near(frame, pos[0], pos[1], exclude=session)
@@ -0,0 +1,101 @@
+"""
+Packet 0x07 (entity incremental update), as the client writes it:
+
+    method_4   entity id
+    method_45  dx, dy, dvx         (relative to the previous update)
+    method_6   ent_state           (Entity.const_316 bits)
+    5 bits     b_left, b_running, b_jumping, b_dropping, b_backpedal
+    1 bit      airborne, followed by method_24 velocity_y when set
+
+A decoded update is a tuple (entity_id, dx, dy, dvx, ent_state, flags, vy)
+with the five flags packed MSB-first into one int and vy None when the
+entity is not airborne.
+"""
+import struct
+
+from BitBuffer import BitBuffer
+from bitreader import BitReader
+from constants import Entity
+
+PKT_MOVEMENT = 0x07
+FLAG_NAMES = ('b_left', 'b_running', 'b_jumping', 'b_dropping', 'b_backpedal')
+
+
+def decode_movement(payload):
+    """Decode a 0x07 payload (header stripped). Raises ValueError on short data."""
+    br = BitReader(payload)
+    try:
+        entity_id = br.read_method_4()
+        dx = br.read_method_45()
+        dy = br.read_method_45()
+        dvx = br.read_method_45()
+        ent_state = br.read_method_6(Entity.const_316)
+        flags = br.read_method_6(len(FLAG_NAMES))
+        vy = br.read_method_24() if br.read_method_15() else None
+    except IndexError:
+        raise ValueError("Not enough data for 0x07")
+    return entity_id, dx, dy, dvx, ent_state, flags, vy
+
+
+def encode_movement(entity_id, dx, dy, dvx, ent_state, flags, vy=None):
+    """Framed 0x07. method_24 is written as sign + method_4, the same bits, but 0-safe."""
+    bb = BitBuffer(debug=False)
+    bb.write_method_4(entity_id)
+    bb.write_signed_method_45(dx)
+    bb.write_signed_method_45(dy)
+    bb.write_signed_method_45(dvx)
+    bb.write_method_6(ent_state, Entity.const_316)
+    bb.write_method_6(flags, len(FLAG_NAMES))
+    bb.write_method_15(vy is not None)
+    if vy is not None:
+        bb.write_signed_method_45(vy)
+    payload = bb.to_bytes()
+    return struct.pack(">HH", PKT_MOVEMENT, len(payload)) + payload
+
+
+def pack_flags(props):
+    """The five movement flags of an entity dict as the int decode_movement returns."""
+    flags = 0
+    for name in FLAG_NAMES:
+        flags = (flags << 1) | (1 if props.get(name) else 0)
+    return flags
+
+
+def unpack_flags(flags):
+    count = len(FLAG_NAMES)
+    return {name: bool((flags >> (count - 1 - i)) & 1) for i, name in enumerate(FLAG_NAMES)}
+
+
+def movement_entity(frame):
+    """
+    Entity id of a framed 0x07, None for any other packet, a malformed one,
+    or a buffer holding more than one frame (a batched flush).
+    """
+    if len(frame) < 5 or frame[0] != 0 or frame[1] != PKT_MOVEMENT:
+        return None
+    if len(frame) != 4 + ((frame[2] << 8) | frame[3]):
+        return None
+    # method_4: 4-bit prefix, then (prefix + 1) * 2 value bits, MSB-first
+    head = int.from_bytes(frame[4:9], "big")
+    avail = (min(len(frame), 9) - 4) * 8
+    prefix = head >> (avail - 4)
+    bits = (prefix + 1) * 2
+    if 4 + bits > avail:
+        return None
+    return (head >> (avail - 4 - bits)) & ((1 << bits) - 1)
+
+
+def merge_movements(older, newer):
+    """
+    One framed 0x07 equivalent to sending older then newer (same entity):
+    deltas summed, state, flags and airborne velocity from newer. None if
+    either frame does not decode.
+    """
+    try:
+        a = decode_movement(older[4:])
+        b = decode_movement(newer[4:])
+    except ValueError:
+        return None
+    if a[0] != b[0]:
+        return None
+    return encode_movement(b[0], a[1] + b[1], a[2] + b[2], a[3] + b[3], b[4], b[5], b[6])
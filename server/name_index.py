@@ -0,0 +1,184 @@
+"""
+Character names: who owns which name, and who is online under it.
+
+The name index (CharacterNames.json, lower-cased name -> user_id) is built
+once by scanning every save (storage.py) and then kept in memory and on disk: character
+creation claims a name through claim(), and save_characters() passes every
+saved list through sync_account(), which picks up renamed and deleted
+characters. A name check is then one dict lookup instead of parsing every
+save file.
+
+Creations run on the login process only (worker 0 in zone mode); other
+processes re-read the index when it changed on disk and a name misses.
+
+The online registry maps the name of each selected character to its
+session in this process, for /tell, /invite and the like.
+"""
+import json
+import os
+import tempfile
+import threading
+
+import storage
+
+_INDEX_PATH = "CharacterNames.json"
+
+_names = None     # lower-cased name -> user_id
+_by_user = {}     # user_id -> set of lower-cased names
+_source = None    # (mtime, size) of the index file we loaded or wrote
+_lock = threading.RLock()
+_online = {}      # lower-cased name -> session
+_stats = {"checks": 0, "claims": 0, "refused": 0, "updates": 0, "writes": 0, "rebuilds": 0}
+
+
+def _key(name):
+    return (name or "").strip().lower()
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except FileNotFoundError:
+        return None
+
+
+def _set(names):
+    global _names, _by_user
+    by_user = {}
+    for name, user_id in names.items():
+        by_user.setdefault(user_id, set()).add(name)
+    _names, _by_user = names, by_user
+
+
+def _write():
+    global _source
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(_INDEX_PATH) or ".", delete=False, encoding="utf-8") as tf:
+        json.dump(_names, tf, ensure_ascii=False)
+    os.replace(tf.name, _INDEX_PATH)
+    _source = _stat_key(_INDEX_PATH)
+    _stats["writes"] += 1
+
+
+def rebuild():
+    """Build the index from every save file (first start, or after editing saves by hand)."""
+    names = {}
+    backend = storage.get_backend()
+    for user_id, name in backend.iter_character_names():
+        name = _key(name)
+        if name:
+            names.setdefault(name, user_id)
+    with _lock:
+        _set(names)
+        _write()
+        _stats["rebuilds"] += 1
+    print(f"[Names] Indexed {len(names)} character names from the {backend.name} saves")
+    return len(names)
+
+
+def _load():
+    global _source
+    try:
+        with open(_INDEX_PATH, "r", encoding="utf-8") as f:
+            names = json.load(f)
+    except FileNotFoundError:
+        rebuild()
+        return
+    except json.JSONDecodeError:
+        print(f"[Names] {_INDEX_PATH} is corrupt, rebuilding it")
+        rebuild()
+        return
+    _set(names)
+    _source = _stat_key(_INDEX_PATH)
+
+
+def _ensure_loaded(refresh=False):
+    """Load on first use; with refresh, re-read the file if another process wrote it."""
+    if _names is None or (refresh and _stat_key(_INDEX_PATH) != _source):
+        _load()
+
+
+def owner(name):
+    """user_id that owns a character name (any case), or None."""
+    name = _key(name)
+    with _lock:
+        _stats["checks"] += 1
+        _ensure_loaded()
+        user_id = _names.get(name)
+        if user_id is None:
+            _ensure_loaded(refresh=True)
+            user_id = _names.get(name)
+        return user_id
+
+
+def is_taken(name):
+    return owner(name) is not None
+
+
+def claim(name, user_id):
+    """Reserve a name for a new character. False if someone already has it."""
+    name = _key(name)
+    with _lock:
+        _ensure_loaded(refresh=True)
+        if not name or name in _names:
+            _stats["refused"] += 1
+            return False
+        _names[name] = user_id
+        _by_user.setdefault(user_id, set()).add(name)
+        _write()
+        _stats["claims"] += 1
+        return True
+
+
+def sync_account(user_id, char_list):
+    """Make the index match an account's saved characters (renames and deletions)."""
+    current = {_key(c.get("name")) for c in char_list} - {""}
+    with _lock:
+        _ensure_loaded()
+        if current == _by_user.get(user_id, set()):
+            return
+        _ensure_loaded(refresh=True)
+        owned = _by_user.setdefault(user_id, set())
+        added, removed = current - owned, owned - current
+        for name in added:
+            other = _names.get(name)
+            if other is not None and other != user_id:
+                print(f"[Names] {name!r} of {user_id} is already owned by {other}, not indexed")
+                continue
+            _names[name] = user_id
+            owned.add(name)
+        for name in removed:
+            _names.pop(name, None)
+            owned.discard(name)
+        if added or removed:
+            _stats["updates"] += 1
+            _write()
+
+
+###################################
+# online players
+###################################
+def set_online(session, name):
+    """Register the character a session now plays (None when it leaves)."""
+    with _lock:
+        old = _key(getattr(session, "current_character", None))
+        if old and _online.get(old) is session:
+            del _online[old]
+        if name:
+            _online[_key(name)] = session
+
+
+def find_online(name):
+    """Session playing the named character in this process, or None."""
+    return _online.get(_key(name))
+
+
+def get_name_stats():
+    with _lock:
+        return dict(_stats, names=len(_names or ()), accounts=len(_by_user), online=len(_online))
+
+
+def reset_name_stats():
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0
@@ -0,0 +1,348 @@
+import socket
+import threading
+from collections import deque
+
+from movement import movement_entity, merge_movements
+
+MAX_QUEUED_BYTES = 1 << 20   # a peer this far behind is dropped instead of buffered forever
+MAX_FLUSH_FRAMES = 512       # frames handed to one sendmsg() call (stays below IOV_MAX)
+HOLD_BYTES = 64 * 1024       # asyncio: keep frames queued (and mergeable) while the transport has this much
+
+
+class OutboundQueue:
+    """
+    Socket wrapper owned by a ClientSession (threaded mode).
+
+    sendall() only queues the frame and returns, so a handler fanning out to
+    a level never blocks on a slow peer. A writer thread per connection
+    drains the queue and hands everything pending to the kernel with one
+    sendmsg() (writev) per flush. A peer that lets more than max_bytes pile
+    up is disconnected.
+
+    While frames are waiting, a 0x07 for an entity that already has a 0x07
+    queued since the last non-0x07 frame is merged into it (deltas summed,
+    see movement.merge_movements), so a lagging client catches up with one
+    update per entity instead of the whole backlog. A write holding several
+    frames (a batched flush, see batching.py) counts as a non-0x07 frame.
+    """
+    def __init__(self, sock, addr=None, max_bytes=MAX_QUEUED_BYTES):
+        self.sock = sock
+        self.addr = addr
+        self.max_bytes = max_bytes
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
+
+        self._frames = deque()
+        self._pending_bytes = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._appended = 0   # frames ever appended, numbers the deque entries
+        self._popped = 0     # frames ever taken by the writer
+        self._movement_run = {}  # entity id -> number of its queued 0x07 in the current run
+
+        # metrics
+        self.frames_queued = 0
+        self.bytes_queued = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.flushes = 0
+        self.max_depth = 0
+        self.max_pending_bytes = 0
+        self.frames_merged = 0
+        self.overflowed = False
+
+        self._writer = threading.Thread(target=self._drain, daemon=True)
+        self._writer.start()
+
+    # socket-like API used by handlers and handle_client
+    def sendall(self, data):
+        size = len(data)
+        with self._cond:
+            if self._closed:
+                raise ConnectionResetError("connection is closed")
+            if self._frames and self._merge_movement(data):
+                return
+            if self._pending_bytes + size > self.max_bytes:
+                overflow = True
+            else:
+                overflow = False
+                self._frames.append(data)
+                self._appended += 1
+                self._pending_bytes += size
+                self.frames_queued += 1
+                self.bytes_queued += size
+                depth = len(self._frames)
+                if depth > self.max_depth:
+                    self.max_depth = depth
+                if self._pending_bytes > self.max_pending_bytes:
+                    self.max_pending_bytes = self._pending_bytes
+                self._cond.notify()
+        if overflow:
+            print(f"[{self.addr}] Outbound queue over {self.max_bytes} bytes, dropping slow client")
+            self.overflowed = True
+            self.abort()
+
+    def _merge_movement(self, data):
+        """
+        Fold a 0x07 into the queued 0x07 of the same entity, if there is one
+        in the current run. Returns True when data was merged. Lock held.
+        """
+        entity_id = movement_entity(data)
+        if entity_id is None:
+            self._movement_run.clear()
+            return False
+        seq = self._movement_run.get(entity_id)
+        if seq is not None and seq >= self._popped:
+            index = seq - self._popped
+            older = self._frames[index]
+            merged = merge_movements(older, data)
+            if merged is not None:
+                self._frames[index] = merged
+                self._pending_bytes += len(merged) - len(older)
+                self.frames_queued += 1
+                self.bytes_queued += len(data)
+                self.frames_merged += 1
+                return True
+        self._movement_run[entity_id] = self._appended
+        return False
+
+    def recv(self, bufsize):
+        return self.sock.recv(bufsize)
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def getpeername(self):
+        return self.sock.getpeername()
+
+    def close(self):
+        """Stop accepting frames; the writer flushes what is queued, then closes the socket."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if threading.current_thread() is not self._writer:
+            self._writer.join(timeout=1.0)
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def abort(self):
+        """Drop everything queued and shut the socket down so the reader thread exits."""
+        with self._cond:
+            self._closed = True
+            self._frames.clear()
+            self._popped = self._appended
+            self._movement_run.clear()
+            self._pending_bytes = 0
+            self._cond.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    # writer thread
+    def _drain(self):
+        while True:
+            with self._cond:
+                while not self._frames and not self._closed:
+                    self._cond.wait()
+                if not self._frames:
+                    return
+                n = min(len(self._frames), MAX_FLUSH_FRAMES)
+                batch = [self._frames.popleft() for _ in range(n)]
+                self._popped += n
+            try:
+                sent = self._write_batch(batch)
+            except OSError:
+                self.abort()
+                return
+            with self._cond:
+                self._pending_bytes = max(0, self._pending_bytes - sent)
+                self.frames_sent += n
+                self.bytes_sent += sent
+                self.flushes += 1
+
+    def _write_batch(self, batch):
+        total = sum(len(b) for b in batch)
+        if len(batch) == 1 or not hasattr(self.sock, "sendmsg"):
+            self.sock.sendall(b"".join(batch) if len(batch) > 1 else batch[0])
+            return total
+        remaining = total
+        bufs = batch
+        while True:
+            sent = self.sock.sendmsg(bufs)
+            remaining -= sent
+            if not remaining:
+                return total
+            # partial write: skip the buffers that went out completely
+            while sent >= len(bufs[0]):
+                sent -= len(bufs[0])
+                bufs = bufs[1:]
+            if sent:
+                bufs = [memoryview(bufs[0])[sent:]] + bufs[1:]
+
+    def queue_stats(self):
+        with self._cond:
+            return {
+                "depth": len(self._frames),
+                "pending_bytes": self._pending_bytes,
+                "max_depth": self.max_depth,
+                "max_pending_bytes": self.max_pending_bytes,
+                "frames_queued": self.frames_queued,
+                "bytes_queued": self.bytes_queued,
+                "frames_sent": self.frames_sent,
+                "bytes_sent": self.bytes_sent,
+                "flushes": self.flushes,
+                "frames_merged": self.frames_merged,
+                "overflowed": self.overflowed,
+            }
+
+
+class StreamConnection:
+    """
+    Socket-like wrapper around an asyncio StreamWriter (asyncio mode), so the
+    handlers can keep calling conn.sendall()/conn.close().
+
+    Frames queued during one event-loop iteration are flushed together with
+    writelines(), so the transport sees one write per loop iteration. Calls
+    made from other threads (scheduler callbacks, simulation ticks) are
+    handed over to the event loop.
+
+    While the transport already buffers HOLD_BYTES or more, frames stay in
+    our queue, where 0x07s of the same entity are merged like in
+    OutboundQueue.
+    """
+    def __init__(self, writer, loop, addr=None, max_bytes=MAX_QUEUED_BYTES):
+        self.writer = writer
+        self.loop = loop
+        self.addr = addr
+        self.max_bytes = max_bytes
+        self._loop_thread = threading.get_ident()
+        self._frames = []
+        self._pending_bytes = 0
+        self._flush_scheduled = False
+        self._movement_run = {}  # entity id -> index of its 0x07 in _frames (current run)
+
+        # metrics
+        self.frames_queued = 0
+        self.bytes_queued = 0
+        self.flushes = 0
+        self.max_depth = 0
+        self.max_pending_bytes = 0
+        self.frames_merged = 0
+        self.overflowed = False
+
+    def _on_loop(self):
+        return threading.get_ident() == self._loop_thread
+
+    def sendall(self, data):
+        if self.writer.is_closing():
+            raise ConnectionResetError("stream is closed")
+        if self._on_loop():
+            self._enqueue(data)
+        else:
+            self.loop.call_soon_threadsafe(self._enqueue, bytes(data))
+
+    def _enqueue(self, data):
+        if self.writer.is_closing():
+            return
+        if self._frames and self._merge_movement(data):
+            return
+        size = len(data)
+        if self._pending_bytes + self.writer.transport.get_write_buffer_size() + size > self.max_bytes:
+            print(f"[{self.addr}] Outbound queue over {self.max_bytes} bytes, dropping slow client")
+            self.overflowed = True
+            self.abort()
+            return
+        self._frames.append(data)
+        self._pending_bytes += size
+        self.frames_queued += 1
+        self.bytes_queued += size
+        if len(self._frames) > self.max_depth:
+            self.max_depth = len(self._frames)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.loop.call_soon(self._flush)
+
+    def _merge_movement(self, data):
+        entity_id = movement_entity(data)
+        if entity_id is None:
+            self._movement_run.clear()
+            return False
+        index = self._movement_run.get(entity_id)
+        if index is not None:
+            older = self._frames[index]
+            merged = merge_movements(older, data)
+            if merged is not None:
+                self._frames[index] = merged
+                self._pending_bytes += len(merged) - len(older)
+                self.frames_queued += 1
+                self.bytes_queued += len(data)
+                self.frames_merged += 1
+                return True
+        self._movement_run[entity_id] = len(self._frames)
+        return False
+
+    def _flush(self):
+        self._flush_scheduled = False
+        if not self._frames or self.writer.is_closing():
+            self._frames.clear()
+            self._movement_run.clear()
+            self._pending_bytes = 0
+            return
+        if self.writer.transport.get_write_buffer_size() >= HOLD_BYTES:
+            # the peer is behind; keep the frames here, where they can still merge
+            self._flush_scheduled = True
+            self.loop.call_later(0.02, self._flush)
+            return
+        frames, self._frames = self._frames, []
+        self._movement_run.clear()
+        self._pending_bytes = 0
+        self.writer.writelines(frames)
+        self.flushes += 1
+        buffered = self.writer.transport.get_write_buffer_size()
+        if buffered > self.max_pending_bytes:
+            self.max_pending_bytes = buffered
+
+    def _close(self):
+        if self._frames and not self.writer.is_closing():
+            self.writer.writelines(self._frames)
+        self._frames.clear()
+        self._movement_run.clear()
+        self.writer.close()
+
+    def close(self):
+        if self._on_loop():
+            self._close()
+        else:
+            self.loop.call_soon_threadsafe(self._close)
+
+    def abort(self):
+        self._frames.clear()
+        self._movement_run.clear()
+        self._pending_bytes = 0
+        self.writer.transport.abort()
+
+    def settimeout(self, timeout):
+        pass
+
+    def getpeername(self):
+        return self.writer.get_extra_info("peername")
+
+    def queue_stats(self):
+        return {
+            "depth": len(self._frames),
+            "pending_bytes": self._pending_bytes + self.writer.transport.get_write_buffer_size(),
+            "max_depth": self.max_depth,
+            "max_pending_bytes": self.max_pending_bytes,
+            "frames_queued": self.frames_queued,
+            "bytes_queued": self.bytes_queued,
+            "frames_sent": self.frames_queued - len(self._frames),
+            "bytes_sent": self.bytes_queued - self._pending_bytes - self.writer.transport.get_write_buffer_size(),
+            "flushes": self.flushes,
+            "frames_merged": self.frames_merged,
+            "overflowed": self.overflowed,
+        }
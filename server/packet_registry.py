@@ -0,0 +1,131 @@
+import threading
+import time
+
+import tracing
+
+# What a handler needs besides the session, picks its call signature:
+SESSION      = "session"       # handler(session)
+DATA         = "data"          # handler(session, data)
+CONN         = "conn"          # handler(session, data, conn)
+ALL_SESSIONS = "all_sessions"  # handler(session, data, all_sessions)
+
+_NEEDS = (SESSION, DATA, CONN, ALL_SESSIONS)
+
+_handlers = {}     # opcode -> (handler, needs)
+_ignored = set()   # opcodes the client sends that we deliberately drop
+_stats = {}        # opcode -> [count, total_ns, max_ns, errors]
+_stats_lock = threading.Lock()
+
+
+def register_handler(opcode, handler, needs=DATA):
+    if needs not in _NEEDS:
+        raise ValueError(f"Unknown handler needs {needs!r} for 0x{opcode:02X}")
+    existing = _handlers.get(opcode)
+    if existing and existing[0] is not handler:
+        raise ValueError(f"Opcode 0x{opcode:02X} already handled by {existing[0].__name__}")
+    _handlers[opcode] = (handler, needs)
+
+
+def packet_handler(*opcodes, needs=DATA):
+    """
+    Decorator registering a handler for one or more opcodes, e.g.
+
+        @packet_handler(0x7A, needs=ALL_SESSIONS)
+        def handle_talk_to_npc(session, data, all_sessions): ...
+    """
+    def decorator(func):
+        for opcode in opcodes:
+            register_handler(opcode, func, needs)
+        return func
+    return decorator
+
+
+def ignore_packets(*opcodes):
+    _ignored.update(opcodes)
+
+
+def get_handler(opcode):
+    entry = _handlers.get(opcode)
+    return entry[0] if entry else None
+
+
+def _record(opcode, elapsed_ns, failed):
+    with _stats_lock:
+        st = _stats.get(opcode)
+        if st is None:
+            st = _stats[opcode] = [0, 0, 0, 0]
+        st[0] += 1
+        st[1] += elapsed_ns
+        if elapsed_ns > st[2]:
+            st[2] = elapsed_ns
+        if failed:
+            st[3] += 1
+
+
+def dispatch(session, pkt, data, all_sessions):
+    """
+    Run the handler registered for pkt. Returns False if nothing handles
+    the opcode. Handler exceptions are counted and re-raised; when the packet
+    is traced, the codec traces are dumped first.
+    """
+    entry = _handlers.get(pkt)
+    if entry is None:
+        if pkt in _ignored:
+            _record(pkt, 0, False)
+            return True
+        return False
+
+    handler, needs = entry
+    failed = True
+    trace = tracing.begin_packet(pkt, session)
+    start = time.perf_counter_ns()
+    try:
+        if needs is DATA:
+            handler(session, data)
+        elif needs is ALL_SESSIONS:
+            handler(session, data, all_sessions)
+        elif needs is CONN:
+            handler(session, data, session.conn)
+        else:
+            handler(session)
+        failed = False
+    except Exception as e:
+        tracing.dump_packet(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _record(pkt, time.perf_counter_ns() - start, failed)
+        tracing.end_packet(trace)
+    return True
+
+
+def get_packet_stats():
+    """Per-opcode counters and timings, busiest handlers (by total time) first."""
+    with _stats_lock:
+        snapshot = {op: list(st) for op, st in _stats.items()}
+    rows = []
+    for opcode, (count, total_ns, max_ns, errors) in snapshot.items():
+        handler = get_handler(opcode)
+        rows.append({
+            "opcode": f"0x{opcode:02X}",
+            "handler": handler.__name__ if handler else "ignored",
+            "count": count,
+            "errors": errors,
+            "total_ms": total_ns / 1e6,
+            "avg_us": total_ns / count / 1e3 if count else 0.0,
+            "max_us": max_ns / 1e3,
+        })
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return rows
+
+
+def reset_packet_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def format_packet_stats(limit=20):
+    lines = [f"{'opcode':<8}{'handler':<36}{'count':>9}{'errors':>7}{'total ms':>11}{'avg us':>9}{'max us':>10}"]
+    for r in get_packet_stats()[:limit]:
+        lines.append(f"{r['opcode']:<8}{r['handler']:<36}{r['count']:>9}{r['errors']:>7}"
+                     f"{r['total_ms']:>11.1f}{r['avg_us']:>9.1f}{r['max_us']:>10.1f}")
+    return "\n".join(lines)
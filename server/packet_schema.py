@@ -0,0 +1,402 @@
+"""
+Declarative packet layouts, compiled to straight-line encoders/decoders.
+
+A schema is a list of fields, in wire order:
+
+    {"name": "entity_id", "type": "method_4"}
+    {"name": "ent_state", "type": "bits", "bits": "Entity.const_316"}
+    {"optional": "airborne", "fields": [...], "else": [...]}
+        1 presence bit, then `fields` when it is set (`else` when it is not)
+    {"if": "is_secondary", "fields": [...], "else": [...]}
+        no bits of its own, branches on a bool field read earlier
+    {"repeat": "gears", "count": {"type": "bits", "bits": 11}, "fields": [...]}
+        a count, then that many groups (a list of dicts)
+
+Types are the BitBuffer/BitReader methods: bool (method_15), bits
+(method_6/method_11, needs "bits", an int or a constants.py name),
+method_4, method_9, method_45, method_24, method_91, method_739,
+method_393, float (method_309/method_560), string (method_13), method_26.
+
+compile_packet() turns a schema into Python source with every field
+inlined, no per-field method calls or schema walking at run time:
+encode(values) shifts the fields into one int and returns the framed
+packet (byte for byte what BitBuffer writes, quirks included: method_9(0)
+is a bare 1111 prefix), decode(payload) reads the whole payload as one int
+and returns a dict, raising ValueError on short data. Fields of a branch
+that was not taken decode as None.
+
+data/packet_schemas.json holds the layouts of the hot packets;
+schema_from_packet_types() reads the admin panel's data/packet_types.json
+entries as schemas.
+"""
+import contextlib
+import json
+import os
+import struct
+
+import constants
+
+SCHEMA_FILE = os.path.join("data", "packet_schemas.json")
+
+_ALIASES = {
+    "method_15": "bool", "method_6": "bits", "method_11": "bits", "method_13": "string",
+    "method_309": "float", "method_560": "float", "method_706": "method_739",
+    "signed_method_45": "method_45",
+}
+_TYPES = ("bool", "bits", "method_4", "method_9", "method_45", "method_24", "method_91",
+          "method_739", "method_393", "float", "string", "method_26")
+
+# repeated groups move whole bytes out of the accumulator once it holds this many bits
+_FLUSH_BITS = 4096
+
+_F32 = struct.Struct(">f")
+_U32 = struct.Struct(">I")
+_HEADER = struct.Struct(">HH")
+
+
+def _text(raw):
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+_NAMESPACE = {
+    "_f2i": lambda x: _U32.unpack(_F32.pack(x))[0],
+    "_i2f": lambda x: _F32.unpack(_U32.pack(x))[0],
+    "_text": _text,
+    "_header": _HEADER.pack,
+}
+
+
+class PacketCodec:
+    def __init__(self, name, opcode, fields, source, encode, decode):
+        self.name = name
+        self.opcode = opcode
+        self.fields = fields
+        self.source = source
+        self.encode = encode
+        self.decode = decode
+
+    def __repr__(self):
+        return f"<PacketCodec 0x{self.opcode:02X} {self.name}>"
+
+
+def _type_of(field):
+    kind = field["type"]
+    kind = _ALIASES.get(kind, kind)
+    if kind not in _TYPES:
+        raise ValueError(f"Unknown field type {field['type']!r} for {field.get('name')!r}")
+    return kind
+
+
+def _bit_count(field):
+    bits = field.get("bits")
+    if isinstance(bits, str):
+        owner, _, attr = bits.partition(".")
+        bits = getattr(getattr(constants, owner), attr)
+    if not isinstance(bits, int) or bits < 0:
+        raise ValueError(f"Field {field.get('name')!r} needs a bit count")
+    return bits
+
+
+def _count_field(spec):
+    return {"name": "count", "type": spec} if isinstance(spec, str) else dict(spec, name="count")
+
+
+@contextlib.contextmanager
+def _block(w, depth):
+    """An indented block, with a pass if nothing ended up in it."""
+    start = len(w.lines)
+    yield
+    if len(w.lines) == start:
+        w.emit(depth, "pass")
+
+
+class _Writer:
+    def __init__(self):
+        self.lines = []
+        self.counter = 0
+
+    def emit(self, depth, line):
+        self.lines.append("    " * depth + line)
+
+    def var(self):
+        self.counter += 1
+        return f"_{self.counter}"
+
+
+# encoder
+###################################
+def _enc_scalar(w, depth, field, expr):
+    kind = _type_of(field)
+    emit = lambda line: w.emit(depth, line)
+    if kind == "bool":
+        emit(f"a = (a << 1) | (1 if {expr} else 0); n += 1")
+        return
+    if kind == "bits":
+        bits = _bit_count(field)
+        if bits:
+            emit(f"a = (a << {bits}) | ({expr} & {(1 << bits) - 1}); n += {bits}")
+        return
+    if kind == "method_393":
+        emit(f"a = (a << 8) | ({expr} & 255); n += 8")
+        return
+    if kind == "float":
+        emit(f"a = (a << 32) | _f2i({expr}); n += 32")
+        return
+    if kind in ("string", "method_26"):
+        if kind == "string":
+            emit(f"e = str({expr}).encode('utf-8')")
+        else:
+            emit(f"x = {expr}")
+            emit("e = (x or '').encode('utf-8')")
+        emit("l = len(e)")
+        emit("if l > 65535: e = e[:65535]; l = 65535")
+        emit("a = (((a << 16) | l) << (l << 3)) | int.from_bytes(e, 'big'); n += 16 + (l << 3)")
+        return
+
+    emit(f"x = {expr}")
+    signed = kind in ("method_45", "method_24", "method_739")
+    value = "x"
+    if signed:
+        emit("m = -x if x < 0 else x")
+        value = "m"
+    if kind in ("method_9", "method_24"):
+        # bit_length rounded up to even, no minimum: 0 is a 1111 prefix and no value bits
+        emit(f"b = {value}.bit_length(); b += b & 1")
+        prefix, prefix_bits = "((b >> 1) - 1) & 15", 4
+    else:
+        emit(f"b = {value}.bit_length() if {value} > 0 else 1; b += b & 1")
+        if kind in ("method_4", "method_45"):
+            emit(f"if b > 32: raise ValueError('Value too large for method_4: ' + str({value}))")
+            prefix, prefix_bits = "(b >> 1) - 1", 4
+        else:
+            prefix, prefix_bits = "((b >> 1) - 1) & 7", 3
+    masked = f"({value} & ((1 << b) - 1))" if not signed else value
+    if signed:
+        emit(f"a = (((a << {prefix_bits + 1}) | ({1 << prefix_bits} if x < 0 else 0) | ({prefix})) << b) | {masked}; "
+             f"n += {prefix_bits + 1} + b")
+    else:
+        emit(f"a = (((a << {prefix_bits}) | ({prefix})) << b) | {masked}; n += {prefix_bits} + b")
+
+
+def _enc_fields(w, depth, fields, src):
+    for field in fields:
+        if "optional" in field:
+            w.emit(depth, f"if {src}.get({field['optional']!r}):")
+            w.emit(depth + 1, "a = (a << 1) | 1; n += 1")
+            _enc_fields(w, depth + 1, field.get("fields", ()), src)
+            w.emit(depth, "else:")
+            w.emit(depth + 1, "a <<= 1; n += 1")
+            _enc_fields(w, depth + 1, field.get("else", ()), src)
+        elif "if" in field:
+            w.emit(depth, f"if {src}[{field['if']!r}]:")
+            with _block(w, depth + 1):
+                _enc_fields(w, depth + 1, field.get("fields", ()), src)
+            w.emit(depth, "else:")
+            with _block(w, depth + 1):
+                _enc_fields(w, depth + 1, field.get("else", ()), src)
+        elif "repeat" in field:
+            items = w.var()
+            item = w.var()
+            w.emit(depth, f"{items} = {src}[{field['repeat']!r}]")
+            _enc_scalar(w, depth, _count_field(field["count"]), f"len({items})")
+            w.emit(depth, f"for {item} in {items}:")
+            _enc_fields(w, depth + 1, field["fields"], item)
+            w.emit(depth + 1, f"if n >= {_FLUSH_BITS}:")
+            w.emit(depth + 2, "r = n & 7")
+            w.emit(depth + 2, "out += (a >> r).to_bytes(n >> 3, 'big')")
+            w.emit(depth + 2, "a &= (1 << r) - 1; n = r")
+        else:
+            _enc_scalar(w, depth, field, f"{src}[{field['name']!r}]")
+
+
+# decoder
+###################################
+def _need(w, depth, bits, what):
+    w.emit(depth, f"if r < {bits}: raise ValueError({what!r})")
+
+
+def _dec_scalar(w, depth, field, target, pkt):
+    kind = _type_of(field)
+    what = f"Not enough data for {pkt} {field['name']}"
+    emit = lambda line: w.emit(depth, line)
+    if kind in ("bool", "bits", "method_393", "float"):
+        bits = {"bool": 1, "method_393": 8, "float": 32}.get(kind) or _bit_count(field)
+        if kind == "bits" and not bits:
+            emit(f"{target} = 0")
+            return
+        _need(w, depth, bits, what)
+        value = f"(w >> r) & {(1 << bits) - 1}"
+        if kind == "bool":
+            emit(f"r -= 1; {target} = ((w >> r) & 1) == 1")
+        elif kind == "float":
+            emit(f"r -= 32; {target} = _i2f({value})")
+        else:
+            emit(f"r -= {bits}; {target} = {value}")
+        return
+    if kind in ("string", "method_26"):
+        _need(w, depth, 16, what)
+        emit("r -= 16; l = (w >> r) & 65535")
+        emit(f"if r < l << 3: raise ValueError({what!r})")
+        emit(f"r -= l << 3; {target} = _text(((w >> r) & ((1 << (l << 3)) - 1)).to_bytes(l, 'big'))")
+        return
+
+    signed = kind in ("method_45", "method_24", "method_739")
+    prefix_bits = 3 if kind in ("method_91", "method_739") else 4
+    head = prefix_bits + (1 if signed else 0)
+    _need(w, depth, head, what)
+    emit(f"r -= {head}; h = (w >> r) & {(1 << head) - 1}")
+    emit(f"b = ((h & {(1 << prefix_bits) - 1}) + 1) << 1")
+    emit(f"if r < b: raise ValueError({what!r})")
+    emit(f"r -= b; {target} = (w >> r) & ((1 << b) - 1)")
+    if signed:
+        emit(f"if h >> {prefix_bits}: {target} = -{target}")
+
+
+def _branch_targets(fields, out):
+    """(name, var) of every field a block assigns, for the None defaults of the other branch."""
+    for field in fields:
+        if "optional" in field or "if" in field:
+            if "optional" in field:
+                out.append(field["optional"])
+            _branch_targets(field.get("fields", ()), out)
+            _branch_targets(field.get("else", ()), out)
+        elif "repeat" in field:
+            out.append(field["repeat"])
+        else:
+            out.append(field["name"])
+    return out
+
+
+def _dec_fields(w, depth, fields, scope, pkt):
+    """Decode fields into locals; scope maps field name -> local name."""
+    for field in fields:
+        if "optional" in field or "if" in field:
+            if "optional" in field:
+                flag = scope[field["optional"]] = scope.get(field["optional"]) or w.var()
+                _dec_scalar(w, depth, {"name": field["optional"], "type": "bool"}, flag, pkt)
+            else:
+                flag = scope.get(field["if"])
+                if flag is None:
+                    raise ValueError(f"{pkt}: 'if' on {field['if']!r} before it is read")
+            taken, other = field.get("fields", ()), field.get("else", ())
+            for name in _branch_targets(list(taken) + list(other), []):
+                if name not in scope:
+                    scope[name] = w.var()
+            w.emit(depth, f"if {flag}:")
+            with _block(w, depth + 1):
+                _dec_fields(w, depth + 1, taken, scope, pkt)
+                for name in _branch_targets(list(other), []):
+                    w.emit(depth + 1, f"{scope[name]} = None")
+            w.emit(depth, "else:")
+            with _block(w, depth + 1):
+                _dec_fields(w, depth + 1, other, scope, pkt)
+                for name in _branch_targets(list(taken), []):
+                    w.emit(depth + 1, f"{scope[name]} = None")
+        elif "repeat" in field:
+            items = scope[field["repeat"]] = scope.get(field["repeat"]) or w.var()
+            count = w.var()
+            _dec_scalar(w, depth, _count_field(field["count"]), count, pkt)
+            w.emit(depth, f"{items} = []")
+            w.emit(depth, f"for _ in range({count}):")
+            inner = {}
+            _dec_fields(w, depth + 1, field["fields"], inner, pkt)
+            w.emit(depth + 1, f"{items}.append({_dict_literal(field['fields'], inner)})")
+        else:
+            target = scope[field["name"]] = scope.get(field["name"]) or w.var()
+            _dec_scalar(w, depth, field, target, pkt)
+
+
+def _dict_literal(fields, scope):
+    names = _branch_targets(list(fields), [])
+    return "{" + ", ".join(f"{name!r}: {scope[name]}" for name in names) + "}"
+
+
+# compiler
+###################################
+def _has_repeat(fields):
+    return any("repeat" in f or _has_repeat(f.get("fields", ())) or _has_repeat(f.get("else", ()))
+               for f in fields)
+
+
+def compile_packet(name, opcode, fields):
+    """Compile a schema into a PacketCodec; codec.source is the generated code."""
+    pkt = f"0x{opcode:02X}"
+    w = _Writer()
+    repeat = _has_repeat(fields)
+
+    w.emit(0, f"def encode_{name}(v):")
+    w.emit(1, "a = 0; n = 0")
+    if repeat:
+        w.emit(1, "out = bytearray()")
+    _enc_fields(w, 1, fields, "v")
+    w.emit(1, "pad = -n & 7")
+    if repeat:
+        w.emit(1, "out += (a << pad).to_bytes((n + pad) >> 3, 'big')")
+        w.emit(1, f"return _header({opcode}, len(out)) + out")
+    else:
+        w.emit(1, "p = (a << pad).to_bytes((n + pad) >> 3, 'big')")
+        w.emit(1, f"return _header({opcode}, len(p)) + p")
+    w.emit(0, "")
+    w.emit(0, "")
+
+    w.emit(0, f"def decode_{name}(data):")
+    w.emit(1, "w = int.from_bytes(data, 'big'); r = len(data) << 3")
+    scope = {}
+    _dec_fields(w, 1, fields, scope, pkt)
+    w.emit(1, f"return {_dict_literal(fields, scope)}")
+
+    source = "\n".join(w.lines) + "\n"
+    namespace = dict(_NAMESPACE)
+    exec(compile(source, f"<schema {pkt} {name}>", "exec"), namespace)
+    return PacketCodec(name, opcode, fields, source,
+                       namespace[f"encode_{name}"], namespace[f"decode_{name}"])
+
+
+def load_schemas(path=SCHEMA_FILE):
+    """{opcode: PacketCodec} for every packet in the schema file."""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    return {int(op, 16): compile_packet(entry["name"], int(op, 16), entry["fields"])
+            for op, entry in raw.items()}
+
+
+_codecs = None
+
+
+def get_codec(opcode):
+    global _codecs
+    if _codecs is None:
+        _codecs = load_schemas()
+    return _codecs.get(opcode)
+
+
+# admin panel packets (data/packet_types.json)
+###################################
+def schema_from_packet_types(entry):
+    """
+    (opcode, fields, values) for a packet_types.json entry. Each buffer is a
+    method call with its arguments in "value" ("10,4" for write_method_6);
+    the bit counts go into the schema, the values into `values`.
+    """
+    fields, values = [], {}
+    for i, buf in enumerate(entry["buffers"]):
+        method = buf["method"].strip()
+        kind = _ALIASES.get(method[len("write_"):], method[len("write_"):])
+        args = [a.strip() for a in buf["value"].split(",") if a.strip()]
+        name = f"f{i}"
+        if kind == "bits":
+            if len(args) != 2:
+                raise ValueError(f"{method} needs value,bits (got {buf['value']!r})")
+            fields.append({"name": name, "type": "bits", "bits": int(args[1])})
+            values[name] = int(args[0])
+        elif kind == "string":
+            fields.append({"name": name, "type": "string"})
+            values[name] = " ".join(args)
+        else:
+            fields.append({"name": name, "type": kind})
+            _type_of(fields[-1])
+            values[name] = float(args[0]) if kind == "float" else int(args[0])
+    return int(entry["packet_type"], 16), fields, values
@@ -1,13 +1,13 @@
-import glob
-import json
-import os
+import functools
 import threading
 import time
 import heapq
 import struct
 
 from BitBuffer import BitBuffer
-from Character import save_characters, load_characters, CHAR_SAVE_DIR
+from Character import save_characters, load_characters
+import char_store
+import storage
 from constants import class_111, class_64_const_218, class_1, class_66
 
 # Will be set by server.py to resolve (user_id, char_name) → ClientSession
@@ -16,31 +16,57 @@ active_session_resolver = None
 def set_active_session_resolver(fn):
     """
     fn(user_id: str, char_name: str) -> ClientSession or None
+    (char_name None: any session of the account)
     """
     global active_session_resolver
     active_session_resolver = fn
 
+def _releases_account(func):
+    """
+    Timer callbacks load the account into char_store; once they are done,
+    evict it again if nobody plays it, or it stays cached for good.
+    """
+    @functools.wraps(func)
+    def wrapper(user_id, *args):
+        try:
+            return func(user_id, *args)
+        finally:
+            if not (active_session_resolver and active_session_resolver(user_id, None)):
+                char_store.evict(user_id)
+    return wrapper
+
 class TaskScheduler:
     def __init__(self):
         self._lock = threading.Lock()
-        self._queue = []  # heap of (run_at, id, callback)
+        self._queue = []  # heap of (run_at, id, callback, key)
         self._next_id = 0
         self._new_event = threading.Event()
         threading.Thread(target=self._run_loop, daemon=True).start()
 
-    def schedule(self, run_at: int, callback: callable):
+    def schedule(self, run_at: int, callback: callable, key=None):
         with self._lock:
-            heapq.heappush(self._queue, (run_at, self._next_id, callback))
+            heapq.heappush(self._queue, (run_at, self._next_id, callback, key))
             self._next_id += 1
             self._new_event.set()
 
+    def cancel_for(self, key) -> int:
+        """Drop every pending callback scheduled with this key, returns how many."""
+        with self._lock:
+            keep = [entry for entry in self._queue if entry[3] != key]
+            dropped = len(self._queue) - len(keep)
+            if dropped:
+                heapq.heapify(keep)
+                self._queue = keep
+                self._new_event.set()
+        return dropped
+
     def _run_loop(self):
         while True:
             with self._lock:
                 if not self._queue:
                     timeout = None
                 else:
-                    run_at, _, _ = self._queue[0]
+                    run_at = self._queue[0][0]
                     timeout = max(0, run_at - int(time.time()))
             self._new_event.wait(timeout=timeout)
             self._new_event.clear()
@@ -49,7 +75,7 @@ class TaskScheduler:
             to_run = []
             with self._lock:
                 while self._queue and self._queue[0][0] <= now:
-                    _, _, cb = heapq.heappop(self._queue)
+                    cb = heapq.heappop(self._queue)[2]
                     to_run.append(cb)
             for cb in to_run:
                 try:
@@ -86,9 +112,11 @@ def reschedule_for_session(session):
             # Schedule callback for when it's due
             scheduler.schedule(
                 run_at=ready_ts,
-                callback=lambda uid=session.user_id, cname=char["name"]: _on_research_done_for(uid, cname)
+                callback=lambda uid=session.user_id, cname=char["name"]: _on_research_done_for(uid, cname),
+                key=(session.user_id, char["name"])
             )
 
+@_releases_account
 def _on_research_done_for(user_id: str, char_name: str):
     # Load persistent data
     chars = load_characters(user_id)
@@ -120,11 +148,13 @@ def _on_research_done_for(user_id: str, char_name: str):
 def schedule_research(user_id: str, char_name: str, ready_ts: int):
     handle = scheduler.schedule(
         run_at=ready_ts,
-        callback=lambda uid=user_id, cn=char_name: _on_research_done_for(uid, cn)
+        callback=lambda uid=user_id, cn=char_name: _on_research_done_for(uid, cn),
+        key=(user_id, char_name)
     )
     return handle
 
 
+@_releases_account
 def _on_building_done_for(user_id: str, char_name: str):
     chars = load_characters(user_id)
     char = next((c for c in chars if c.get("name") == char_name), None)
@@ -187,12 +217,16 @@ def _on_building_done_for(user_id: str, char_name: str):
         print(f"[Scheduler] building notify failed: {e}")
 
 
-def schedule_building_upgrade(user_id: str, char_name: str, ready_ts: int):
-    handle = scheduler.schedule(
+def _schedule_building_done(user_id: str, char_name: str, ready_ts: int):
+    return scheduler.schedule(
         run_at=ready_ts,
-        callback=lambda uid=user_id, cn=char_name: _on_building_done_for(uid, cn)
+        callback=lambda uid=user_id, cn=char_name: _on_building_done_for(uid, cn),
+        key=(user_id, char_name)
     )
 
+def schedule_building_upgrade(user_id: str, char_name: str, ready_ts: int):
+    handle = _schedule_building_done(user_id, char_name, ready_ts)
+
     # Store the scheduler ID so it can be canceled later
     chars = load_characters(user_id)
     char = next((c for c in chars if c.get("name") == char_name), None)
@@ -204,6 +238,7 @@ def schedule_building_upgrade(user_id: str, char_name: str, ready_ts: int):
 
 
 
+@_releases_account
 def _on_forge_done_for(user_id: str, char_name: str, primary: int, secondary: int):
     # 1) Load persistent data
     chars = load_characters(user_id)
@@ -251,9 +286,11 @@ def schedule_forge(user_id: str, char_name: str, run_at: int, primary: int, seco
     scheduler.schedule(
         run_at=run_at,
         callback=lambda uid=user_id, cn=char_name, p=primary, s=secondary:
-            _on_forge_done_for(uid, cn, p, s)
+            _on_forge_done_for(uid, cn, p, s),
+        key=(user_id, char_name)
     )
 
+@_releases_account
 def _on_talent_done_for(user_id: str, char_name: str):
     chars = load_characters(user_id)
     char = next((c for c in chars if c.get("name") == char_name), None)
@@ -294,19 +331,54 @@ def _on_talent_done_for(user_id: str, char_name: str):
 def schedule_Talent_point_research(user_id: str, char_name: str, run_at: int):
     handle = scheduler.schedule(
         run_at=run_at,
-        callback=lambda uid=user_id, cn=char_name: _on_talent_done_for(uid, cn)
+        callback=lambda uid=user_id, cn=char_name: _on_talent_done_for(uid, cn),
+        key=(user_id, char_name)
     )
     return handle
 
+def cancel_timers(user_id: str, char_name: str) -> int:
+    """Drop a character's pending timers: it moved to another zone worker, which re-arms them."""
+    return scheduler.cancel_for((user_id, char_name))
+
+def rearm_timers(user_id: str, char: dict) -> int:
+    """
+    Schedule a character's unfinished research, building, forge and talent
+    timers in this process (zone handoff). Timers already due fire at once.
+    """
+    name = char["name"]
+    armed = 0
+    research = char.get("research")
+    if research and not research.get("done", False):
+        schedule_research(user_id, name, research.get("ReadyTime", 0))
+        armed += 1
+
+    bu = char.get("buildingUpgrade")
+    if isinstance(bu, dict) and bu.get("buildingID") and not bu.get("done", False):
+        # schedule_building_upgrade() would also write a schedule_id into the save
+        _schedule_building_done(user_id, name, bu.get("ReadyTime", 0))
+        armed += 1
+
+    mf = char.get("magicForge")
+    if isinstance(mf, dict) and mf.get("hasSession") and mf.get("status") == class_111.const_286:
+        ready_ts = mf.get("_start_time", 0) + (mf.get("duration", 0) // 1000)
+        schedule_forge(user_id, name, ready_ts, mf.get("primary", 0), mf.get("secondary", 0))
+        armed += 1
+
+    tr = char.get("talentResearch", {})
+    if tr and not tr.get("done", False):
+        schedule_Talent_point_research(user_id, name, tr.get("ReadyTime", 0))
+        armed += 1
+    return armed
+
 def boot_scan_all_saves():
+    """
+    Re-arm or complete the timers of every save. Runs before any player is
+    loaded into char_store, so it reads and writes the backend directly and
+    does not go through the account cache.
+    """
     now = int(time.time())
-    for path in glob.glob(os.path.join(CHAR_SAVE_DIR, "*.json")):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception:
-            continue
-
+    backend = storage.get_backend()
+    for user_id, data in backend.iter_accounts():
         chars = data.get("characters", [])
         dirty = False
 
@@ -336,7 +408,7 @@ def boot_scan_all_saves():
                         upgrade["done"] = True
                         dirty = True
                     else:
-                        schedule_building_upgrade(char.get("user_id"), char["name"], rt)
+                        _schedule_building_done(char.get("user_id"), char["name"], rt)
 
             # — Magic Forge sessions —
             mf = char.get("magicForge")
@@ -378,11 +450,9 @@ def boot_scan_all_saves():
 
 
         if dirty:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            print(f"Boot‑scan: patched expired timers in {os.path.basename(path)}")
+            backend.save(user_id, data)
+            print(f"Boot‑scan: patched expired timers in {user_id}")
 
-# Call once at import / server startup
-boot_scan_all_saves()
+# Called once at server startup by server.py (only one process runs it in zone mode)
 
 
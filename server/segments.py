@@ -0,0 +1,84 @@
+"""
+Pre-encoded bit segments for the values the big packets send over and over
+(level SWF paths, host, NPC names, a character's appearance block).
+
+write_cached(bb, builder, *args) runs builder(bb, *args) once into a
+scratch buffer, keeps the resulting bits, and from then on splices them into
+bb with one BitBuffer.write_segment() (a shift and a byte copy, at any bit
+offset). args must be hashable and fully determine what builder writes.
+
+Traced buffers (bb.debug) always run the builder, so their debug log still
+lists every field.
+"""
+from BitBuffer import BitBuffer
+
+SEGMENT_CACHE = True       # off: always run the builders (benchmarks compare both)
+SEGMENT_CACHE_SIZE = 8192  # segments kept before the cache is dropped and refilled
+
+_segments = {}   # (builder, args) -> (value, bit_count)
+_stats = {"hits": 0, "misses": 0, "resets": 0}
+
+
+def configure(enabled):
+    global SEGMENT_CACHE
+    SEGMENT_CACHE = bool(enabled)
+
+
+def write_cached(bb, builder, *args):
+    if bb.debug or not SEGMENT_CACHE:
+        builder(bb, *args)
+        return
+    key = (builder, args)
+    segment = _segments.get(key)
+    if segment is None:
+        _stats["misses"] += 1
+        scratch = BitBuffer(debug=False)
+        builder(scratch, *args)
+        segment = scratch.segment()
+        if len(_segments) >= SEGMENT_CACHE_SIZE:
+            _segments.clear()
+            _stats["resets"] += 1
+        _segments[key] = segment
+    else:
+        _stats["hits"] += 1
+    bb.write_segment(segment)
+
+
+def write_method_13(bb, text):
+    """bb.write_method_13(text), from the cache."""
+    write_cached(bb, BitBuffer.write_method_13, text)
+
+
+def _appearance(bb, name, class_name, gender, head_set, hair_set, mouth_set, face_set,
+                hair_color, skin_color, shirt_color, pant_color):
+    bb.write_method_13(name)
+    bb.write_method_11(1, 1)  # has appearance
+    bb.write_method_13(class_name)
+    bb.write_method_13(gender)
+    bb.write_method_13(head_set)
+    bb.write_method_13(hair_set)
+    bb.write_method_13(mouth_set)
+    bb.write_method_13(face_set)
+    bb.write_method_11(hair_color, 24)
+    bb.write_method_11(skin_color, 24)
+    bb.write_method_11(shirt_color, 24)
+    bb.write_method_11(pant_color, 24)
+
+
+def write_appearance(bb, name, class_name, gender, head_set, hair_set, mouth_set, face_set,
+                     hair_color, skin_color, shirt_color, pant_color):
+    """
+    Name, appearance flag, the six appearance strings and the four 24-bit
+    colours, as both Player_Data_Packet and Send_Entity_Data send them.
+    """
+    write_cached(bb, _appearance, name, class_name, gender, head_set, hair_set, mouth_set, face_set,
+                 hair_color, skin_color, shirt_color, pant_color)
+
+
+def get_segment_stats():
+    total = _stats["hits"] + _stats["misses"]
+    return dict(_stats, cached=len(_segments), hit_rate=_stats["hits"] / total if total else 0.0)
+
+
+def clear_segments():
+    _segments.clear()
@@ -1,51 +1,55 @@
 #!/usr/bin/env python3
+import argparse
+import asyncio
 import copy
+import multiprocessing
 import os
 import json
+import signal
 import socket, struct, hashlib, sys, time, secrets, threading
 
-from Brain import tick_npc_brains
-from accounts import get_or_create_user_id, load_accounts, _SAVES_DIR, is_character_name_taken, build_popup_packet
+from accounts import get_or_create_user_id, lookup_user_id, build_popup_packet, \
+    start_compactor
 from Character import (
     build_login_character_list_bitpacked,
     build_paperdoll_packet,
     load_characters,
-    save_characters, get_inventory_gears, build_level_gears_packet, load_class_template
+    save_characters, get_inventory_gears, build_level_gears_packets, load_class_template
 )
 from BitBuffer import BitBuffer
-from Commands import handle_hotbar_packet, handle_masterclass_packet, handle_gear_packet, \
-    handle_apply_dyes, handle_rune_packet, handle_change_look, handle_create_gearset, handle_name_gearset, \
-    handle_apply_gearset, handle_update_equipment, magic_forge_packet, collect_forge_charm, start_forge_packet, \
-    cancel_forge_packet, allocate_talent_points, use_forge_xp_consumable, handle_private_message, \
-    handle_public_chat, handle_group_invite, handle_power_cast, handle_power_hit, \
-    handle_projectile_explode, handle_add_buff, handle_remove_buff, handle_entity_full_update, \
-    handle_entity_incremental_update, handle_request_door_state, Start_Skill_Research, \
-    handle_research_claim, PaperDoll_Request, Skill_Research_Cancell_Request, Skill_SpeedUp, handle_building_upgrade, \
-    handle_speedup_request, handle_cancel_upgrade, handle_train_talent_point, handle_talent_speedup, \
-    handle_talent_claim, handle_clear_talent_research, handle_hp_increase_notice, handle_volume_enter, \
-    handle_change_offset_y, handle_start_skit, handle_change_max_speed, handle_lockbox_reward, handle_grant_reward, \
-    handle_linkupdater, handle_request_respawn, handle_respawn_ack, PKTTYPE_BUFF_TICK_DOT, handle_entity_destroy, \
-    handle_emote_begin, Client_Crash_Reports, handle_mount_equip_packet, handle_pet_info_packet, \
-    handle_collect_hatched_egg, handle_talk_to_npc, handle_char_regen, allocate_talent_tree_points, \
-    handle_respec_talent_tree, handle_building_claim
-from WorldEnter import build_enter_world_packet, Player_Data_Packet
+import Commands  # registers its @packet_handler functions
+from WorldEnter import build_enter_world_packet, build_player_data_packets
 #from admin_panel import run_admin_panel
 from bitreader import BitReader
 from PolicyServer import start_policy_server
 from constants import EntType
 from static_server import start_static_server
-from entity import Send_Entity_Data, load_npc_data_for_level
+from entity import get_npc_spawn_burst
 from level_config import DOOR_MAP, LEVEL_CONFIG, get_spawn_coordinates
-from scheduler import set_active_session_resolver
+from scheduler import set_active_session_resolver, boot_scan_all_saves, cancel_timers, rearm_timers
+from packet_registry import packet_handler, ignore_packets, dispatch
+from framing import FrameReader
+from outbound import OutboundQueue, StreamConnection
+from levels import join_level, leave_level
+import zones
+import batching
+import interest
+import simulation
+import tracing
+import forwarding
+import char_store
+import checkpoints
+import name_index
+import storage
 
 HOST = "127.0.0.1"
 PORTS = [8080]# Developer mode Port : 7498
+SERVER_MODE = "threaded"  # "threaded" or "asyncio", override with --mode
 pending_world = {}
 all_sessions = []
 current_characters = {}
 used_tokens = {}
 session_by_token = {}
-level_registry = {}
 char_tokens = {}
 token_char   = {}
 extended_sent_map = {}  # user_id -> bool
@@ -56,17 +60,6 @@ extended_sent_map = {}  # user_id -> bool
 SECRET_HEX = "815bfb010cd7b1b4e6aa90abc7679028"
 SECRET      = bytes.fromhex(SECRET_HEX)
 
-def _level_add(level, session):
-    s = level_registry.setdefault(level, set())
-    s.add(session)
-
-def _level_remove(level, session):
-    s = level_registry.get(level)
-    if s and session in s:
-        s.remove(session)
-        if not s:
-            level_registry.pop(level, None)
-
 def send_login_challenge(conn):
     # 1) pick a random 16-bit sid
     sid = secrets.randbelow(1 << 16)
@@ -95,13 +88,44 @@ def new_transfer_token():
 
 def find_active_session(user_id, char_name):
     for s in all_sessions:
-        if getattr(s, 'user_id', None) == user_id and getattr(s, 'current_character', None) == char_name and s.authenticated:
+        if getattr(s, 'user_id', None) == user_id and s.authenticated \
+                and (char_name is None or getattr(s, 'current_character', None) == char_name):
             return s
     return None
 
 # register resolver
 set_active_session_resolver(find_active_session)
 
+def zone_address(level_name):
+    """Host/port the client should connect to for level_name."""
+    return zones.address_for(level_name) or (HOST, PORTS[0])
+
+def hand_off_transfer(session, token, char, target_level, previous_level):
+    """Zone mode: publish a pending transfer so the worker owning target_level can pick it up."""
+    if zones.is_local(target_level):
+        return
+    # research/forge/... timers move with the player, this worker must not complete them
+    cancel_timers(session.user_id, char.get("name"))
+    # the worker we hand off to reads the save file, it must be current
+    checkpoints.flush(session)
+    char_store.evict(session.user_id)
+    sent = extended_sent_map.get(session.user_id, {}).get("sent", False)
+    zones.publish_handoff(token, char, target_level, previous_level, sent)
+    print(f"[{session.addr}] Handed off token {token} for {char.get('name')} → {target_level} at {zone_address(target_level)}")
+
+def claim_transfer(token):
+    """Zone mode: take over a transfer published by another worker, returns a pending_world entry."""
+    handoff = zones.claim_handoff(token)
+    if handoff is None:
+        return None
+    char = handoff["char"]
+    if handoff["extended_sent"]:
+        extended_sent_map[char.get("user_id")] = {"sent": True, "last_seen": time.time()}
+    rearm_timers(char.get("user_id"), char)
+    entry = (char, handoff["target_level"], handoff["previous_level"])
+    pending_world[token] = entry
+    return entry
+
 class ClientSession:
     def __init__(self, conn, addr):
         self.conn = conn
@@ -110,8 +134,9 @@ class ClientSession:
         self.char_list = []
         self.authenticated = False
         self.player_data = {}
-        self.current_character = None
-        self.current_level = None
+        self._current_character = None
+        self.level = None          # levels.Level this session is a member of
+        self._current_level = None
         self.entry_level = None
         self.world_loaded = False
         self.spawned_npcs = []
@@ -119,6 +144,27 @@ class ClientSession:
         self.clientEntID = None
         self.running = True
 
+    @property
+    def current_character(self):
+        return self._current_character
+
+    @current_character.setter
+    def current_character(self, name):
+        name_index.set_online(self, name)  # /tell and /invite find players by name
+        self._current_character = name
+
+    @property
+    def current_level(self):
+        return self._current_level
+
+    @current_level.setter
+    def current_level(self, name):
+        # keep Level membership in step with every assignment (select, 0x1f, 0x1D)
+        if name != self._current_level:
+            checkpoints.flush(self)  # the last position on the old level
+        self._current_level = name
+        join_level(self, name)
+
     def stop(self):
         self.running = False
         self.cleanup()
@@ -140,7 +186,8 @@ class ClientSession:
         if key in char_tokens:
             tk = char_tokens[key]
         else:
-            tk = new_transfer_token()
+            # in zone mode tokens must be unique across all worker processes
+            tk = zones.token_for(*key) if zones.enabled() else new_transfer_token()
             char_tokens[key] = tk
             token_char[tk] = key
         self.clientEntID = tk
@@ -153,11 +200,13 @@ class ClientSession:
 
         if self.clientEntID in session_by_token:
             session_by_token.pop(self.clientEntID, None)
-        if self.current_level:
-
-            _level_remove(self.current_level, self)
+        leave_level(self)
         if self in all_sessions:
             all_sessions.remove(self)
+        checkpoints.flush(self, forget=True)
+        name_index.set_online(self, None)
+        if self.user_id and not any(s.user_id == self.user_id for s in all_sessions):
+            char_store.evict(self.user_id)  # last session of this account: write it out now
 
         if self.user_id in extended_sent_map:
             extended_sent_map[self.user_id]["last_seen"] = time.time()
@@ -181,730 +230,506 @@ def read_exact(conn, n):
         buf += chunk
     return buf
 
+@packet_handler(0x11)
+def handle_login_challenge_request(session, data):
+    send_login_challenge(session.conn)
+
+@packet_handler(0x13)
+def handle_login_email(session, data):
+    conn = session.conn
+    br = BitReader(data[8:], debug=True)
+    email = br.read_method_26().strip().lower()
+    session.user_id = get_or_create_user_id(email)
+    session.char_list = load_characters(session.user_id)
+    session.authenticated = True
+    conn.sendall(build_login_character_list_bitpacked(session.char_list))
+
+@packet_handler(0x14)
+def handle_login(session, data):
+    conn = session.conn
+    br = BitReader(data[4:], debug=True)
+    try:
+        client_facebook_id = br.read_method_26()  # Facebook platform ID
+        client_kongregate_id = br.read_method_26()  # Kongregate platform ID
+        email = br.read_method_26().strip().lower()  # Primary login identifier
+        password = br.read_method_26()  # Password or session token
+        legacy_auth_key = br.read_method_26()  # Embed auth key / API key
+    except Exception as e:
+        print(f"[{session.addr}] [PKT0x14] Error parsing packet: {e}, raw payload={data[4:].hex()}")
+        return
+    user_id = lookup_user_id(email)
+    if not user_id:
+        #print(f"[{session.addr}] [PKT0x14] Login failed—no account for {email}")
+        conn.sendall(build_popup_packet("Account not found", disconnect=True))
+        return
+    session.user_id = user_id
+    session.player_data = char_store.get_account(session.user_id)
+    if session.player_data.get("email") is None:
+        session.player_data["email"] = email
+    session.char_list = session.player_data["characters"]
+    session.authenticated = True
+    conn.sendall(build_login_character_list_bitpacked(session.char_list))
+    print(f"[{session.addr}] [PKT0x14] Logged in {email} → user_id={user_id}, chars={len(session.char_list)}")
+
+@packet_handler(0x17)
+def handle_create_character(session, data):
+    conn = session.conn
+    if not session.authenticated:
+        err_packet = build_popup_packet("Please log in first", disconnect=True)
+        conn.sendall(err_packet)
+        return
+    br = BitReader(data[4:], debug=True)
+    try:
+        name = br.read_method_26()  # character name
+        class_name = br.read_method_26()
+        gender = br.read_method_26()
+        head = br.read_method_26()
+        hair = br.read_method_26()
+        mouth = br.read_method_26()
+        face = br.read_method_26()
+        hair_color = br.read_method_20(EntType.CHAR_COLOR_BITSTOSEND)
+        skin_color = br.read_method_20(EntType.CHAR_COLOR_BITSTOSEND)
+        shirt_color = br.read_method_20(EntType.CHAR_COLOR_BITSTOSEND)
+        pant_color = br.read_method_20(EntType.CHAR_COLOR_BITSTOSEND)
+        print(f"[{session.addr}] [PKT0x17] Parsed character creation: "
+              f"name={name}, class={class_name}, gender={gender}")
+    except Exception as e:
+        print(f"[{session.addr}] [PKT0x17] Error parsing packet: {e}, raw payload={data[4:].hex()}")
+        return
+    # Load class template
+    base_template = load_class_template(class_name)
+    new_char = copy.deepcopy(base_template)
+    # Apply the client-selected cosmetic choices
+    new_char.update({
+        "name": name,
+        "class": class_name,
+        "gender": gender,
+        "headSet": head,
+        "hairSet": hair,
+        "mouthSet": mouth,
+        "faceSet": face,
+        "hairColor": hair_color,
+        "skinColor": skin_color,
+        "shirtColor": shirt_color,
+        "pantColor": pant_color,
+    })
+    if not name_index.claim(name, session.user_id):
+        err_packet = build_popup_packet(
+            "Character name is unavailable. Please choose a new name.",
+            disconnect=False
+        )
+        conn.sendall(err_packet)
+        return
+    session.char_list.append(new_char)
+    save_characters(session.user_id, session.char_list)
+
+    # Send updated character list (0x15)
+    conn.sendall(build_login_character_list_bitpacked(session.char_list))
+    print(f"[{session.addr}] [PKT0x17] Sent 0x15 character list update")
+
+    # Send paperdoll packet (0x1A)
+    pd = build_paperdoll_packet(new_char)
+    conn.sendall(struct.pack(">HH", 0x1A, len(pd)) + pd)
+    print(f"[{session.addr}] [PKT0x17] Sent 0x1A paperdoll packet, len={len(pd)},")
+
+    # Send popup message (0x1B)
+    popup = build_popup_packet("Character Successfully Created", disconnect=False)
+    conn.sendall(popup)
+    print(f"[{session.addr}] [PKT0x17] Sent 0x1B popup message")
+
+@packet_handler(0x16)
+def handle_select_character(session, data):
+    name = BitReader(data[4:]).read_method_26()
+    for c in session.char_list:
+        if c["name"] == name:
+            session.current_character = name
+            current_level = c.get("CurrentLevel", {}).get("name", "CraftTown")
+            session.current_level = current_level
+            c["user_id"] = session.user_id
+            # Set default PreviousLevel if unset
+            prev_name = c.get("PreviousLevel", {}).get("name", "NewbieRoad")
+            tk = session.ensure_token(c, target_level=current_level, previous_level=prev_name)
+            session.clientEntID = tk
+            session_by_token[tk] = session
+            level_config = LEVEL_CONFIG.get(current_level, ("LevelsNR.swf/a_Level_NewbieRoad", 1, 1, False))
+            # detect hard mode (Dread levels)
+            is_hard = current_level.endswith("Hard")
+            new_moment = "Hard" if is_hard else ""
+            new_alter = "Hard" if is_hard else ""
+            zone_host, zone_port = zone_address(current_level)
+            pkt_out = build_enter_world_packet(
+                transfer_token=tk,
+                old_level_id=0,
+                old_swf="",
+                has_old_coord=False,
+                old_x=0,
+                old_y=0,
+                host=zone_host,
+                port=zone_port,
+                new_level_swf=level_config[0],
+                new_map_lvl=level_config[1],
+                new_base_lvl=level_config[2],
+                new_internal=current_level,
+                new_moment=new_moment,# momentParamsString
+                new_alter=new_alter, # alterParamsString
+                new_is_dungeon=level_config[3],
+                new_has_coord=False,
+                new_x=0,
+                new_y=0,
+                char=c
+            )
+            pending_world[tk] = (c, current_level, prev_name)
+            # Save updated char_list to ensure PreviousLevel is set
+            session.char_list = load_characters(session.user_id)
+            for i, char in enumerate(session.char_list):
+                if char["name"] == name:
+                    session.char_list[i] = c
+                    break
+            save_characters(session.user_id, session.char_list)
+            # publish before the client is told to connect, it may reach the other worker right away
+            hand_off_transfer(session, tk, c, current_level, prev_name)
+            session.conn.sendall(pkt_out)
+            print(f"[{session.addr}] Transfer begin: {name}, tk={tk}, level={current_level}")
+            break
+
+#TODO...
+#the 0x1f and 0x1D needs to be rewritten and organised since the code is a mess
+@packet_handler(0x1F)
+def handle_enter_world(session, data):
+    conn = session.conn
+    if len(data) < 6:
+        print(f"[{session.addr}] Error: Packet 0x1f too short, len={len(data)}")
+        return
+    token = int.from_bytes(data[4:6], 'big')
+
+    entry = used_tokens.get(token) or pending_world.get(token)
+    # do not pop; tokens are persistent now
+    if entry is None:
+        entry = claim_transfer(token)
+    if entry is None:
+        if len(pending_world) == 1:
+            token, entry = next(iter(pending_world.items()))
+        else:
+            print(f"[{session.addr}] Error: No entry found for token {token}, pending_world size={len(pending_world)}")
+            return
+    if len(entry) == 2:
+        char, target_level = entry
+        previous_level = session.current_level or char.get("PreviousLevel", {}).get("name", "NewbieRoad")
+    else:
+        char, target_level, previous_level = entry
+        if isinstance(previous_level, dict):
+            previous_level = previous_level.get("name", "NewbieRoad")
+    if char is None:
+        print(f"[{session.addr}] Error: Character is None for token {token}")
+        return
+    is_dungeon = LEVEL_CONFIG.get(target_level, (None, None, None, False))[3]
+    if is_dungeon:
+        session.entry_level = previous_level if previous_level else char.get("PreviousLevel", "NewbieRoad")
+    else:
+        session.entry_level = None
+    session.user_id = char["user_id"]
+    if not session.user_id:
+        print(f"[{session.addr}] Error: session.user_id is None for token {token}")
+        return
+    session.char_list = load_characters(session.user_id)
+    if session.char_list:
+        for i, c in enumerate(session.char_list):
+            if c["name"] == char["name"]:
+                session.char_list[i] = char
+                break
+        else:
+            session.char_list.append(char)
+    else:
+        session.char_list = [char]
+    save_characters(session.user_id, session.char_list)
+    print(f"[{session.addr}] Saved character {char['name']}: CurrentLevel={char['CurrentLevel']}, PreviousLevel={char.get('PreviousLevel')}")
+    pending_world.pop(token, None)
+    session.current_level = target_level
+    session.current_character = char["name"]
+    session.current_char_dict = char
+    current_characters[session.user_id] = session.current_character
+    session.authenticated = True
+    used_tokens[token] = (
+        char, target_level, session.current_level or char.get("PreviousLevel", "NewbieRoad"))
+    # Calculate coordinates for Player_Data_Packet
+    new_x, new_y, new_has_coord = get_spawn_coordinates(char, previous_level, target_level)
+    user_id = session.user_id  # however you’re tracking the account
+    send_ext = not extended_sent_map.get(user_id, {}).get("sent", False)
+    # CraftTown gets the whole inventory as 0xF5 for the Armory below
+    in_crafttown = bool(session.current_level and "crafttown" in session.current_level.lower())
+    welcome = build_player_data_packets(
+        char,
+        transfer_token=token,
+        target_level=target_level,
+        new_x=int(round(new_x)),
+        new_y=int(round(new_y)),
+        new_has_coord=new_has_coord,
+        send_extended=send_ext,
+        send_overflow=not in_crafttown
+    )
+    extended_sent_map[user_id] = {"sent": True, "last_seen": time.time()}
+    conn.sendall(b"".join(welcome))
+    session.clientEntID = token
+    print(f"[{session.addr}] Welcome: {char['name']} (token {token}) on level {session.current_level}, pos=({new_x},{new_y})")
+    if session.current_character and session.char_list:
+        char = next((c for c in session.char_list if c["name"] == session.current_character), None)
+        if char and in_crafttown:
+            gears_list = get_inventory_gears(char)
+            print(f"[{session.addr}] Sending 0xF5 packet with {len(gears_list)} gears for Armory")
+            conn.sendall(b"".join(build_level_gears_packets(gears_list)))
+        else:
+            print(f"[{session.addr}] Skipping 0xF5 packet: not in CraftTown or no character")
+    else:
+        print(f"[{session.addr}] Skipping 0xF5 packet: no character selected")
+    #TODO...
+    # Force NPC load temporarily For testing
+    # we will remove this and implement it properly once we are sure Send_Entity_Data is working properly
+    try:
+        burst, npcs = get_npc_spawn_burst(session.current_level)
+        if burst:
+            conn.sendall(burst)
+        for npc in npcs:
+            session.entities[npc["id"]] = npc
+            session.spawned_npcs.append(npc)
+
+        print(f"[{session.addr}] NPCs manually triggered after world update")
+    except Exception as e:
+        print(f"[{session.addr}] Error spawning NPCs: {e}")
+
+# Level Transfer request
+@packet_handler(0x1D)
+def handle_level_transfer(session, data):
+    br = BitReader(data[4:])
+    try:
+        _old_token = br.read_method_9()
+        level_name = br.read_method_13()
+    except Exception as e:
+        print(f"[{session.addr}] ERROR: Failed to parse 0x1D packet: {e}, raw payload = {data[4:].hex()}")
+        return
+
+    # 1) Pull the entry (no longer popped; tokens are persistent)
+    entry = used_tokens.get(_old_token) or pending_world.get(_old_token)
+    if not entry:
+        # try resolve by session token
+        s = session_by_token.get(_old_token)
+        if s:
+            entry = (
+            getattr(s, "current_char_dict", None) or {"name": s.current_character, "user_id": s.user_id},
+            s.current_level)
+    if not entry:
+        print(f"[{session.addr}] ERROR: No character for token {_old_token}")
+        return
+    # 2) Unpack character and target_level
+    char, target_level = entry[:2]
+    # 3) Snapshot the level we're leaving (extract name if it’s a dict)
+    raw = char.get("CurrentLevel")
+    if isinstance(raw, dict):
+        old_level = raw.get("name", session.current_level or "NewbieRoad")
+    else:
+        old_level = raw or session.current_level or "NewbieRoad"
+
+    # 4) Clear player’s entity from old level to reflect they’ve left
+    if session.clientEntID in session.entities:
+        del session.entities[session.clientEntID]
+        print(f"[{session.addr}] Removed entity {session.clientEntID} from level {old_level}")
+    # 5) Bootstrap session with this character
+    session.user_id = char.get("user_id")
+    if not session.user_id:
+        print(f"[{session.addr}] ERROR: char['user_id'] missing for {char['name']}")
+        return
+    session.char_list = load_characters(session.user_id)
+    session.current_character = char["name"]
+    session.authenticated = True
+    # 6) If the packet's level_name is empty, fallback
+    if not level_name:
+        level_name = target_level
+        print(f"[{session.addr}] WARNING: Empty level_name, using target_level={level_name}")
+    # 7) Update the character record
+    is_dungeon = LEVEL_CONFIG.get(level_name, (None, None, None, False))[3]
+
+    # 7a) Save current level’s coords to PreviousLevel
+    prev_rec = char.get("CurrentLevel", {})
+    prev_x = prev_rec.get("x", 0.0)
+    prev_y = prev_rec.get("y", 0.0)
+    char["PreviousLevel"] = {
+        "name": old_level,
+        "x": prev_x,
+        "y": prev_y
+    }
+    # 7b) Determine coordinates for the new level
+    new_x, new_y, new_has_coord = get_spawn_coordinates(char, old_level, level_name)
+    # 7c) Update CurrentLevel (skip coords for dungeons unless CraftTown)
+    if not is_dungeon or level_name == "CraftTown":
+        char["CurrentLevel"] = {"name": level_name, "x": new_x, "y": new_y}
+    save_characters(session.user_id, session.char_list)
+
+    # 8) Write back into session.char_list and save
+    for i, c in enumerate(session.char_list):
+        if c["name"] == char["name"]:
+            session.char_list[i] = char
+            break
+    else:
+        session.char_list.append(char)
+    save_characters(session.user_id, session.char_list)
+    print(f"[{session.addr}] Saved character {char['name']}: "f"CurrentLevel={char['CurrentLevel']}, PreviousLevel={char['PreviousLevel']}")
+
+    # 9) Update session.current_level
+    session.current_level = level_name
+    session.world_loaded = False
+    # 10) For testing purposes only; uncomment to broadcast level change, remove after testing
+    #broadcast_level_change(session, char["name"], level_name)
+    # 11) Issue the new transfer token
+
+    # Keep the same transfer token (persistent per session)
+    new_token = session.ensure_token(
+        char,
+        target_level=level_name,
+        previous_level=old_level
+    )
+    pending_world[new_token] = (char, level_name, old_level)
+    hand_off_transfer(session, new_token, char, level_name, old_level)
+
+    # 12) Build and send the ENTER_WORLD packet, including info about the level we just left
+    #    old_level     := the name of the level we departed
+    #    prev_rec      := char["PreviousLevel"] ⟶ {name, x, y}
+    #    old_swf       := its SWF path
+    #    old_has_coord := True if we have stored coords
+    old_name = old_level
+    prev_rec = char.get("PreviousLevel", {})
+    prev_x = prev_rec.get("x", 0)
+    prev_y = prev_rec.get("y", 0)
+    old_swf, _, _, old_is_inst = LEVEL_CONFIG.get(old_name, ("", 0, 0, False))
+    old_has_coord = ("x" in prev_rec and "y" in prev_rec)
+
+    swf_path, map_id, base_id, is_inst = LEVEL_CONFIG[level_name]
+    is_hard = level_name.endswith("Hard")
+    new_moment = "Hard" if is_hard else ""
+    new_alter = "Hard" if is_hard else ""
+    zone_host, zone_port = zone_address(level_name)
+
+    pkt_out = build_enter_world_packet(
+        transfer_token=new_token,
+        old_level_id=0,
+        # tell the client what we just left
+        old_swf = old_swf,
+        has_old_coord  = old_has_coord,
+        old_x = int(round(prev_x)),
+        old_y = int(round(prev_y)),
+
+        host=zone_host,
+        port=zone_port,
+        # New level the player is entering
+        new_level_swf=swf_path,
+        new_map_lvl=map_id,
+        new_base_lvl=base_id,
+        new_internal=level_name,
+        new_moment=new_moment,
+        new_alter=new_alter,
+        new_is_dungeon=is_inst,
+        new_has_coord=new_has_coord,
+        new_x=int(round(new_x)),
+        new_y=int(round(new_y)),
+        char=char,
+    )
+    session.conn.sendall(pkt_out)
+    print(f"[{session.addr}] Sent ENTER_WORLD with token {new_token} for level {level_name}, pos=({new_x},{new_y})")
+
+@packet_handler(0x2D)
+def handle_open_door(session, data):
+    br = BitReader(data[4:])
+    try:
+        door_id = br.read_method_9()
+    except Exception as e:
+        print(f"[{session.addr}] ERROR: Failed to parse 0x2D packet: {e}, raw payload = {data[4:].hex()}")
+        return
+    print(f"[{session.addr}] OpenDoor request: doorID={door_id}, current_level={session.current_level}")
+    is_dungeon = LEVEL_CONFIG.get(session.current_level, (None, None, None, False))[3]
+    # Determine target level
+    target_level = None
+    if is_dungeon and door_id in (0, 1, 2):
+        target_level = session.entry_level
+        if not target_level:
+            print(f"[{session.addr}] Error: No entry_level set for door {door_id} in dungeon {session.current_level}")
+
+            return
+    elif door_id == 999:
+        target_level = "CraftTown"
+    else:
+        target_level = DOOR_MAP.get((session.current_level, door_id))
+    if target_level:
+        if target_level not in LEVEL_CONFIG:
+            print(f"[{session.addr}] Error: Target level {target_level} not found in LEVEL_CONFIG")
+            return
+        # Send DOOR_TARGET response
+        bb = BitBuffer()
+        bb.write_method_4(door_id)
+        bb.write_method_13(target_level)
+        payload = bb.to_bytes()
+        resp = struct.pack(">HH", 0x2E, len(payload)) + payload
+        session.conn.sendall(resp)
+        print(f"[{session.addr}] Sent DOOR_TARGET: doorID={door_id}, level='{target_level}'")
+        # Reset world state
+        session.world_loaded = False
+        session.entities.clear()
+    else:
+        print(f"[{session.addr}] Error: No target for door {door_id} in level {session.current_level}")
+
+#@packet_handler(0x1E)  # MASTER_CLIENT (dev mode)
+#def handle_master_client(session, data):
+    #rd = BitReader(data[4:], debug=False)
+    #map_id = rd.read_method_9()
+    # = rd.read_method_15() == 1
+    #print(f"[DEBUG] MASTER_CLIENT: map_id={map_id}, first={is_first}")
+    # Always use dummy char in dev flow
+    #session.current_level = "NewbieRoad"  # or use DevSettings.standAloneMapInternalName if you parse it
+    #session.current_character = DEV_DUMMY_CHAR["name"]
+    #session.current_char_dict = DEV_DUMMY_CHAR
+    #session.user_id = "dev"
+    #player_packet = Player_Data_Packet(
+        #DEV_DUMMY_CHAR,
+        #transfer_token=map_id,
+        #send_extended=True,
+        #target_level=session.current_level
+    #)
+    #session.conn.sendall(player_packet)
+    #print(f"[DEBUG] Sent Player_Data_Packet (0x10) using DEV_DUMMY_CHAR")
+    # IMPORTANT: do NOT spawn NPCs in dev mode
+    # The client will handle spawning monsters/entities itself because
+    # DEVFLAG_MASTER_CLIENT + DEVFLAG_SPAWN_MONSTERS are set.
+
+
+# Client packets we deliberately drop
+# 0xCC: client sends this when a new skill is equipped, actual hotbar update follows in 0xBD.
+# 0x113: alert update (handle_alert_update not implemented yet)
+ignore_packets(0xA4, 0xCC, 0x113, 0x10E)
+
+
+def dispatch_packet(session, pkt, data):
+    """
+    Route one framed packet (header included) to its registered handler.
+    data is a memoryview from FrameReader, handlers that keep it past the
+    call may do so (see FrameReader) but should slice rather than mutate.
+    """
+    if not dispatch(session, pkt, data, all_sessions):
+        print(f"[{session.addr}] Unhandled packet type: 0x{pkt:02X}, raw payload = {data.hex()}")
+
 def handle_client(session: ClientSession):
     conn = session.conn
     addr = session.addr
     print("Connected:", addr)
     conn.settimeout(300)
 
-    tick_npc_brains(all_sessions)
-
     prune_extended_sent_map(timeout=2)
-    buffer = bytearray()
+    framer = FrameReader()
     try:
         while True:
             chunk = conn.recv(4096)
             if not chunk:
                 print(f"[{addr}] Connection closed by client")
                 break
-            buffer.extend(chunk)
-
-            # Try to extract complete packets
-            while len(buffer) >= 4:
-                # Peek header
-                pkt    = int.from_bytes(buffer[0:2], byteorder='big')
-                length = int.from_bytes(buffer[2:4], byteorder='big')
-                total  = 4 + length
-
-                # If we don’t yet have the full packet, wait for more data
-                if len(buffer) < total:
-                    break
-
-                # We have a full packet in buffer[0:total]
-                data    = bytes(buffer[:total])
-                payload = data[4:]
-                # Remove it from buffer
-                del buffer[:total]
-
-                # Debug‐print
-               #print(f"[{addr}] Framed pkt=0x{pkt:02X} length={length} payload_bytes={len(payload)}")
-
-                # Sanity check
-                if len(payload) != length:
-                    print(f"[{addr}] ⚠️ Length mismatch: header says {length} but payload is {len(payload)}")
-                    # continue
-
-            if pkt == 0x11:# Done
-                send_login_challenge(conn)
-                continue
-
-            elif pkt == 0x13:  # Done
-                br = BitReader(data[8:], debug=True)
-                email = br.read_method_26().strip().lower()
-                session.user_id = get_or_create_user_id(email)
-                session.char_list = load_characters(session.user_id)
-                session.authenticated = True
-                conn.sendall(build_login_character_list_bitpacked(session.char_list))
-
-            elif pkt == 0x14:  # Done
-                br = BitReader(data[4:], debug=True)
-                try:
-                    client_facebook_id = br.read_method_26()  # Facebook platform ID
-                    client_kongregate_id = br.read_method_26()  # Kongregate platform ID
-                    email = br.read_method_26().strip().lower()  # Primary login identifier
-                    password = br.read_method_26()  # Password or session token
-                    legacy_auth_key = br.read_method_26()  # Embed auth key / API key
-                except Exception as e:
-                    print(f"[{session.addr}] [PKT0x14] Error parsing packet: {e}, raw payload={data[4:].hex()}")
-                    continue
-                accounts = load_accounts()
-                user_id = accounts.get(email)
-                if not user_id:
-                    #print(f"[{session.addr}] [PKT0x14] Login failed—no account for {email}")
-                    conn.sendall(build_popup_packet("Account not found", disconnect=True))
-                    continue
-                session.user_id = user_id
-                try:
-                    with open(os.path.join(_SAVES_DIR, f"{session.user_id}.json"), "r", encoding="utf-8") as f:
-                        session.player_data = json.load(f)
-                except FileNotFoundError:
-                    session.player_data = {"email": email, "characters": []}
-                session.char_list = session.player_data.get("characters", [])
-                session.authenticated = True
-                conn.sendall(build_login_character_list_bitpacked(session.char_list))
-                print(f"[{session.addr}] [PKT0x14] Logged in {email} → user_id={user_id}, chars={len(session.char_list)}")
-
-
-
-            elif pkt == 0x17:
-                if not session.authenticated:
-                    err_packet = build_popup_packet("Please log in first", disconnect=True)
-                    conn.sendall(err_packet)
-                    continue
-                br = BitReader(data[4:], debug=True)
-                try:
-                    name = br.read_method_26()  # character name
-                    class_name = br.read_method_26()
-                    gender = br.read_method_26()
-                    head = br.read_method_26()
-                    hair = br.read_method_26()
-                    mouth = br.read_method_26()
-                    face = br.read_method_26()
-                    hair_color = br.read_method_20(EntType.CHAR_COLOR_BITSTOSEND)
-                    skin_color = br.read_method_20(EntType.CHAR_COLOR_BITSTOSEND)
-                    shirt_color = br.read_method_20(EntType.CHAR_COLOR_BITSTOSEND)
-                    pant_color = br.read_method_20(EntType.CHAR_COLOR_BITSTOSEND)
-                    print(f"[{session.addr}] [PKT0x17] Parsed character creation: "
-                          f"name={name}, class={class_name}, gender={gender}")
-                except Exception as e:
-                    print(f"[{session.addr}] [PKT0x17] Error parsing packet: {e}, raw payload={data[4:].hex()}")
-                    continue
-                if is_character_name_taken(name):
-                    err_packet = build_popup_packet(
-                        "Character name is unavailable. Please choose a new name.",
-                        disconnect=False
-                    )
-                    conn.sendall(err_packet)
-                    continue
-                # Load class template
-                base_template = load_class_template(class_name)
-                new_char = copy.deepcopy(base_template)
-                # Apply the client-selected cosmetic choices
-                new_char.update({
-                    "name": name,
-                    "class": class_name,
-                    "gender": gender,
-                    "headSet": head,
-                    "hairSet": hair,
-                    "mouthSet": mouth,
-                    "faceSet": face,
-                    "hairColor": hair_color,
-                    "skinColor": skin_color,
-                    "shirtColor": shirt_color,
-                    "pantColor": pant_color,
-                })
-                session.char_list.append(new_char)
-                save_characters(session.user_id, session.char_list)
-
-                # Send updated character list (0x15)
-                conn.sendall(build_login_character_list_bitpacked(session.char_list))
-                print(f"[{session.addr}] [PKT0x17] Sent 0x15 character list update")
-
-                # Send paperdoll packet (0x1A)
-                pd = build_paperdoll_packet(new_char)
-                conn.sendall(struct.pack(">HH", 0x1A, len(pd)) + pd)
-                print(f"[{session.addr}] [PKT0x17] Sent 0x1A paperdoll packet, len={len(pd)},")
-
-                # Send popup message (0x1B)
-                popup = build_popup_packet("Character Successfully Created", disconnect=False)
-                conn.sendall(popup)
-                print(f"[{session.addr}] [PKT0x17] Sent 0x1B popup message")
-
-
-            elif pkt == 0x16:
-                name = BitReader(data[4:]).read_method_26()
-                for c in session.char_list:
-                    if c["name"] == name:
-                        session.current_character = name
-                        current_level = c.get("CurrentLevel", {}).get("name", "CraftTown")
-                        session.current_level = current_level
-                        c["user_id"] = session.user_id
-                        # Set default PreviousLevel if unset
-                        prev_name = c.get("PreviousLevel", {}).get("name", "NewbieRoad")
-                        tk = session.ensure_token(c, target_level=current_level, previous_level=prev_name)
-                        session.clientEntID = tk
-                        session_by_token[tk] = session
-                        _level_add(current_level, session)
-                        level_config = LEVEL_CONFIG.get(current_level, ("LevelsNR.swf/a_Level_NewbieRoad", 1, 1, False))
-                        # detect hard mode (Dread levels)
-                        is_hard = current_level.endswith("Hard")
-                        new_moment = "Hard" if is_hard else ""
-                        new_alter = "Hard" if is_hard else ""
-                        pkt_out = build_enter_world_packet(
-                            transfer_token=tk,
-                            old_level_id=0,
-                            old_swf="",
-                            has_old_coord=False,
-                            old_x=0,
-                            old_y=0,
-                            host="127.0.0.1",
-                            port=8080,
-                            new_level_swf=level_config[0],
-                            new_map_lvl=level_config[1],
-                            new_base_lvl=level_config[2],
-                            new_internal=current_level,
-                            new_moment=new_moment,# momentParamsString
-                            new_alter=new_alter, # alterParamsString
-                            new_is_dungeon=level_config[3],
-                            new_has_coord=False,
-                            new_x=0,
-                            new_y=0,
-                            char=c
-                        )
-                        session.conn.sendall(pkt_out)
-                        pending_world[tk] = (c, current_level, prev_name)
-                        # Save updated char_list to ensure PreviousLevel is set
-                        session.char_list = load_characters(session.user_id)
-                        for i, char in enumerate(session.char_list):
-                            if char["name"] == name:
-                                session.char_list[i] = c
-                                break
-                        save_characters(session.user_id, session.char_list)
-                        print(f"[{session.addr}] Transfer begin: {name}, tk={tk}, level={current_level}")
-                        break
-            #TODO...
-            #the 0x1f and 0x1D needs to be rewritten and organised since the code is a mess
-            elif pkt == 0x1f:
-                if len(data) < 6:
-                    print(f"[{session.addr}] Error: Packet 0x1f too short, len={len(data)}")
-                    continue
-                token = int.from_bytes(data[4:6], 'big')
-
-                entry = used_tokens.get(token) or pending_world.get(token)
-                # do not pop; tokens are persistent now
-                if entry is None:
-                    if len(pending_world) == 1:
-                        token, entry = next(iter(pending_world.items()))
-                    else:
-                        print(f"[{session.addr}] Error: No entry found for token {token}, pending_world size={len(pending_world)}")
-                        continue
-                if len(entry) == 2:
-                    char, target_level = entry
-                    previous_level = session.current_level or char.get("PreviousLevel", {}).get("name", "NewbieRoad")
-                else:
-                    char, target_level, previous_level = entry
-                    if isinstance(previous_level, dict):
-                        previous_level = previous_level.get("name", "NewbieRoad")
-                if char is None:
-                    print(f"[{session.addr}] Error: Character is None for token {token}")
-                    continue
-                is_dungeon = LEVEL_CONFIG.get(target_level, (None, None, None, False))[3]
-                if is_dungeon:
-                    session.entry_level = previous_level if previous_level else char.get("PreviousLevel", "NewbieRoad")
-                else:
-                    session.entry_level = None
-                session.user_id = char["user_id"]
-                if not session.user_id:
-                    print(f"[{session.addr}] Error: session.user_id is None for token {token}")
-                    continue
-                session.char_list = load_characters(session.user_id)
-                if session.char_list:
-                    for i, c in enumerate(session.char_list):
-                        if c["name"] == char["name"]:
-                            session.char_list[i] = char
-                            break
-                    else:
-                        session.char_list.append(char)
-                else:
-                    session.char_list = [char]
-                save_characters(session.user_id, session.char_list)
-                print(f"[{session.addr}] Saved character {char['name']}: CurrentLevel={char['CurrentLevel']}, PreviousLevel={char.get('PreviousLevel')}")
-                pending_world.pop(token, None)
-                session.current_level = target_level
-                session.current_character = char["name"]
-                session.current_char_dict = char
-                current_characters[session.user_id] = session.current_character
-                session.authenticated = True
-                used_tokens[token] = (
-                    char, target_level, session.current_level or char.get("PreviousLevel", "NewbieRoad"))
-                # Calculate coordinates for Player_Data_Packet
-                new_x, new_y, new_has_coord = get_spawn_coordinates(char, previous_level, target_level)
-                user_id = session.user_id  # however you’re tracking the account
-                send_ext = not extended_sent_map.get(user_id, {}).get("sent", False)
-                welcome = Player_Data_Packet(
-                    char,
-                    transfer_token=token,
-                    target_level=target_level,
-                    new_x=int(round(new_x)),
-                    new_y=int(round(new_y)),
-                    new_has_coord=new_has_coord,
-                    send_extended=send_ext
-                )
-                extended_sent_map[user_id] = {"sent": True, "last_seen": time.time()}
-                conn.sendall(welcome)
-                session.clientEntID = token
-                print(f"[{session.addr}] Welcome: {char['name']} (token {token}) on level {session.current_level}, pos=({new_x},{new_y})")
-                if session.current_character and session.char_list:
-                    char = next((c for c in session.char_list if c["name"] == session.current_character), None)
-                    if char and session.current_level and "crafttown" in session.current_level.lower():
-                        gears_list = get_inventory_gears(char)
-                        print(f"[{session.addr}] Sending 0xF5 packet with {len(gears_list)} gears for Armory")
-                        packet = build_level_gears_packet(gears_list)
-                        conn.sendall(packet)
-                    else:
-                        print(f"[{session.addr}] Skipping 0xF5 packet: not in CraftTown or no character")
-                else:
-                    print(f"[{session.addr}] Skipping 0xF5 packet: no character selected")
-                #TODO...
-                # Force NPC load temporarily For testing
-                # we will remove this and implement it properly once we are sure Send_Entity_Data is working properly
-                try:
-                    npcs = load_npc_data_for_level(session.current_level)
-                    for npc in npcs:
-                        payload = Send_Entity_Data(npc)
-                        conn.sendall(struct.pack(">HH", 0x0F, len(payload)) + payload)
-                        session.entities[npc["id"]] = npc
-                        session.spawned_npcs.append(npc)
-
-                    print(f"[{session.addr}] NPCs manually triggered after world update")
-                except Exception as e:
-                    print(f"[{session.addr}] Error spawning NPCs: {e}")
-
-            # Level Transfer request
-            elif pkt == 0x1D:
-                br = BitReader(data[4:])
-                try:
-                    _old_token = br.read_method_9()
-                    level_name = br.read_method_13()
-                except Exception as e:
-                    print(f"[{session.addr}] ERROR: Failed to parse 0x1D packet: {e}, raw payload = {data[4:].hex()}")
-                    continue
-
-                # 1) Pull the entry (no longer popped; tokens are persistent)
-                entry = used_tokens.get(_old_token) or pending_world.get(_old_token)
-                if not entry:
-                    # try resolve by session token
-                    s = session_by_token.get(_old_token)
-                    if s:
-                        entry = (
-                        getattr(s, "current_char_dict", None) or {"name": s.current_character, "user_id": s.user_id},
-                        s.current_level)
-                if not entry:
-                    print(f"[{session.addr}] ERROR: No character for token {_old_token}")
-                    continue
-                # 2) Unpack character and target_level
-                char, target_level = entry[:2]
-                # 3) Snapshot the level we're leaving (extract name if it’s a dict)
-                raw = char.get("CurrentLevel")
-                if isinstance(raw, dict):
-                    old_level = raw.get("name", session.current_level or "NewbieRoad")
-                else:
-                    old_level = raw or session.current_level or "NewbieRoad"
-
-                # 4) Clear player’s entity from old level to reflect they’ve left
-                if session.clientEntID in session.entities:
-                    del session.entities[session.clientEntID]
-                    print(f"[{session.addr}] Removed entity {session.clientEntID} from level {old_level}")
-                # 5) Bootstrap session with this character
-                session.user_id = char.get("user_id")
-                if not session.user_id:
-                    print(f"[{session.addr}] ERROR: char['user_id'] missing for {char['name']}")
-                    continue
-                session.char_list = load_characters(session.user_id)
-                session.current_character = char["name"]
-                session.authenticated = True
-                # 6) If the packet's level_name is empty, fallback
-                if not level_name:
-                    level_name = target_level
-                    print(f"[{session.addr}] WARNING: Empty level_name, using target_level={level_name}")
-                # 7) Update the character record
-                is_dungeon = LEVEL_CONFIG.get(level_name, (None, None, None, False))[3]
-
-                # 7a) Save current level’s coords to PreviousLevel
-                prev_rec = char.get("CurrentLevel", {})
-                prev_x = prev_rec.get("x", 0.0)
-                prev_y = prev_rec.get("y", 0.0)
-                char["PreviousLevel"] = {
-                    "name": old_level,
-                    "x": prev_x,
-                    "y": prev_y
-                }
-                # 7b) Determine coordinates for the new level
-                new_x, new_y, new_has_coord = get_spawn_coordinates(char, old_level, level_name)
-                # 7c) Update CurrentLevel (skip coords for dungeons unless CraftTown)
-                if not is_dungeon or level_name == "CraftTown":
-                    char["CurrentLevel"] = {"name": level_name, "x": new_x, "y": new_y}
-                save_characters(session.user_id, session.char_list)
-
-                # 8) Write back into session.char_list and save
-                for i, c in enumerate(session.char_list):
-                    if c["name"] == char["name"]:
-                        session.char_list[i] = char
-                        break
-                else:
-                    session.char_list.append(char)
-                save_characters(session.user_id, session.char_list)
-                print(f"[{session.addr}] Saved character {char['name']}: "f"CurrentLevel={char['CurrentLevel']}, PreviousLevel={char['PreviousLevel']}")
-
-                # 9) Update session.current_level
-                session.current_level = level_name
-                session.world_loaded = False
-                # 10) For testing purposes only; uncomment to broadcast level change, remove after testing
-                #broadcast_level_change(session, char["name"], level_name)
-                # 11) Issue the new transfer token
-
-                # Keep the same transfer token (persistent per session)
-                new_token = session.ensure_token(
-                    char,
-                    target_level=level_name,
-                    previous_level=old_level
-                )
-                pending_world[new_token] = (char, level_name, old_level)
-
-                # 12) Build and send the ENTER_WORLD packet, including info about the level we just left
-                #    old_level     := the name of the level we departed
-                #    prev_rec      := char["PreviousLevel"] ⟶ {name, x, y}
-                #    old_swf       := its SWF path
-                #    old_has_coord := True if we have stored coords
-                old_name = old_level
-                prev_rec = char.get("PreviousLevel", {})
-                prev_x = prev_rec.get("x", 0)
-                prev_y = prev_rec.get("y", 0)
-                old_swf, _, _, old_is_inst = LEVEL_CONFIG.get(old_name, ("", 0, 0, False))
-                old_has_coord = ("x" in prev_rec and "y" in prev_rec)
-
-                swf_path, map_id, base_id, is_inst = LEVEL_CONFIG[level_name]
-                is_hard = level_name.endswith("Hard")
-                new_moment = "Hard" if is_hard else ""
-                new_alter = "Hard" if is_hard else ""
-
-                pkt_out = build_enter_world_packet(
-                    transfer_token=new_token,
-                    old_level_id=0,
-                    # tell the client what we just left
-                    old_swf = old_swf,
-                    has_old_coord  = old_has_coord,
-                    old_x = int(round(prev_x)),
-                    old_y = int(round(prev_y)),
-
-                    host="127.0.0.1",
-                    port=8080,
-                    # New level the player is entering
-                    new_level_swf=swf_path,
-                    new_map_lvl=map_id,
-                    new_base_lvl=base_id,
-                    new_internal=level_name,
-                    new_moment=new_moment,
-                    new_alter=new_alter,
-                    new_is_dungeon=is_inst,
-                    new_has_coord=new_has_coord,
-                    new_x=int(round(new_x)),
-                    new_y=int(round(new_y)),
-                    char=char,
-                )
-                session.conn.sendall(pkt_out)
-                print(f"[{session.addr}] Sent ENTER_WORLD with token {new_token} for level {level_name}, pos=({new_x},{new_y})")
-
-            elif pkt == 0x2D:
-                br = BitReader(data[4:])
-                try:
-                    door_id = br.read_method_9()
-                except Exception as e:
-                    print(f"[{session.addr}] ERROR: Failed to parse 0x2D packet: {e}, raw payload = {data[4:].hex()}")
-                    continue
-                print(f"[{session.addr}] OpenDoor request: doorID={door_id}, current_level={session.current_level}")
-                is_dungeon = LEVEL_CONFIG.get(session.current_level, (None, None, None, False))[3]
-                # Determine target level
-                target_level = None
-                if is_dungeon and door_id in (0, 1, 2):
-                    target_level = session.entry_level
-                    if not target_level:
-                        print(f"[{session.addr}] Error: No entry_level set for door {door_id} in dungeon {session.current_level}")
-
-                        continue
-                elif door_id == 999:
-                    target_level = "CraftTown"
-                else:
-                    target_level = DOOR_MAP.get((session.current_level, door_id))
-                if target_level:
-                    if target_level not in LEVEL_CONFIG:
-                        print(f"[{session.addr}] Error: Target level {target_level} not found in LEVEL_CONFIG")
-                        continue
-                    # Send DOOR_TARGET response
-                    bb = BitBuffer()
-                    bb.write_method_4(door_id)
-                    bb.write_method_13(target_level)
-                    payload = bb.to_bytes()
-                    resp = struct.pack(">HH", 0x2E, len(payload)) + payload
-                    session.conn.sendall(resp)
-                    print(f"[{session.addr}] Sent DOOR_TARGET: doorID={door_id}, level='{target_level}'")
-                    # Reset world state
-                    session.world_loaded = False
-                    session.entities.clear()
-                else:
-                    print(f"[{session.addr}] Error: No target for door {door_id} in level {session.current_level}")
-
-            #elif pkt == 0x1E:  # MASTER_CLIENT (dev mode)
-                #rd = BitReader(data[4:], debug=False)
-                #map_id = rd.read_method_9()
-                # = rd.read_method_15() == 1
-                #print(f"[DEBUG] MASTER_CLIENT: map_id={map_id}, first={is_first}")
-                # Always use dummy char in dev flow
-                #session.current_level = "NewbieRoad"  # or use DevSettings.standAloneMapInternalName if you parse it
-                #session.current_character = DEV_DUMMY_CHAR["name"]
-                #session.current_char_dict = DEV_DUMMY_CHAR
-                #session.user_id = "dev"
-                #player_packet = Player_Data_Packet(
-                    #DEV_DUMMY_CHAR,
-                    #transfer_token=map_id,
-                    #send_extended=True,
-                    #target_level=session.current_level
-                #)
-                #session.conn.sendall(player_packet)
-                #print(f"[DEBUG] Sent Player_Data_Packet (0x10) using DEV_DUMMY_CHAR")
-                # IMPORTANT: do NOT spawn NPCs in dev mode
-                # The client will handle spawning monsters/entities itself because
-                # DEVFLAG_MASTER_CLIENT + DEVFLAG_SPAWN_MONSTERS are set.
-
-            elif pkt == 0xA4:
-                pass
-
-            # Level & Door related packets
-            ###################################
-            elif pkt == 0x41:
-                handle_request_door_state(session, data, conn)
-            elif pkt == 0x7D:
-                handle_change_offset_y(session, data)
-            ###################################
-
-            #Entity Update Related packets
-            ###################################
-            elif pkt == 0x07:# Done
-                handle_entity_incremental_update(session, data, all_sessions)
-            elif pkt == 0xA2:# Done
-                handle_linkupdater(session, data, all_sessions)
-            elif pkt == 0x09:# Done
-                handle_power_cast(session, data, all_sessions)
-            elif pkt == 0x08:  # Done
-                handle_entity_full_update(session, data, all_sessions)
-            ###################################
-
-
-              # Combat Related packets
-            ############################################
-            elif pkt == 0x0D: # Done
-               handle_entity_destroy(session, data, all_sessions)
-            elif pkt == 0x79: # Done
-               PKTTYPE_BUFF_TICK_DOT(session, data, all_sessions)
-            elif pkt == 0x82: # Done
-               handle_respawn_ack(session, data, all_sessions)
-            elif pkt == 0x77:# Done
-                handle_request_respawn(session, data, all_sessions)
-            elif pkt == 0x2A:
-                handle_grant_reward(session, data, all_sessions)
-            elif pkt == 0x0A:# Done
-                handle_power_hit(session, data, all_sessions)
-            elif pkt == 0x0E:# Done
-                handle_projectile_explode(session, data, all_sessions)
-            elif pkt == 0x0B:# Done
-                handle_add_buff(session, data, all_sessions)
-            elif pkt == 0x0C:# Done
-                handle_remove_buff(session, data, all_sessions)
-            elif pkt == 0x8A:
-                handle_change_max_speed(session, data, all_sessions)
-            ############################################
-
-
-            #Login Screen
-            ############################################
-            elif pkt == 0x19:# Done
-                PaperDoll_Request(session, data, conn)
-            ############################################
-
-
-            #Chatting messages NPC talking Emotes etc...
-            ############################################
-            elif pkt == 0x2C:# Done
-                handle_public_chat(session, data, all_sessions)
-            elif pkt == 0xC5:# Done
-                handle_start_skit(session, data,all_sessions)
-            elif pkt == 0x46:# Done
-                handle_private_message(session, data, all_sessions)
-            elif pkt == 0x7E:# Done
-               handle_emote_begin(session, data, all_sessions)
-            elif pkt == 0x113:
-                #handle_alert_update(session, data)
-                pass
-            elif pkt == 0x7A:
-                handle_talk_to_npc(session, data, all_sessions)
-                pass
-            ############################################
-
-
-            # Group Related packets
-            ############################################
-            elif pkt == 0x65:# Done
-                handle_group_invite(session, data, all_sessions)
-            ############################################
-
-
-            # Skill Related packets
-            ############################################
-            elif pkt == 0xBD:# Done
-                handle_hotbar_packet(session, data)  # Equipped skills
-            elif pkt == 0xCC:# Done
-                # Client sends this when a new skill is equipped,
-                # actual hotbar update follows in 0xBD.
-                pass
-            elif pkt == 0xBE:# Done
-                Start_Skill_Research(session, data, conn)
-            elif pkt == 0xD1:# Done
-                handle_research_claim(session)
-            elif pkt == 0xDD:# Done
-                Skill_Research_Cancell_Request(session)
-            elif pkt == 0xDE:# Done
-                Skill_SpeedUp(session, data)
-            ############################################
-
-
-            # Entity Visuals related packets
-            ############################################
-            elif pkt == 0x8E:# Done
-                handle_change_look(session, data, all_sessions)
-            elif pkt == 0xBA:# Done
-                payload = data[4:]
-                handle_apply_dyes(session, payload)
-            ############################################
-
-
-           # Barn and pets related packets
-            ############################################
-            elif pkt == 0xB2:# Done
-                handle_mount_equip_packet(session, data, all_sessions)
-            elif pkt == 0xB3:# Done
-                handle_pet_info_packet(session, data, all_sessions)
-            elif pkt == 0xEA:
-                handle_collect_hatched_egg(session, data)
-                pass
-            ############################################
-
-
-            # Gear Set Related Packets
-            ############################################
-            elif pkt == 0xC8:# Done
-                handle_name_gearset(session, data)
-            elif pkt == 0xC7:# Done
-                handle_create_gearset(session, data)
-            elif pkt == 0xC6:# Done
-                handle_apply_gearset(session, data)
-            ############################################
-
-
-            # Gear Related packets
-            ############################################
-            elif pkt == 0xB0:# Done
-                handle_rune_packet(session, data) # equips runes on weapon slots
-            elif pkt == 0x31:# Done
-                handle_gear_packet(session, data)
-            elif pkt == 0x30:# Done
-                handle_update_equipment(session, data)
-            ############################################
-
-
-            #TODO...
-            # Forge related packets
-            ############################################
-            elif pkt == 0xE2:
-                magic_forge_packet(session, data)
-            elif pkt == 0xD0:
-                collect_forge_charm(session, data)
-            elif pkt == 0xB1:
-                start_forge_packet(session, data)
-            elif pkt == 0xE1:
-                cancel_forge_packet(session, data)
-            elif pkt == 0x110:
-                use_forge_xp_consumable(session, data)
-            elif pkt == 0xD3:
-                allocate_talent_points(session, data)
-            ############################################
-
-
-            ############################################
-            elif pkt == 0xD2 :# Done
-                handle_respec_talent_tree(session, data)
-            elif pkt == 0xC0:# Done
-                allocate_talent_tree_points(session,data)
-            elif pkt == 0xD6:# Done
-                handle_talent_claim(session, data)
-            elif pkt == 0xE0:# Done
-                handle_talent_speedup(session, data)
-            elif pkt == 0xD4:# Done
-                handle_train_talent_point(session, data)
-            elif pkt == 0xDF:# Done
-                handle_clear_talent_research(session, data)
-            ############################################
-
-
-            # LockBox related packets
-            ###################################
-            elif pkt == 0x107:
-                payload = data[4:]
-                handle_lockbox_reward(session)
-            ###################################
-
-
-            # Master class related packets
-            ############################################
-            elif pkt == 0xC3:# Done
-                handle_masterclass_packet(session, data)
-            ############################################
-
-
-            # client crash Reports
-            ############################################
-            elif pkt == 0x7C:
-                Client_Crash_Reports(session, data)
-            ############################################
-
-
-            # Buildings Upgrade packets
-            ############################################
-            elif pkt == 0xDB:# Done
-                handle_cancel_upgrade(session, data)
-            elif pkt == 0xDC:# Done
-                handle_speedup_request(session, data)
-            elif pkt == 0xD7:# Done
-                handle_building_upgrade(session, data)
-            elif pkt == 0xD9:# Done
-                handle_building_claim(session, data)
-            ############################################
-
-
-
-
-            elif pkt == 0xF0:
-                handle_volume_enter(session, data)
-            elif pkt == 0xBB:
-                handle_hp_increase_notice(session, data)
-                pass
-            elif pkt == 0x78:
-                handle_char_regen(session, data)
-                pass
-            elif pkt == 0x10E:
-                pass
-
-            else:
-                print(f"[{session.addr}] Unhandled packet type: 0x{pkt:02X}, raw payload = {data.hex()}")
+            framer.feed(chunk)
+            for pkt, data in framer.frames():
+                dispatch_packet(session, pkt, data)
     except Exception as e:
         print("Session error:", e)
     finally:
@@ -928,23 +753,209 @@ def start_server(port):
 def accept_connections(s, port):
     while True:
         conn, addr = s.accept()
-        session = ClientSession(conn, addr)
+        session = ClientSession(OutboundQueue(conn, addr), addr)
         all_sessions.append(session)
         threading.Thread(target=handle_client, args=(session,), daemon=True).start()
 
-def start_servers():
+def start_servers(ports=None):
     servers = []
-    for port in PORTS:
+    for port in ports or PORTS:
         server = start_server(port)
         if server:
             servers.append((server, port))
             threading.Thread(target=accept_connections, args=(server, port), daemon=True).start()
     return servers
 
+
+# asyncio serving mode
+###################################
+async def handle_client_async(reader, writer):
+    addr = writer.get_extra_info("peername")
+    session = ClientSession(StreamConnection(writer, asyncio.get_running_loop(), addr), addr)
+    all_sessions.append(session)
+    print("Connected:", addr)
+
+    prune_extended_sent_map(timeout=2)
+    framer = FrameReader()
+    try:
+        while True:
+            chunk = await asyncio.wait_for(reader.read(4096), timeout=300)
+            if not chunk:
+                print(f"[{addr}] Connection closed by client")
+                break
+            framer.feed(chunk)
+            for pkt, data in framer.frames():
+                dispatch_packet(session, pkt, data)
+
+            await writer.drain()
+    except Exception as e:
+        print("Session error:", e)
+    finally:
+        print("Disconnect:", addr)
+        session.stop()
+
+
+async def start_async_servers(ports=None):
+    servers = []
+    for port in ports or PORTS:
+        try:
+            server = await asyncio.start_server(handle_client_async, HOST, port)
+        except OSError as e:
+            print(f"Error: Cannot bind to port {port}. {e}")
+            continue
+        servers.append(server)
+        print(f"Server listening on {HOST}:{port} (asyncio)")
+    # the loop only holds tasks weakly, keep ours until the servers stop
+    simulation_task = asyncio.create_task(simulation.run_async())
+    try:
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+    finally:
+        simulation_task.cancel()
+        try:
+            await simulation_task
+        except asyncio.CancelledError:
+            pass
+
+
+def serve_forever(mode="threaded", ports=None):
+    """Run the game servers in the given mode until interrupted."""
+    char_store.start_flusher()
+    start_compactor()
+    if mode == "asyncio":
+        try:
+            asyncio.run(start_async_servers(ports))
+        finally:
+            checkpoints.flush_all()
+            char_store.flush_all()
+        return
+    servers = start_servers(ports)
+    simulation.start_thread()
+    try:
+        while True:
+            time.sleep(1)
+    finally:
+        for server, port in servers:
+            server.close()
+        checkpoints.flush_all()
+        char_store.flush_all()
+###################################
+
+
+# Zone-server mode
+###################################
+def apply_options(options):
+    """Runtime tuning from the command line (zone workers get the same dict)."""
+    if options.get("interest_radius") is not None:
+        interest.configure(options["interest_radius"], options.get("interest_hysteresis"))
+    if options.get("tick_rate") is not None:
+        simulation.configure(options["tick_rate"])
+    if options.get("batch_updates"):
+        batching.configure(True)
+    if options.get("trace") is not None:
+        opcodes = [int(op, 16) for op in options["trace"].split(",") if op.strip()]
+        tracing.enable(opcodes, options.get("trace_sessions"))
+    if options.get("validate_forwarded") is not None or options.get("validate_sample") is not None:
+        opcodes = [int(op, 16) for op in (options.get("validate_forwarded") or "").split(",") if op.strip()]
+        forwarding.configure(opcodes, options.get("validate_sample"))
+    if options.get("save_interval") is not None:
+        char_store.configure(options["save_interval"])
+    if options.get("checkpoint_interval") is not None:
+        checkpoints.configure(options["checkpoint_interval"])
+    if options.get("storage") is not None:
+        storage.configure(options["storage"], options.get("db"))
+
+
+def run_zone_worker(index, port, level_ports, hub_port, service_address, authkey, mode, options=None):
+    """Entry point of one zone worker process."""
+    apply_options(options or {})
+    zones.configure(index, HOST, port, level_ports, hub_port, service_address, authkey)
+    if index == 0:
+        boot_scan_all_saves()
+    owned = sum(1 for p in level_ports.values() if p == port)
+    print(f"[Zone {index}] {owned} levels on {HOST}:{port}")
+    # the parent stops workers with terminate(), exit normally so unsaved characters get written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        serve_forever(mode, [port])
+    except KeyboardInterrupt:
+        pass
+
+
+def run_zone_servers(workers, mode="threaded", base_port=None, options=None):
+    """
+    Split LEVEL_CONFIG over `workers` processes on consecutive ports starting
+    at base_port (worker 0 owns the hub levels and takes the logins).
+    """
+    base_port = base_port or PORTS[0]
+    ctx = multiprocessing.get_context("spawn")
+    manager, address, authkey = zones.start_token_service(ctx)
+    groups = zones.plan_zones(LEVEL_CONFIG, workers)
+    level_ports = {name: base_port + i for i, names in enumerate(groups) for name in names}
+
+    procs = []
+    for i in range(workers):
+        p = ctx.Process(target=run_zone_worker, name=f"zone-{i}", daemon=True,
+                        args=(i, base_port + i, level_ports, base_port, address, authkey, mode, options))
+        p.start()
+        procs.append(p)
+    try:
+        while all(p.is_alive() for p in procs):
+            time.sleep(1)
+        print("A zone worker exited, shutting down zone servers")
+    finally:
+        for p in procs:
+            p.terminate()
+        manager.shutdown()
+###################################
+
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="Dungeon Blitz server")
+    parser.add_argument("--mode", choices=("threaded", "asyncio"), default=SERVER_MODE,
+                        help="serve clients with one thread each or on a single asyncio event loop")
+    parser.add_argument("--port", type=int, action="append", dest="ports",
+                        help=f"game server port, repeatable (default: {PORTS})")
+    parser.add_argument("--zones", type=int, default=1, metavar="N",
+                        help="split the levels over N worker processes on consecutive ports")
+    parser.add_argument("--interest-radius", type=int, default=None, metavar="UNITS",
+                        help="only send entity updates to players this close (0 = whole level, the default)")
+    parser.add_argument("--interest-hysteresis", type=int, default=None, metavar="UNITS",
+                        help=f"extra distance before an entity in view is dropped (default: {interest.INTEREST_HYSTERESIS})")
+    parser.add_argument("--tick-rate", type=int, default=None, metavar="HZ",
+                        help=f"NPC simulation ticks per second (default: {simulation.TICK_RATE})")
+    parser.add_argument("--batch-updates", action="store_true",
+                        help="send entity updates once per simulation tick, one write per player")
+    parser.add_argument("--trace", nargs="?", const="", default=None, metavar="OPCODES",
+                        help="keep BitBuffer/BitReader debug logs, for all packets or e.g. 0x07,0x08")
+    parser.add_argument("--trace-session", action="append", dest="trace_sessions", metavar="NAME",
+                        help="only trace packets of this character, user id or address, repeatable")
+    parser.add_argument("--validate-forwarded", default=None, metavar="OPCODES",
+                        help="fully parse these forwarded packets (e.g. 0x09,0x0A) and drop malformed ones")
+    parser.add_argument("--validate-sample", type=int, default=None, metavar="N",
+                        help="also fully parse 1 in N of the other forwarded packets (default: never)")
+    parser.add_argument("--save-interval", type=float, default=None, metavar="SECONDS",
+                        help=f"write changed saves every SECONDS, 0 = on every save (default: {char_store.FLUSH_INTERVAL})")
+    parser.add_argument("--checkpoint-interval", type=float, default=None, metavar="SECONDS",
+                        help=f"save a moving player's position every SECONDS (default: {checkpoints.CHECKPOINT_INTERVAL})")
+    parser.add_argument("--rebuild-name-index", action="store_true",
+                        help="rebuild CharacterNames.json from the saves before starting")
+    parser.add_argument("--storage", choices=sorted(storage.BACKENDS), default=None,
+                        help="where accounts and characters are kept (default: json, saves/ and Accounts.json)")
+    parser.add_argument("--db", default=None, metavar="PATH",
+                        help=f"SQLite database for --storage sqlite and --migrate-saves (default: {storage.DB_PATH})")
+    parser.add_argument("--migrate-saves", action="store_true",
+                        help="import saves/ and Accounts.json into the SQLite database, then exit")
+    args = parser.parse_args()
+    options = vars(args)
+    if args.migrate_saves:
+        storage.migrate_json_to_sqlite(args.db or storage.DB_PATH)
+        sys.exit(0)
+    apply_options(options)
+    if args.rebuild_name_index:
+        name_index.rebuild()
+
     start_policy_server(host="127.0.0.1", port=843)
     start_static_server(host="127.0.0.1", port=80, directory="content/localhost")
-    servers = start_servers()
     print("For Browser running on : http://localhost/index.html")
     print("For Flash Projector running on : http://localhost/p/cbv/DungeonBlitz.swf?fv=cbq&gv=cbv")
 
@@ -952,10 +963,11 @@ if __name__ == "__main__":
     #threading.Thread(target=run_admin_panel, args=(lambda: all_sessions, 5000)).start()
     #print("Debug Panel running on http://127.0.0.1:5000/")
     try:
-        while True:
-            time.sleep(1)
+        if args.zones > 1:
+            run_zone_servers(args.zones, args.mode, args.ports[0] if args.ports else None, options)
+        else:
+            boot_scan_all_saves()
+            serve_forever(args.mode, args.ports)
     except KeyboardInterrupt:
         print("Shutting down servers...")
-        for server, port in servers:
-            server.close()
         sys.exit(0)
@@ -0,0 +1,151 @@
+"""
+Fixed-rate simulation loop.
+
+Every 1/TICK_RATE seconds each level with at least one loaded player gets
+one NPC brain tick (Brain.tick_level_brains), then the entity updates
+batched during the tick are flushed (see batching.py). Levels nobody is
+in cost nothing. A tick that takes longer than the period counts as an
+overrun and the next tick starts right away instead of trying to catch up.
+
+Threaded mode runs the loop on its own thread; asyncio mode runs it as a
+task on the event loop, next to the packet handlers.
+"""
+import asyncio
+import threading
+import time
+
+import batching
+from Brain import tick_level_brains
+from levels import level_registry
+
+TICK_RATE = 10  # Hz
+
+_stats_lock = threading.Lock()
+_stats = {
+    "ticks": 0,
+    "overruns": 0,
+    "levels_ticked": 0,
+    "levels_skipped": 0,
+    "total_ns": 0,
+    "max_ns": 0,
+    "last_ns": 0,
+}
+_level_ns = {}  # level name -> [ticks, total_ns, max_ns]
+
+
+def configure(rate):
+    global TICK_RATE
+    TICK_RATE = max(1, min(60, int(rate)))
+
+
+def tick():
+    """Run one simulation step over all levels. Returns the time it took in ns."""
+    start = time.perf_counter_ns()
+    ticked = skipped = 0
+    now_ms = int(time.time() * 1000)
+    per_level = []
+    for level in list(level_registry.values()):
+        if not level.observers():
+            skipped += 1
+            if level.updates:
+                level.flush_updates()
+            continue
+        t0 = time.perf_counter_ns()
+        try:
+            tick_level_brains(level, now_ms)
+        except Exception as e:
+            print(f"[Simulation] Level {level.name} tick error: {e}")
+        level.flush_updates()
+        per_level.append((level.name, time.perf_counter_ns() - t0))
+        ticked += 1
+    elapsed = time.perf_counter_ns() - start
+    _record(elapsed, ticked, skipped, per_level)
+    return elapsed
+
+
+def _record(elapsed, ticked, skipped, per_level):
+    period_ns = 1_000_000_000 // TICK_RATE
+    with _stats_lock:
+        _stats["ticks"] += 1
+        _stats["levels_ticked"] += ticked
+        _stats["levels_skipped"] += skipped
+        _stats["total_ns"] += elapsed
+        _stats["last_ns"] = elapsed
+        if elapsed > _stats["max_ns"]:
+            _stats["max_ns"] = elapsed
+        if elapsed > period_ns:
+            _stats["overruns"] += 1
+        for name, ns in per_level:
+            st = _level_ns.get(name)
+            if st is None:
+                st = _level_ns[name] = [0, 0, 0]
+            st[0] += 1
+            st[1] += ns
+            if ns > st[2]:
+                st[2] = ns
+
+
+def _next_deadline(deadline, period):
+    """Deadline of the following tick; after an overrun, start over from now."""
+    deadline += period
+    now = time.monotonic()
+    if deadline < now:
+        deadline = now
+    return deadline
+
+
+def _run_thread():
+    deadline = time.monotonic()
+    while True:
+        tick()
+        deadline = _next_deadline(deadline, 1.0 / TICK_RATE)
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def start_thread():
+    """Start the loop on a daemon thread (threaded mode)."""
+    thread = threading.Thread(target=_run_thread, name="simulation", daemon=True)
+    thread.start()
+    print(f"[Simulation] Ticking levels at {TICK_RATE} Hz")
+    return thread
+
+
+async def run_async():
+    """Run the loop as a task on the running event loop (asyncio mode)."""
+    print(f"[Simulation] Ticking levels at {TICK_RATE} Hz")
+    deadline = time.monotonic()
+    while True:
+        tick()
+        deadline = _next_deadline(deadline, 1.0 / TICK_RATE)
+        await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+
+
+def get_simulation_stats():
+    with _stats_lock:
+        st = dict(_stats)
+        levels = {name: list(v) for name, v in _level_ns.items()}
+    ticks = st["ticks"]
+    return {
+        "tick_rate": TICK_RATE,
+        "ticks": ticks,
+        "overruns": st["overruns"],
+        "levels_ticked": st["levels_ticked"],
+        "levels_skipped": st["levels_skipped"],
+        "avg_tick_ms": st["total_ns"] / ticks / 1e6 if ticks else 0.0,
+        "max_tick_ms": st["max_ns"] / 1e6,
+        "last_tick_ms": st["last_ns"] / 1e6,
+        "levels": sorted(
+            ({"level": name, "ticks": n, "avg_ms": total / n / 1e6, "max_ms": mx / 1e6}
+             for name, (n, total, mx) in levels.items()),
+            key=lambda r: r["avg_ms"], reverse=True),
+        "batching": batching.get_batch_stats(),
+    }
+
+
+def reset_simulation_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+        _level_ns.clear()
@@ -0,0 +1,414 @@
+"""
+Where accounts and characters are stored.
+
+A backend keeps two things: the save dict of each account
+({"email": ..., "characters": [...]}, cached by char_store) and the
+email -> user_id directory (kept in memory by accounts.py). Two backends:
+
+- JsonBackend: the original layout, saves/<user_id>.json per account plus
+  Accounts.json and its registration journal
+- SqliteBackend: one SQLite database in WAL mode. Characters are rows,
+  their inventory, missions and pets live in tables of their own, and the
+  loosely shaped rest is stored as JSON. A save only rewrites the rows
+  whose JSON changed, so a position checkpoint touches one character row
+  instead of the whole account.
+
+Pick one with --storage (configure()); migrate_json_to_sqlite() imports
+the JSON saves into a database once.
+"""
+import glob
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+DB_PATH = "Game.db"
+
+# character keys stored in tables of their own by SqliteBackend: table -> key
+SUBCOLLECTIONS = {"inventory": "inventoryGears", "missions": "missions", "pets": "pets"}
+
+
+def dumps(data, indent=None):
+    # handlers on other threads may be changing the dicts while we serialize
+    for _ in range(3):
+        try:
+            return json.dumps(data, ensure_ascii=False, indent=indent)
+        except RuntimeError:
+            time.sleep(0)
+    return json.dumps(data, ensure_ascii=False, indent=indent)
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except FileNotFoundError:
+        return None
+
+
+def _replace(path, text, sync=False):
+    """Write text to a temp file next to path and rename it into place."""
+    dirpath = os.path.dirname(path) or "."
+    os.makedirs(dirpath, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=dirpath, delete=False, encoding="utf-8") as tf:
+        tf.write(text)
+        if sync:
+            tf.flush()
+            os.fsync(tf.fileno())
+    os.replace(tf.name, path)
+
+
+###################################
+# JSON files
+###################################
+class JsonBackend:
+    name = "json"
+
+    def __init__(self, save_dir="saves", accounts_path="Accounts.json"):
+        self.save_dir = save_dir
+        self.accounts_path = accounts_path
+        self.journal_path = os.path.splitext(accounts_path)[0] + ".journal"  # registrations since the last compaction
+        self.journaled = 0    # entries in the current journal
+        self._source = None   # (Accounts.json, journal) stat the directory was read from
+
+    def _path(self, user_id):
+        return os.path.join(self.save_dir, f"{user_id}.json")
+
+    # saves
+    def version(self, user_id):
+        """Changes whenever the account is written (the file's mtime), None if it has no save."""
+        try:
+            return os.stat(self._path(user_id)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(self, user_id):
+        try:
+            with open(self._path(user_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, user_id, data):
+        _replace(self._path(user_id), dumps(data, indent=2))
+
+    def forget(self, user_id):
+        pass
+
+    def iter_accounts(self):
+        """(user_id, save dict) of every readable save."""
+        for path in glob.glob(os.path.join(self.save_dir, "*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            yield os.path.splitext(os.path.basename(path))[0], data
+
+    def iter_character_names(self):
+        for user_id, data in self.iter_accounts():
+            for char in data.get("characters", []):
+                yield user_id, char.get("name")
+
+    # directory
+    def _read_journal(self, path, index):
+        """Replay a journal into index, returns the number of entries. A torn last line is skipped."""
+        count = 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    index[entry["email"]] = entry["user_id"]
+                    count += 1
+        except FileNotFoundError:
+            pass
+        return count
+
+    def load_directory(self):
+        """Accounts.json, then any journal left by a crashed compaction, then the journal."""
+        try:
+            with open(self.accounts_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entries = []
+        # entries is a list of {"email":..., "user_id":...}
+        index = { e["email"]: e["user_id"] for e in entries }
+        self._read_journal(self.journal_path + ".compacting", index)
+        self.journaled = self._read_journal(self.journal_path, index)
+        self._source = (_stat_key(self.accounts_path), _stat_key(self.journal_path))
+        return index
+
+    def directory_updates(self):
+        """Registrations made by other processes since we last looked (the whole directory if the files changed)."""
+        if (_stat_key(self.accounts_path), _stat_key(self.journal_path)) != self._source:
+            return self.load_directory()
+        return {}
+
+    def register(self, email, user_id):
+        """Append one registration to the journal."""
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"email": email, "user_id": user_id}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.journaled += 1
+        self._source = (self._source[0] if self._source else None, _stat_key(self.journal_path))
+
+    def pending(self):
+        return self.journaled
+
+    def compact(self, index, lock):
+        """
+        Fold the journal into Accounts.json. Registrations keep going to a
+        fresh journal while the snapshot is written.
+        """
+        compacting = self.journal_path + ".compacting"
+        with lock:
+            if not self.journaled:
+                return False
+            os.replace(self.journal_path, compacting)
+            self.journaled = 0
+            # other zone workers may have appended to it too
+            self._read_journal(compacting, index)
+            snapshot = dict(index)
+        entries = [ {"email": email, "user_id": uid} for email, uid in snapshot.items() ]
+        _replace(self.accounts_path, json.dumps(entries, ensure_ascii=False, indent=2), sync=True)
+        with lock:
+            os.remove(compacting)
+            self._source = (_stat_key(self.accounts_path), _stat_key(self.journal_path))
+        print(f"[Accounts] Compacted {len(entries)} accounts into {self.accounts_path}")
+        return True
+
+
+###################################
+# SQLite
+###################################
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    user_id TEXT PRIMARY KEY,
+    email   TEXT UNIQUE,
+    extra   TEXT NOT NULL DEFAULT '{}',  -- the save dict without its characters
+    version INTEGER NOT NULL DEFAULT 0   -- bumped by every save
+);
+CREATE TABLE IF NOT EXISTS characters (
+    user_id    TEXT NOT NULL,
+    slot       INTEGER NOT NULL,
+    name       TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    class      TEXT,
+    level      INTEGER,
+    data       TEXT NOT NULL,  -- the character dict, sub-collections left as null
+    PRIMARY KEY (user_id, slot)
+);
+CREATE INDEX IF NOT EXISTS characters_name ON characters (name_lower);
+""" + "".join(f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    user_id TEXT NOT NULL,
+    slot    INTEGER NOT NULL,
+    data    TEXT NOT NULL,
+    PRIMARY KEY (user_id, slot)
+);""" for table in SUBCOLLECTIONS)
+
+
+class SqliteBackend:
+    name = "sqlite"
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._conn = None
+        self._pid = None
+        self._lock = threading.RLock()
+        self._written = {}   # user_id -> (version, {(table, slot): hash of the JSON we read or wrote})
+        self._max_rowid = 0  # newest accounts row the directory has seen
+
+    def _db(self):
+        # zone workers are separate processes, each opens its own connection
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _transaction(self, write=False):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        return _Transaction(db)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # saves
+    def version(self, user_id):
+        with self._lock:
+            row = self._db().execute("SELECT version FROM accounts WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row and row[0] else None
+
+    def load(self, user_id):
+        with self._lock, self._transaction() as db:
+            row = db.execute("SELECT extra, version FROM accounts WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None or not row[1]:
+                return None
+            extra, version = row
+            hashes = {("accounts", None): hash(extra)}
+            data = json.loads(extra)
+            chars = []
+            for slot, text in db.execute("SELECT slot, data FROM characters WHERE user_id = ? ORDER BY slot", (user_id,)):
+                hashes[("characters", slot)] = hash(text)
+                chars.append(json.loads(text))
+            for table, key in SUBCOLLECTIONS.items():
+                for slot, text in db.execute(f"SELECT slot, data FROM {table} WHERE user_id = ?", (user_id,)):
+                    if slot < len(chars):
+                        hashes[(table, slot)] = hash(text)
+                        chars[slot][key] = json.loads(text)
+            data["characters"] = chars
+            self._written[user_id] = (version, hashes)
+        return data
+
+    def _rows(self, data):
+        """(table, slot) -> (JSON text, extra column values) for every row of a save dict."""
+        rows = {("accounts", None): (dumps({k: (None if k == "characters" else v) for k, v in data.items()}), ())}
+        for slot, char in enumerate(data.get("characters", [])):
+            core = {k: (None if k in SUBCOLLECTIONS.values() else v) for k, v in char.items()}
+            name = char.get("name") or ""
+            rows[("characters", slot)] = (dumps(core), (name, name.strip().lower(), char.get("class"), char.get("level")))
+            for table, key in SUBCOLLECTIONS.items():
+                if key in char:
+                    rows[(table, slot)] = (dumps(char[key]), ())
+        return rows
+
+    def save(self, user_id, data):
+        rows = self._rows(data)
+        with self._lock, self._transaction(write=True) as db:
+            row = db.execute("SELECT version FROM accounts WHERE user_id = ?", (user_id,)).fetchone()
+            version = row[0] if row else 0
+            known_version, written = self._written.get(user_id, (None, {}))
+            if known_version != version:
+                # someone else wrote it since (or we never read it): rewrite every row
+                written = {}
+                for table in ("characters", *SUBCOLLECTIONS):
+                    db.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+            hashes = {}
+            for (table, slot), (text, columns) in rows.items():
+                hashes[(table, slot)] = h = hash(text)
+                if written.get((table, slot)) == h:
+                    continue
+                if table == "accounts":
+                    db.execute("INSERT INTO accounts (user_id, extra) VALUES (?, ?) "
+                               "ON CONFLICT (user_id) DO UPDATE SET extra = excluded.extra", (user_id, text))
+                elif table == "characters":
+                    db.execute("INSERT OR REPLACE INTO characters (user_id, slot, name, name_lower, class, level, data) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?)", (user_id, slot, *columns, text))
+                else:
+                    db.execute(f"INSERT OR REPLACE INTO {table} (user_id, slot, data) VALUES (?, ?, ?)", (user_id, slot, text))
+            for table, slot in set(written) - set(hashes):  # deleted characters, dropped keys
+                db.execute(f"DELETE FROM {table} WHERE user_id = ? AND slot = ?", (user_id, slot))
+            db.execute("UPDATE accounts SET version = ? WHERE user_id = ?", (version + 1, user_id))
+            self._written[user_id] = (version + 1, hashes)
+
+    def forget(self, user_id):
+        """Drop what we remember of an account's rows (char_store evicted it)."""
+        with self._lock:
+            self._written.pop(user_id, None)
+
+    def iter_accounts(self):
+        with self._lock:
+            user_ids = [r[0] for r in self._db().execute("SELECT user_id FROM accounts WHERE version > 0")]
+        for user_id in user_ids:
+            data = self.load(user_id)
+            if data is not None:
+                yield user_id, data
+
+    def iter_character_names(self):
+        with self._lock:
+            return self._db().execute("SELECT user_id, name FROM characters").fetchall()
+
+    # directory
+    def load_directory(self):
+        with self._lock, self._transaction() as db:
+            index = dict(db.execute("SELECT email, user_id FROM accounts WHERE email IS NOT NULL"))
+            self._max_rowid = db.execute("SELECT coalesce(max(rowid), 0) FROM accounts").fetchone()[0]
+        return index
+
+    def directory_updates(self):
+        with self._lock:
+            rows = self._db().execute("SELECT rowid, email, user_id FROM accounts WHERE rowid > ?",
+                                      (self._max_rowid,)).fetchall()
+            if rows:
+                self._max_rowid = max(r[0] for r in rows)
+        return {email: user_id for _, email, user_id in rows if email is not None}
+
+    def register(self, email, user_id):
+        with self._lock, self._transaction(write=True) as db:
+            db.execute("INSERT INTO accounts (user_id, email) VALUES (?, ?) "
+                       "ON CONFLICT (user_id) DO UPDATE SET email = excluded.email", (user_id, email))
+
+    def pending(self):
+        return 0  # SQLite checkpoints its WAL itself
+
+    def compact(self, index, lock):
+        return False
+
+
+class _Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+BACKENDS = {"json": JsonBackend, "sqlite": SqliteBackend}
+
+_backend = None
+
+
+def configure(kind, path=None):
+    """Select the backend (--storage json|sqlite, --db PATH)."""
+    global _backend
+    if kind not in BACKENDS:
+        raise ValueError(f"unknown storage backend {kind!r}, expected one of {sorted(BACKENDS)}")
+    _backend = SqliteBackend(path or DB_PATH) if kind == "sqlite" else JsonBackend()
+    return _backend
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = JsonBackend()
+    return _backend
+
+
+def migrate_json_to_sqlite(db_path=DB_PATH, source=None):
+    """
+    One-shot import of the JSON saves and account directory into a SQLite
+    database. Accounts already in the database are overwritten. Returns
+    (accounts, characters) imported.
+    """
+    source = source or JsonBackend()
+    target = SqliteBackend(db_path)
+    directory = source.load_directory()
+    for email, user_id in directory.items():
+        target.register(email, user_id)
+    accounts = characters = 0
+    for user_id, data in source.iter_accounts():
+        data.setdefault("characters", [])
+        target.save(user_id, data)
+        accounts += 1
+        characters += len(data["characters"])
+    target.close()
+    print(f"[Storage] Imported {accounts} accounts, {characters} characters and "
+          f"{len(directory)} emails into {db_path}")
+    return accounts, characters
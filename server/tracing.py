@@ -0,0 +1,120 @@
+"""
+Runtime tracing for the bit codecs.
+
+BitBuffer/BitReader only keep a debug log while tracing is on for the
+packet being handled: BitBuffer(debug=True) outside of tracing behaves like
+debug=False, so the codecs do no string formatting and no list appends.
+Tracing is switched on at runtime (admin panel /tracing, or --trace), for
+every packet or only for some opcodes and/or sessions.
+
+Traced codecs log structured entries, (format, *values) tuples, that are
+only turned into text when somebody reads the log (get_debug_log()) or a
+handler fails and the traces of the packet are dumped.
+"""
+import threading
+
+_enabled = False
+_opcodes = None    # set of opcodes to trace, None = all
+_sessions = None   # set of session keys (addr, character or user id), None = all
+
+_local = threading.local()  # .packet = (opcode, session, [traced codecs]) while a handler runs
+_OUTSIDE = object()         # .packet outside of packet handling; None = packet not traced
+
+
+def enable(opcodes=None, sessions=None):
+    """Trace packets, optionally only these opcodes and/or sessions."""
+    global _enabled, _opcodes, _sessions
+    _opcodes = set(opcodes) if opcodes else None
+    _sessions = {str(s).lower() for s in sessions} if sessions else None
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def status():
+    return {
+        "enabled": _enabled,
+        "opcodes": sorted(f"0x{op:02X}" for op in _opcodes) if _opcodes else None,
+        "sessions": sorted(_sessions) if _sessions else None,
+    }
+
+
+def format_addr(addr):
+    """A peer address as "host:port" (socket addresses are (host, port, ...) tuples)."""
+    if isinstance(addr, tuple) and len(addr) >= 2:
+        return f"{addr[0]}:{addr[1]}"
+    return str(addr)
+
+
+def _session_matches(session):
+    if session is None:
+        return False
+    addr = session.addr
+    host = addr[0] if isinstance(addr, tuple) and addr else None
+    keys = (host, format_addr(addr), getattr(session, "current_character", None), getattr(session, "user_id", None))
+    return any(k is not None and str(k).lower() in _sessions for k in keys)
+
+
+def begin_packet(opcode, session):
+    """Called by dispatch before a handler runs. Returns the previous context."""
+    previous = getattr(_local, "packet", _OUTSIDE)
+    if not _enabled:
+        _local.packet = None
+    elif (_opcodes is not None and opcode not in _opcodes) or \
+            (_sessions is not None and not _session_matches(session)):
+        _local.packet = None
+    else:
+        _local.packet = (opcode, session, [])
+    return previous
+
+
+def end_packet(previous):
+    _local.packet = previous
+
+
+def active():
+    """
+    Whether a codec created now should trace: inside a traced packet, or,
+    outside of packet handling (scheduler, simulation), whenever tracing is
+    on without filters.
+    """
+    if not _enabled:
+        return False
+    packet = getattr(_local, "packet", _OUTSIDE)
+    if packet is _OUTSIDE:
+        return _opcodes is None and _sessions is None
+    return packet is not None
+
+
+def register(codec):
+    """Remember a traced codec so its log can be dumped if the handler fails."""
+    packet = getattr(_local, "packet", None)
+    if packet is not None and packet is not _OUTSIDE:
+        packet[2].append(codec)
+
+
+def format_entry(entry):
+    if isinstance(entry, tuple):
+        return entry[0].format(*entry[1:])
+    return entry
+
+
+def format_log(log):
+    return [format_entry(e) for e in log] if log else []
+
+
+def dump_packet(reason=""):
+    """Print the traces of every codec used by the packet being handled."""
+    packet = getattr(_local, "packet", None)
+    if packet is None or packet is _OUTSIDE:
+        return
+    opcode, session, codecs = packet
+    addr = session.addr if session is not None else None
+    print(f"[{addr}] [Trace 0x{opcode:02X}] {reason}")
+    for i, codec in enumerate(codecs):
+        print(f"  --- {type(codec).__name__} #{i}")
+        for line in format_log(codec.debug_log):
+            print(f"  {line}")
@@ -0,0 +1,147 @@
+"""
+Zone-server mode: levels from LEVEL_CONFIG are split over several worker
+processes, each serving its own port.
+
+The client already follows whatever host/port the enter-world packet (0x21)
+names, so a 0x1D transfer to a level owned by another worker simply points
+the client at that worker. The transfer token, the character dict and the
+"extended data already sent" flag travel through a small token service that
+the parent process hosts with multiprocessing.managers.
+"""
+import secrets
+import threading
+from multiprocessing.managers import BaseManager
+
+HUB_SWFS = ("LevelsHome.swf", "LevelsTut.swf")  # login, CraftTown and tutorials stay on worker 0
+
+
+class TransferTokenService:
+    """Lives in the parent process; workers talk to it through manager proxies."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = {}    # (user_id, char_name) -> token
+        self._owners = {}    # token -> (user_id, char_name)
+        self._handoffs = {}  # token -> handoff dict
+
+    def token_for(self, user_id, char_name):
+        """Persistent 16-bit transfer token per character, unique across workers."""
+        key = (user_id, char_name)
+        with self._lock:
+            tk = self._tokens.get(key)
+            if tk is None:
+                tk = secrets.randbits(16)
+                while tk in self._owners:
+                    tk = secrets.randbits(16)
+                self._tokens[key] = tk
+                self._owners[tk] = key
+            return tk
+
+    def publish(self, token, handoff):
+        with self._lock:
+            self._handoffs[token] = handoff
+
+    def claim(self, token):
+        with self._lock:
+            return self._handoffs.pop(token, None)
+
+    def pending(self):
+        with self._lock:
+            return len(self._handoffs)
+
+
+_service_instance = None
+
+def _get_service():
+    global _service_instance
+    if _service_instance is None:
+        _service_instance = TransferTokenService()
+    return _service_instance
+
+
+class TokenServiceManager(BaseManager):
+    pass
+
+TokenServiceManager.register("service", callable=_get_service)
+
+
+def start_token_service(ctx=None):
+    """Start the token service process. Returns (manager, address, authkey)."""
+    authkey = secrets.token_bytes(16)
+    manager = TokenServiceManager(address=("127.0.0.1", 0), authkey=authkey, ctx=ctx)
+    manager.start()
+    return manager, manager.address, authkey
+
+
+def plan_zones(level_config, workers):
+    """
+    Split levels into `workers` groups. Levels sharing a SWF (one region and
+    its missions) stay together; the hub SWFs always go to worker 0 and the
+    remaining regions are spread by level count.
+    """
+    regions = {}
+    for name, (swf_path, *_rest) in level_config.items():
+        regions.setdefault(swf_path.split("/", 1)[0], []).append(name)
+
+    groups = [[] for _ in range(workers)]
+    for swf in HUB_SWFS:
+        groups[0].extend(regions.pop(swf, []))
+
+    first = 1 if workers > 1 else 0
+    for swf, names in sorted(regions.items(), key=lambda kv: (-len(kv[1]), kv[0])):
+        target = min(range(first, workers), key=lambda i: len(groups[i]))
+        groups[target].extend(names)
+    return groups
+
+
+# Per-process routing state, filled in by configure() inside each worker
+###################################
+worker_index = None
+_level_ports = {}   # level name -> port of the worker that owns it
+_host = None
+_own_port = None
+_hub_port = None
+_service = None
+
+
+def configure(index, host, port, level_ports, hub_port, service_address, authkey):
+    global worker_index, _level_ports, _host, _own_port, _hub_port, _service
+    manager = TokenServiceManager(address=service_address, authkey=authkey)
+    manager.connect()
+    worker_index = index
+    _level_ports = dict(level_ports)
+    _host = host
+    _own_port = port
+    _hub_port = hub_port
+    _service = manager.service()
+
+
+def enabled():
+    return _service is not None
+
+
+def address_for(level_name):
+    """(host, port) of the worker owning level_name, or None outside zone mode."""
+    if not enabled():
+        return None
+    return _host, _level_ports.get(level_name, _hub_port)
+
+
+def is_local(level_name):
+    return not enabled() or _level_ports.get(level_name, _hub_port) == _own_port
+
+
+def token_for(user_id, char_name):
+    return _service.token_for(user_id, char_name)
+
+
+def publish_handoff(token, char, target_level, previous_level, extended_sent):
+    _service.publish(token, {
+        "char": char,
+        "target_level": target_level,
+        "previous_level": previous_level,
+        "extended_sent": extended_sent,
+    })
+
+
+def claim_handoff(token):
+    return _service.claim(token) if enabled() else None